@@ -0,0 +1,230 @@
+-- --- MODE AGRÉGATION SERVEUR ---
+-- Aplatissement de `data_json` et agrégation producteur × jour × véhicule directement
+-- dans Postgres, exposés en fonctions RPC (PostgREST / Supabase). Les dashboards lancés
+-- avec DIAG_SERVER_SIDE=1 ne rapatrient que les tournées agrégées, le cube d'indicateurs
+-- et, quand la carte est affichée, les arrêts géolocalisés.
+--
+-- Mêmes conventions que src/flatten.py et src/decoder.py : jour « Indéfini », nom
+-- « Sans nom », véhicule « Non précisé », coordonnée vide ou nulle ignorée, mesure
+-- absente comptée 0, booléen lu 1 / 0 (True / False en texte). Un contenu illisible ou
+-- hors schéma est écarté et signalé par diagnostic_rejected().
+--
+--   psql "$DATABASE_URL" -f sql/diagnostic.sql
+
+-- --- OUTILS DE DÉCODAGE ---
+create or replace function diag_check_table(p_table text) returns void
+language plpgsql immutable as $$
+begin
+    if p_table not in ('tournees', 'tournees_catl') then
+        raise exception 'Table non autorisée : %', p_table;
+    end if;
+end
+$$;
+
+create or replace function diag_array(value jsonb) returns jsonb
+language sql immutable as $$
+    select case when jsonb_typeof(value) = 'array' then value else '[]'::jsonb end
+$$;
+
+-- Nombre écrit en texte, au sens de float() en Python (sans bloc d'exception : inlinable)
+create or replace function diag_is_numeric_text(value text) returns boolean
+language sql immutable as $$
+    select value ~* '^\s*[+-]?((\d+\.?\d*|\.\d+)(e[+-]?\d+)?|inf|infinity|nan)\s*$'
+$$;
+
+-- Valeur conforme au type attendu par le schéma de src/decoder.py (valeur absente ou nulle admise)
+create or replace function diag_is_number(value jsonb) returns boolean
+language sql immutable as $$
+    select value is null or jsonb_typeof(value) in ('null', 'number', 'boolean') or value = '""'
+        or (jsonb_typeof(value) = 'string' and diag_is_numeric_text(value #>> '{}'))
+$$;
+
+-- Coordonnée « vide » (comme `if not value` en Python) : ignorée, quel que soit son type
+create or replace function diag_is_blank(value jsonb) returns boolean
+language sql immutable as $$
+    select value is null or value in ('null', 'false', '0', '""', '[]', '{}')
+$$;
+
+create or replace function diag_is(value jsonb, kind text) returns boolean
+language sql immutable as $$
+    select case kind
+        when 'number' then diag_is_number(value)
+        when 'coord' then diag_is_blank(value) or diag_is_number(value)
+        when 'text' then value is null or jsonb_typeof(value) in ('null', 'string', 'number', 'boolean')
+        when 'object' then value is null or jsonb_typeof(value) in ('null', 'object')
+        when 'array' then value is null or jsonb_typeof(value) in ('null', 'array')
+    end
+$$;
+
+create or replace function diag_conforms(content jsonb) returns boolean
+language sql immutable as $$
+    select diag_is(content -> 'depot', 'object')
+       and diag_is(content #> '{depot,pData}', 'object')
+       and diag_is(content #> '{depot,pData,lon}', 'coord') and diag_is(content #> '{depot,pData,lat}', 'coord')
+       and diag_is(content #> '{depot,veh}', 'object') and diag_is(content #> '{depot,veh,type}', 'text')
+       and diag_is(content -> 'tours', 'array')
+       and not exists (
+           select 1 from jsonb_array_elements(diag_array(content -> 'tours')) t(tour)
+           where not (
+               diag_is(tour, 'object') and diag_is(tour -> 'day', 'text') and diag_is(tour -> 'name', 'text')
+               and diag_is(tour -> 'stats', 'object')
+               and diag_is(tour #> '{stats,ca}', 'number') and diag_is(tour #> '{stats,cost}', 'number')
+               and diag_is(tour #> '{stats,ratio}', 'number') and diag_is(tour #> '{stats,dist}', 'number')
+               and diag_is(tour #> '{stats,time}', 'number')
+               and diag_is(tour -> 'stops', 'array')
+               and not exists (
+                   select 1 from jsonb_array_elements(diag_array(tour -> 'stops')) s(stop)
+                   where not (
+                       diag_is(stop, 'object') and diag_is(stop -> 'client', 'text')
+                       and diag_is(stop -> 'lon', 'coord') and diag_is(stop -> 'lat', 'coord')
+                       and diag_is(stop -> 'vol', 'number')
+                   )
+               )
+           )
+       )
+$$;
+
+-- Contenu d'une ligne, lu comme le client Python le reçoit : une colonne texte (ou une chaîne
+-- dans une colonne jsonb) est décodée une fois, une colonne jsonb est prise telle quelle.
+-- NULL si illisible ou hors schéma (src/decoder.py lève alors SchemaError).
+create or replace function diag_content(raw jsonb) returns jsonb
+language plpgsql immutable as $$
+declare
+    content jsonb := raw;
+begin
+    if jsonb_typeof(content) = 'string' then
+        content := (content #>> '{}')::jsonb;
+    end if;
+    if jsonb_typeof(content) = 'object' and diag_conforms(content) then
+        return content;
+    end if;
+    return null;
+exception when others then
+    return null;
+end
+$$;
+
+create or replace function diag_num(value jsonb, fallback double precision default 0) returns double precision
+language sql immutable as $$
+    select case
+        when jsonb_typeof(value) = 'number' then (value #>> '{}')::double precision
+        when jsonb_typeof(value) = 'boolean' then (value = 'true')::integer
+        when jsonb_typeof(value) = 'string' and diag_is_numeric_text(value #>> '{}') then (value #>> '{}')::double precision
+        else fallback
+    end
+$$;
+
+-- Texte au sens de str() en Python : un booléen s'écrit True / False
+create or replace function diag_text(value jsonb, fallback text default null) returns text
+language sql immutable as $$
+    select case when jsonb_typeof(value) = 'boolean' then initcap(value #>> '{}') else coalesce(value #>> '{}', fallback) end
+$$;
+
+create or replace function diag_coord(value jsonb) returns double precision
+language sql immutable as $$
+    select case when diag_is_blank(value) then null else diag_num(value, null) end
+$$;
+
+
+-- --- TOURNÉES ---
+create or replace function diagnostic_tours(p_table text)
+returns table (
+    id_projet bigint, tour_num integer, producteur text, created_at timestamptz,
+    jour text, tournee text, vehicule text,
+    ca double precision, cout double precision, ratio double precision,
+    distance double precision, temps double precision, volume_kg double precision,
+    nb_arrets integer, depot_lon double precision, depot_lat double precision
+)
+language plpgsql stable as $$
+begin
+    perform diag_check_table(p_table);
+    return query execute format($q$
+        with r as materialized (
+            select t.id, t.nom_producteur, t.created_at, diag_content(to_jsonb(t.data_json)) as content from %I t
+        )
+        select r.id::bigint, (x.n - 1)::integer, coalesce(r.nom_producteur, 'Inconnu')::text, r.created_at::timestamptz,
+               diag_text(x.tour -> 'day', 'Indéfini'), diag_text(x.tour -> 'name', 'Sans nom'),
+               diag_text(r.content #> '{depot,veh,type}', 'Non précisé'),
+               diag_num(x.tour #> '{stats,ca}'), diag_num(x.tour #> '{stats,cost}'), diag_num(x.tour #> '{stats,ratio}'),
+               diag_num(x.tour #> '{stats,dist}'), diag_num(x.tour #> '{stats,time}'),
+               coalesce((select sum(diag_num(s -> 'vol')) from jsonb_array_elements(diag_array(x.tour -> 'stops')) s), 0),
+               jsonb_array_length(diag_array(x.tour -> 'stops')),
+               diag_coord(r.content #> '{depot,pData,lon}'), diag_coord(r.content #> '{depot,pData,lat}')
+        from r
+        cross join lateral jsonb_array_elements(diag_array(r.content -> 'tours')) with ordinality as x(tour, n)
+        order by r.id, x.n
+    $q$, p_table);
+end
+$$;
+
+
+-- --- CUBE D'INDICATEURS (mêmes mesures que src/kpi.py) ---
+create or replace function diagnostic_cube(p_table text)
+returns table (
+    producteur text, jour text, vehicule text, nb_tournees bigint,
+    distance double precision, nb_arrets bigint, volume_kg double precision,
+    cout double precision, ca double precision, temps double precision, somme_ratios double precision
+)
+language sql stable as $$
+    select t.producteur, t.jour, t.vehicule, count(*),
+           sum(t.distance), sum(t.nb_arrets), sum(t.volume_kg), sum(t.cout), sum(t.ca), sum(t.temps), sum(t.ratio)
+    from diagnostic_tours(p_table) t
+    group by t.producteur, t.jour, t.vehicule
+$$;
+
+
+-- --- GÉOMÉTRIE (arrêts géolocalisés, tracés reconstruits côté client) ---
+create or replace function diagnostic_stops(p_table text)
+returns table (
+    id_projet bigint, tour_num integer, ordre integer, client text,
+    lon double precision, lat double precision, volume_kg double precision
+)
+language plpgsql stable as $$
+begin
+    perform diag_check_table(p_table);
+    return query execute format($q$
+        with r as materialized (select t.id, diag_content(to_jsonb(t.data_json)) as content from %I t)
+        select r.id::bigint, (x.n - 1)::integer, (s.k - 1)::integer, diag_text(s.stop -> 'client'),
+               diag_coord(s.stop -> 'lon'), diag_coord(s.stop -> 'lat'), diag_num(s.stop -> 'vol')
+        from r
+        cross join lateral jsonb_array_elements(diag_array(r.content -> 'tours')) with ordinality as x(tour, n)
+        cross join lateral jsonb_array_elements(diag_array(x.tour -> 'stops')) with ordinality as s(stop, k)
+        where diag_coord(s.stop -> 'lon') is not null and diag_coord(s.stop -> 'lat') is not null
+        order by r.id, x.n, s.k
+    $q$, p_table);
+end
+$$;
+
+
+-- --- ÉTAT DE LA TABLE ---
+-- Lecture légère interrogée à chaque rafraîchissement : les agrégats ne sont relus que si elle change
+create or replace function diagnostic_state(p_table text) returns jsonb
+language plpgsql stable as $$
+declare
+    result jsonb;
+begin
+    perform diag_check_table(p_table);
+    execute format(
+        'select jsonb_build_object(''projects'', count(*), ''last_id'', max(id), ''last_created_at'', max(created_at)) from %I',
+        p_table
+    ) into result;
+    return result;
+end
+$$;
+
+create or replace function diagnostic_rejected(p_table text)
+returns table (id_projet bigint)
+language plpgsql stable as $$
+begin
+    perform diag_check_table(p_table);
+    return query execute format(
+        'select t.id::bigint from %I t where diag_content(to_jsonb(t.data_json)) is null order by t.id',
+        p_table
+    );
+end
+$$;
+
+
+-- --- VUES (lecture directe, exports SQL) ---
+create or replace view diagnostic_cube_tournees as select * from diagnostic_cube('tournees');
+create or replace view diagnostic_cube_tournees_catl as select * from diagnostic_cube('tournees_catl');
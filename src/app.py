@@ -0,0 +1,564 @@
+# --- APPLICATION MULTI-TERRITOIRES ---
+# Un seul dashboard pour tous les territoires (territories.py) : même client Supabase, mêmes
+# sections, caches isolés par table et bornés en mémoire (tenants.py), tenus chauds en
+# tâche de fond (warmer.py).
+#
+#   streamlit run src/app.py                      -> territoire DIAG_TERRITORY (défaut : dix)
+#   http://.../?territoire=catl                   -> choix du territoire par l'URL
+#   main.py / catl.py / generate_mock_data.py     -> points d'entrée historiques
+
+import datetime
+import json
+import os
+
+import pandas as pd
+import pydeck as pdk
+import streamlit as st
+from supabase import create_client
+
+from charts import cached_figure, efficiency_scatter, figure_cache, producer_bar, selection_key, trend_chart
+from costs import DEFAULT_VEHICLE, cost_summary, load_cost_model, model_costs, rate_table
+from distances import DistanceMatrix
+from exports import FORMATS, available_formats, export_file, stop_chunks, tour_chunks
+from flatten import DISPLAY_COLUMNS, export_view
+from instrument import Collector, chrome_trace, enabled, span, summary
+from kpi import build_cube, derive, query
+from layers import CompactDeck, build_geo, deck_layers, filter_geo, level_of_detail, tour_mask, view_for
+from mutualisation import mutualisation_pairs
+from palette import Palette
+from remote import open_source
+from rest import ASYNC_FETCH, RestClient
+from routing import optimize_tours
+from scenarios import ALL_PRODUCERS, CHANGE_LABELS, ScenarioEngine, parse_changes
+from store import SNAPSHOT_DIR
+from tenants import TenantCache
+from territories import DEFAULT_TERRITORY, TERRITORIES, WEEK_DAYS, territory
+from trends import PERIODS, TREND_METRICS, producer_history, trend_series, trends_for
+from warmer import Warmer
+
+# --- CONNEXION SUPABASE ---
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://lxoqhmfpnodyfnavmhmn.supabase.co")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "sb_publishable_-LPq5CilDsNJcBuOKSG_hw_2nZUZrYg")
+
+# Carte : charge utile compacte (clés courtes, styles portés par les couches)
+COMPACT_MAP = True
+
+
+@st.cache_resource
+def init_connection():
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+
+@st.cache_resource
+def init_rest():
+    # Lecture concurrente des pages : un seul pool de connexions pour toutes les tables
+    return RestClient(SUPABASE_URL, SUPABASE_KEY) if ASYNC_FETCH else None
+
+
+@st.cache_resource
+def get_tenants():
+    # Un seul client et un seul cache pour tout le serveur, une entrée par table consultée
+    supabase = init_connection()
+    rest = init_rest()
+    return TenantCache(lambda table: open_source(supabase, table, snapshot_dir=SNAPSHOT_DIR, rest=rest), DERIVED)
+
+
+@st.cache_resource
+def get_distances():
+    # Matrice de distances partagée par tous les territoires, relue depuis le disque au démarrage
+    return DistanceMatrix()
+
+
+@st.cache_resource
+def get_warmer():
+    return Warmer(get_tenants()).start()
+
+
+@st.cache_resource
+def get_palette():
+    # Couleurs des producteurs, conservées d'un redémarrage à l'autre (cf. palette.py)
+    return Palette()
+
+
+# --- FONCTIONS UTILITAIRES ---
+def current_territory():
+    key = st.query_params.get("territoire") or os.environ.get("DIAG_TERRITORY", DEFAULT_TERRITORY)
+    return key if key in TERRITORIES else DEFAULT_TERRITORY
+
+
+# --- CHARGEMENT ---
+def geometry(view):
+    # En mode serveur, les arrêts de la version de la vue ne sont rapatriés qu'à la première demande
+    return view.source.geometry(view.tables, view.version)
+
+
+# Résultats dérivés d'une vue, recalculés par le worker avant chaque publication
+DERIVED = {
+    # En mode serveur, le cube est agrégé par Postgres (sql/diagnostic.sql)
+    "cube": lambda v: v.tables["cube"] if "cube" in v.tables else build_cube(v.tables["tours"]),
+    "costs": lambda v: model_costs(v.tables["tours"]),
+    "geo": lambda v: build_geo(geometry(v), get_palette(), v.source.table),
+    "routing": lambda v: optimize_tours(geometry(v), distances=get_distances()),
+    "mutualisation": lambda v: mutualisation_pairs(geometry(v), distances=get_distances()),
+    "scenarios": lambda v: ScenarioEngine(geometry(v), get_distances()),
+    "trends": trends_for,
+    "figures": lambda v: figure_cache(),
+}
+
+
+def load_view(tenants, table):
+    # Vue publiée par le worker ; au premier accès, l'instantané local suffit s'il existe
+    view = tenants.view(table)
+    if view is None:
+        source = tenants.source(table)
+        if source.tables is None:
+            # Démarrage à froid sans instantané : seul cas où une session attend Supabase
+            try:
+                source.refresh()
+            except Exception as e:
+                st.error(f"Erreur de connexion : {e}")
+        view = tenants.publish(table)
+    return view if view is not None and view.source.project_count else None
+
+
+# --- BARRE LATÉRALE ---
+def sidebar_filters(cfg, df):
+    if cfg["logo"]:
+        st.sidebar.image(cfg["logo"], width=150)
+    st.sidebar.title(cfg["sidebar_title"])
+
+    prods_list = sorted(df["Producteur"].unique())
+    st.sidebar.markdown(f"**👨‍🌾 Producteurs ({len(prods_list)})**")
+    selected_prods = st.sidebar.multiselect("Producteurs", prods_list, default=prods_list, label_visibility="collapsed")
+    st.sidebar.markdown("---")
+
+    # Jours présents dans les données, triés selon l'ordre de la semaine
+    days_sorted = sorted(df["Jour"].unique(), key=lambda x: WEEK_DAYS.index(x) if x in WEEK_DAYS else 99)
+    st.sidebar.markdown(f"**📅 Jours ({len(days_sorted)})**")
+    selected_days = st.sidebar.multiselect("Jours de livraison", days_sorted, default=days_sorted, label_visibility="collapsed")
+
+    veh_list = sorted(df["Véhicule"].unique())
+    selected_vehs = veh_list
+    if "Véhicule" in cfg["filters"]:
+        st.sidebar.markdown("---")
+        st.sidebar.markdown(f"**🚚 Flotte Véhicules ({len(veh_list)})**")
+        selected_vehs = st.sidebar.multiselect("Type de véhicule", veh_list, default=veh_list, label_visibility="collapsed")
+
+    show_map = detailed_map = False
+    if "map" in cfg["sections"]:
+        st.sidebar.markdown("---")
+        show_map = st.sidebar.toggle("🗺️ Afficher la carte", value=True, help="Masquée, la carte ne charge ni les arrêts ni les tracés")
+        detailed_map = st.sidebar.toggle("🔍 Carte détaillée", value=False, help="Affiche chaque livraison et les tracés complets, quel que soit le zoom")
+
+    return {
+        "prods": selected_prods, "days": selected_days, "vehs": selected_vehs,
+        "show_map": show_map, "detailed_map": detailed_map,
+    }
+
+
+def sidebar_cache(tenants, warmer):
+    with st.sidebar.expander("⚙️ Mémoire des territoires"):
+        st.dataframe(tenants.stats(), hide_index=True, use_container_width=True)
+        st.dataframe(warmer.stats(), hide_index=True, use_container_width=True)
+
+
+def sidebar_timings(cfg, events):
+    # Panneau d'administration (DIAG_TRACE=1) : temps de l'exécution en cours, étape par étape
+    spans, counters = summary(events)
+    with st.sidebar.expander("⏱️ Temps d'exécution"):
+        st.dataframe(spans.round(1), hide_index=True, use_container_width=True)
+        if not counters.empty:
+            st.dataframe(counters, hide_index=True, use_container_width=True)
+        st.download_button(
+            "Trace Chrome / Perfetto (.json)",
+            data=json.dumps(chrome_trace(events), default=str),
+            file_name=f"trace_{cfg['key']}_{datetime.datetime.now():%Y%m%d_%H%M%S}.json",
+            mime="application/json",
+        )
+
+
+# --- SECTIONS ---
+def section_kpis(ctx):
+    cfg, sel, source = ctx["cfg"], ctx["sel"], ctx["source"]
+    if cfg["kpi_title"]:
+        st.markdown(cfg["kpi_title"])
+
+    # Agrégats lus dans le cube précalculé (producteur × jour × véhicule)
+    kpi = derive(query(ctx["cube"], sel["prods"], sel["days"], sel["vehs"]))
+    for col, (key, label, fmt) in zip(st.columns(len(cfg["kpis"])), cfg["kpis"]):
+        value = source.project_count if key == "projects" else kpi[key]
+        delta = None
+        if key == "cost_ratio" and cfg["ratio_alert"] is not None and value > cfg["ratio_alert"]:
+            delta = f"-{cfg['ratio_alert']}%"
+        col.metric(label, fmt.format(value), delta=delta, delta_color="inverse")
+
+
+def section_map(ctx):
+    cfg, sel = ctx["cfg"], ctx["sel"]
+    st.markdown("### 📍 Visualisation des Flux")
+    if not sel["show_map"]:
+        st.caption("Carte masquée : les arrêts et tracés ne sont pas chargés.")
+        return
+
+    # Arrêts et tracés chargés seulement si la carte est affichée
+    geo = ctx["tenants"].derived(ctx["view"], "geo")
+    filtered_paths, filtered_points = filter_geo(geo, ctx["mask"])
+    if filtered_paths.empty:
+        st.info("La sélection est vide. Ajustez les filtres.")
+        return
+
+    # Centrage automatique
+    init_lat, init_lon, zoom = view_for(filtered_points)
+    view_state = pdk.ViewState(latitude=init_lat, longitude=init_lon, zoom=zoom)
+
+    # Niveau de détail : densité et tracés simplifiés en vue éloignée
+    lod_paths, lod_points, density = level_of_detail(geo, filtered_paths, filtered_points, zoom, detailed=sel["detailed_map"])
+    layers, tooltip = deck_layers(lod_paths, lod_points, geo["colors"], compact=COMPACT_MAP, density=density)
+    r = CompactDeck(layers=layers, initial_view_state=view_state, tooltip=tooltip, map_style=cfg["map_style"])
+    st.pydeck_chart(r)
+
+
+def section_table(ctx):
+    st.markdown("### 📋 Détail Chiffré")
+    st.dataframe(
+        ctx["df_filtered"][DISPLAY_COLUMNS].style.format({
+            "Coût": "{:.2f} €",
+            "Distance": "{:.1f} km",
+            "Volume (kg)": "{:.0f} kg"
+        }),
+        use_container_width=True
+    )
+
+
+def section_costs(ctx):
+    st.markdown("### 🚚 Coûts Recalculés par Véhicule")
+    tours = ctx["df_filtered"]
+    costs = ctx["tenants"].derived(ctx["view"], "costs")[ctx["mask"]]
+    declared, modelled = tours["Coût"].sum(), costs["Coût Modèle"].sum()
+
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Coût Déclaré", f"{declared:,.2f} €")
+    c2.metric(
+        "Coût Modèle", f"{modelled:,.2f} €",
+        delta=f"{(modelled / declared - 1) * 100:+.1f} %" if declared > 0 else None, delta_color="inverse",
+    )
+    c3.metric("Tournées en Surcharge", f"{int(costs['Surcharge'].sum())} / {len(costs)}")
+
+    st.dataframe(
+        cost_summary(tours, costs).style.format({
+            "Coût Déclaré": "{:,.2f} €",
+            "Coût Modèle": "{:,.2f} €",
+            "Écart (%)": "{:+.1f} %"
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
+    overloaded = tours[["Producteur", "Jour", "Tournée", "Véhicule", "Volume (kg)"]].join(costs[["Capacité (kg)", "Charge (%)"]])[costs["Surcharge"]]
+    if not overloaded.empty:
+        st.warning(f"{len(overloaded)} tournée(s) dépassent la charge utile de leur véhicule.")
+        st.dataframe(
+            overloaded.sort_values("Charge (%)", ascending=False).style.format({
+                "Volume (kg)": "{:.0f} kg",
+                "Capacité (kg)": "{:.0f} kg",
+                "Charge (%)": "{:.0f} %"
+            }),
+            use_container_width=True
+        )
+    if costs["Tarif par défaut"].any():
+        st.caption(f"{int(costs['Tarif par défaut'].sum())} tournée(s) sans tarif pour leur véhicule : tarif {DEFAULT_VEHICLE} appliqué.")
+    with st.expander("Tarifs appliqués (€/km, €/heure, €/arrêt, charge utile en kg)"):
+        st.dataframe(rate_table(load_cost_model()), use_container_width=True)
+
+
+def section_routing(ctx):
+    st.markdown("### 🧭 Potentiel d'Optimisation")
+    if not st.checkbox("Comparer chaque tournée à un ordre de passage optimisé"):
+        return
+    with st.spinner("Optimisation des tournées..."):
+        routing = ctx["tenants"].derived(ctx["view"], "routing")
+    opt = routing[ctx["mask"][routing["tour_id"].to_numpy()]].set_index("tour_id")
+
+    o1, o2, o3 = st.columns(3)
+    o1.metric("Tournées Améliorables", f"{(opt['Gain (%)'] >= 1).sum()} / {len(opt)}")
+    o2.metric("Gain Potentiel", f"{opt['Gain (km)'].sum():,.0f} km")
+    o3.metric("Économie Potentielle", f"{opt['Gain (€)'].sum():,.2f} €")
+
+    st.dataframe(
+        ctx["df_filtered"][["Producteur", "Jour", "Tournée", "Distance"]]
+        .join(opt[["Gain (%)", "Gain (km)", "Gain (€)", "Ordre Optimisé"]], how="inner")
+        .sort_values("Gain (€)", ascending=False)
+        .style.format({
+            "Distance": "{:.1f} km",
+            "Gain (%)": "{:.1f} %",
+            "Gain (km)": "{:.1f} km",
+            "Gain (€)": "{:.2f} €"
+        }),
+        use_container_width=True
+    )
+
+
+def section_scenarios(ctx):
+    st.markdown("### 🧪 Simulateur de Scénarios")
+    if not st.checkbox("Tester des variantes : véhicule, dépôt, fusion de jours, petits arrêts"):
+        return
+    with st.spinner("Préparation du simulateur..."):
+        engine = ctx["tenants"].derived(ctx["view"], "scenarios")
+    producers = sorted(set(engine.producer))
+    days = [d for d in WEEK_DAYS if d in set(engine.day)]
+
+    # Une ligne par changement ; les lignes d'un même scénario s'appliquent ensemble
+    examples = [("Petits arrêts < 10 kg", CHANGE_LABELS["seuil"][0], ALL_PRODUCERS, "10")]
+    if len(days) >= 2:
+        examples.append((f"Fusion {days[0]} + {days[1]}", CHANGE_LABELS["fusion"][0], ALL_PRODUCERS, f"{days[0]} > {days[1]}"))
+    if engine.vehicles:
+        examples.append((f"Tout en {engine.vehicles[0]}", CHANGE_LABELS["véhicule"][0], ALL_PRODUCERS, engine.vehicles[0]))
+    st.caption(
+        "Calculé sur l'ensemble des tournées (hors filtres). Valeurs attendues : "
+        + " · ".join(f"{label} : {hint}" for label, hint in CHANGE_LABELS.values())
+    )
+    rows = st.data_editor(
+        pd.DataFrame(examples, columns=["Scénario", "Changement", "Producteur", "Valeur"]),
+        num_rows="dynamic",
+        key="scenario_rows",
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "Scénario": st.column_config.TextColumn(required=True),
+            "Changement": st.column_config.SelectboxColumn(options=[label for label, _ in CHANGE_LABELS.values()], required=True),
+            "Producteur": st.column_config.SelectboxColumn(options=[ALL_PRODUCERS] + producers, default=ALL_PRODUCERS),
+            "Valeur": st.column_config.TextColumn(),
+        },
+    )
+    scenarios, errors = parse_changes(rows.itertuples(index=False, name=None), engine.vehicles, days)
+    for error in errors:
+        st.warning(error)
+    if not scenarios:
+        return
+
+    with st.spinner("Évaluation des scénarios..."):
+        results = engine.compare(scenarios)
+    st.dataframe(
+        results.style.format({
+            "Km": "{:,.0f} km", "Δ Km": "{:+,.0f} km",
+            "Coût (€)": "{:,.2f} €", "Δ Coût (€)": "{:+,.2f} €",
+            "Volume (kg)": "{:,.0f} kg", "€/kg": "{:.3f} €", "Δ €/kg": "{:+.3f} €",
+        }),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def section_mutualisation(ctx):
+    sel = ctx["sel"]
+    st.markdown("### 🤝 Pistes de Mutualisation")
+    if not st.checkbox("Rechercher les clients communs et simuler des tournées mutualisées"):
+        return
+    with st.spinner("Analyse des clients communs..."):
+        pairs, shared = ctx["tenants"].derived(ctx["view"], "mutualisation")
+    pairs = pairs[
+        pairs["Producteur A"].isin(sel["prods"]) &
+        pairs["Producteur B"].isin(sel["prods"]) &
+        pairs["Jour"].isin(sel["days"])
+    ]
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Clients Partagés", f"{shared['Producteurs'].apply(lambda p: len(set(p) & set(sel['prods'])) >= 2).sum()}")
+    m2.metric("Binômes Simulés", f"{len(pairs)}")
+    m3.metric("Meilleure Économie", f"{pairs['Gain (€)'].max() if not pairs.empty else 0:,.2f} €")
+
+    st.dataframe(
+        pairs.style.format({
+            "Km Séparés": "{:.1f} km",
+            "Km Mutualisés": "{:.1f} km",
+            "Gain (%)": "{:.1f} %",
+            "Gain (km)": "{:.1f} km",
+            "Gain (€)": "{:.2f} €"
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+def section_charts(ctx):
+    cfg, sel = ctx["cfg"], ctx["sel"]
+    # Figures mémorisées par état des filtres, pour la version de données affichée
+    figures = ctx["tenants"].derived(ctx["view"], "figures")
+    key = selection_key(cfg["key"], sel)
+    st.markdown("---")
+    col_left, col_right = st.columns(2)
+
+    with col_left:
+        st.subheader("💰 Équilibre Économique par Producteur")
+        fig_bar = cached_figure(figures, ("bar",) + key, lambda: producer_bar(ctx["cube"], sel))
+        st.plotly_chart(fig_bar, use_container_width=True)
+
+    with col_right:
+        st.subheader("🎯 Efficacité Logistique (Ratio vs CA)")
+        fig_scatter = cached_figure(figures, ("scatter",) + key, lambda: efficiency_scatter(
+            export_view(ctx["df_filtered"]), cfg["ratio_alert"], cfg["scatter_webgl_rows"], cfg["scatter_density_rows"],
+        ))
+        st.plotly_chart(fig_scatter, use_container_width=True)
+
+
+def section_trends(ctx):
+    cfg, sel = ctx["cfg"], ctx["sel"]
+    trends = ctx["tenants"].derived(ctx["view"], "trends")
+    figures = ctx["tenants"].derived(ctx["view"], "figures")
+    st.markdown("---")
+    st.subheader("📈 Évolution dans le Temps")
+    col_period, col_metric = st.columns([1, 2])
+    period = col_period.radio("Pas de temps", list(PERIODS), horizontal=True, key="trend_period")
+    metric = col_metric.selectbox("Indicateur", list(TREND_METRICS), key="trend_metric")
+    fig = cached_figure(figures, ("trend", period, metric) + selection_key(cfg["key"], sel),
+                        lambda: trend_chart(trend_series(trends, period, sel, metric), metric))
+    st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("🔁 Soumissions successives d'un producteur"):
+        producer = st.selectbox("Producteur", sorted(sel["prods"]), key="trend_producer")
+        if producer is not None:
+            st.dataframe(
+                producer_history(trends, producer).style.format({
+                    "Distance": "{:.1f} km",
+                    "Km par arrêt": "{:.1f} km",
+                    "Ratio logistique (%)": "{:.1f} %",
+                    "Évolution du ratio (pts)": "{:+.1f}",
+                }, na_rep="-"),
+                column_config={"Date": st.column_config.DatetimeColumn("Date", format="DD/MM/YYYY HH:mm")},
+                use_container_width=True,
+                hide_index=True,
+            )
+
+
+def section_registry(ctx):
+    filtered_df = export_view(ctx["df_filtered"])
+    st.subheader("📑 Registre des Tournées Analysées")
+    st.dataframe(
+        filtered_df.sort_values(by="Ratio (%)", ascending=False),
+        column_config={
+            "Ratio (%)": st.column_config.ProgressColumn(
+                "Ratio Log.",
+                help="Coût divisé par le CA",
+                format="%.1f%%",
+                min_value=0,
+                max_value=100,
+            ),
+            "CA (€)": st.column_config.NumberColumn("CA (€)", format="%.2f €"),
+            "Coût (€)": st.column_config.NumberColumn("Coût (€)", format="%.2f €"),
+            "Nb Arrêts": st.column_config.NumberColumn("Arrêts", format="%d 🛑"),
+            "Date": st.column_config.DatetimeColumn("Date", format="DD/MM/YYYY"),
+        },
+        use_container_width=True,
+        hide_index=True
+    )
+
+
+def section_export(ctx):
+    # --- EXPORTATION ---
+    # Fichier produit au clic seulement (cf. exports.py), jamais à chaque exécution de la page
+    cfg, view, mask = ctx["cfg"], ctx["view"], ctx["mask"]
+    tours = ctx["df_filtered"]
+    st.markdown("### 📥 Export des données")
+    col_format, col_detail = st.columns([2, 1])
+    fmt = col_format.radio(
+        "Format", available_formats(), format_func=lambda f: FORMATS[f][0], horizontal=True, key="export_format",
+    )
+    detail = col_detail.toggle(
+        "Détail par arrêt", key="export_detail",
+        help="Une ligne par livraison (client, position, volume) au lieu d'une ligne par tournée",
+    )
+
+    def export_data():
+        with span(f"export.{fmt}", tours=len(tours), detail=detail):
+            chunks = stop_chunks(geometry(view), mask) if detail else tour_chunks(tours)
+            return export_file(chunks, fmt).getvalue()
+
+    prefix = cfg["export_prefix"] or f"diagnostic_{cfg['key']}"
+    suffix = "_arrets" if detail else ""
+    st.download_button(
+        label=f"Télécharger le rapport ({FORMATS[fmt][0]})",
+        data=export_data,
+        file_name=f"{prefix}{suffix}_{datetime.date.today()}.{fmt}",
+        mime=FORMATS[fmt][1],
+    )
+
+
+SECTIONS = {
+    "kpis": section_kpis,
+    "map": section_map,
+    "table": section_table,
+    "costs": section_costs,
+    "routing": section_routing,
+    "mutualisation": section_mutualisation,
+    "scenarios": section_scenarios,
+    "charts": section_charts,
+    "trends": section_trends,
+    "registry": section_registry,
+    "export": section_export,
+}
+
+
+def footer(cfg):
+    if cfg["footer"]:
+        st.markdown("---")
+        st.caption(f"{cfg['footer']} | Dernière mise à jour : {datetime.datetime.now().strftime('%H:%M:%S')}")
+
+
+# --- PAGE ---
+def run(key=None):
+    cfg = territory(key or current_territory())
+    with Collector() as events:
+        with span("page", territoire=cfg["key"]):
+            render(cfg)
+    if enabled():
+        sidebar_timings(cfg, events)
+
+
+def render(cfg):
+    st.set_page_config(page_title=cfg["page_title"], page_icon=cfg["page_icon"], layout="wide")
+    if cfg["css"]:
+        st.markdown(cfg["css"], unsafe_allow_html=True)
+    st.title(cfg["title"])
+    if cfg["subtitle"]:
+        st.markdown(cfg["subtitle"])
+
+    tenants, warmer = get_tenants(), get_warmer()
+    table = cfg["table"]
+    view = load_view(tenants, table)
+    if not view:
+        if cfg["logo"]:
+            st.info(cfg["no_data"])
+            st.image(cfg["logo"], width=200)
+        else:
+            st.warning(cfg["no_data"])
+        footer(cfg)
+        return
+
+    source = view.source
+    # Envois dont le contenu ne respecte pas le schéma attendu : signalés plutôt qu'ignorés
+    if source.rejected:
+        with st.expander(f"⚠️ {len(source.rejected)} envoi(s) illisible(s) non pris en compte"):
+            st.dataframe(pd.DataFrame(sorted(source.rejected.items()), columns=["ID_Projet", "Motif"]), hide_index=True, use_container_width=True)
+
+    df = view.tables["tours"]
+    sel = sidebar_filters(cfg, df)
+    sidebar_cache(tenants, warmer)
+    with span("filtres"):
+        mask = tour_mask(df, sel["prods"], sel["days"], sel["vehs"])
+    if not mask.any():
+        st.warning(cfg["no_match"])
+        footer(cfg)
+        return
+
+    ctx = {
+        "cfg": cfg, "tenants": tenants, "view": view, "source": source, "sel": sel,
+        "mask": mask, "df_filtered": df[mask], "cube": tenants.derived(view, "cube"),
+    }
+    for section in cfg["sections"]:
+        with span(f"section.{section}"):
+            SECTIONS[section](ctx)
+    footer(cfg)
+
+
+if __name__ == "__main__":
+    run()
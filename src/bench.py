@@ -0,0 +1,228 @@
+# --- BANC D'ESSAI DU PIPELINE ---
+# Chronomètre chaque étape des dashboards sur des données synthétiques (synthetic.py) à
+# plusieurs échelles et mesure le pic de mémoire Python de chacune (tracemalloc, passe
+# séparée pour ne pas fausser les temps). Les résultats sont comparés aux références de
+# bench/baselines.json : une étape plus lente ou plus gourmande que la tolérance est signalée
+# et le code de sortie vaut 1, pour bloquer un déploiement.
+#
+#   python src/bench.py                               -> compare aux références
+#   python src/bench.py --scales 100 10000 --save     -> enregistre de nouvelles références
+#   python src/bench.py --scales 1000000 --heavy      -> inclut optimisation et mutualisation
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from charts import efficiency_scatter, producer_bar
+from flatten import assemble, export_view, flatten_row, write_export_csv
+from kpi import build_cube, derive, query
+from layers import CompactDeck, build_geo, deck_layers, filter_geo, level_of_detail, tour_mask, view_for
+from mutualisation import mutualisation_pairs
+from palette import Palette
+from routing import optimize_tours
+from store import load_snapshot, save_snapshot
+from synthetic import iter_rows
+
+BASELINES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench", "baselines.json")
+DEFAULT_SCALES = [100, 1_000, 10_000, 100_000]
+TIME_TOLERANCE = 0.30
+MEMORY_TOLERANCE = 0.20
+NOISE_FLOOR_MS = 25.0  # écarts absolus en dessous : bruit de mesure
+NOISE_FLOOR_MB = 1.0
+
+
+# --- ÉTAPES ---
+# Chaque étape lit les résultats des précédentes dans `ctx` et y range le sien
+def stage_decode(ctx):
+    ctx["parts"] = [flatten_row(r) for r in ctx["rows"]]
+
+
+def stage_assemble(ctx):
+    ctx["tables"] = assemble(ctx["parts"])
+
+
+def stage_cube(ctx):
+    ctx["cube"] = build_cube(ctx["tables"]["tours"])
+
+
+def stage_filters(ctx):
+    # Sélection type : la moitié des producteurs, tous les jours et véhicules
+    tours = ctx["tables"]["tours"]
+    prods = list(tours["Producteur"].cat.categories[::2])
+    ctx["selection"] = (prods, list(tours["Jour"].unique()), list(tours["Véhicule"].unique()))
+    ctx["mask"] = tour_mask(tours, *ctx["selection"])
+
+
+def stage_kpis(ctx):
+    ctx["kpis"] = derive(query(ctx["cube"], *ctx["selection"]))
+
+
+def stage_export(ctx):
+    buffer = io.StringIO()
+    write_export_csv(ctx["tables"]["tours"][ctx["mask"]], buffer)
+    ctx["export"] = buffer.getvalue()
+
+
+def stage_charts(ctx):
+    prods, days, vehs = ctx["selection"]
+    sel = {"prods": prods, "days": days, "vehs": vehs}
+    ctx["charts"] = (
+        producer_bar(ctx["cube"], sel).to_json(),
+        efficiency_scatter(export_view(ctx["tables"]["tours"][ctx["mask"]]), 20).to_json(),
+    )
+
+
+def stage_geo(ctx):
+    ctx["geo"] = build_geo(ctx["tables"], Palette(path=None))
+
+
+def stage_map(ctx):
+    paths, points = filter_geo(ctx["geo"], ctx["mask"])
+    lat, lon, zoom = view_for(points)
+    lod_paths, lod_points, density = level_of_detail(ctx["geo"], paths, points, zoom)
+    layers, tooltip = deck_layers(lod_paths, lod_points, ctx["geo"]["colors"], compact=True, density=density)
+    ctx["payload"] = CompactDeck(layers=layers, tooltip=tooltip).to_json()
+
+
+def stage_snapshot(ctx):
+    with tempfile.TemporaryDirectory() as tmp:
+        save_snapshot(tmp, ctx["tables"], {})
+        tables, _ = load_snapshot(tmp)
+        del tables
+
+
+def stage_routing(ctx):
+    ctx["routing"] = optimize_tours(ctx["tables"], workers=1)
+
+
+def stage_mutualisation(ctx):
+    ctx["mutualisation"] = mutualisation_pairs(ctx["tables"], workers=1)
+
+
+STAGES = [
+    ("décodage", stage_decode),
+    ("assemblage", stage_assemble),
+    ("cube", stage_cube),
+    ("filtres", stage_filters),
+    ("indicateurs", stage_kpis),
+    ("export csv", stage_export),
+    ("graphiques", stage_charts),
+    ("géométrie carte", stage_geo),
+    ("couches pydeck", stage_map),
+    ("instantané arrow", stage_snapshot),
+]
+HEAVY_STAGES = [
+    ("optimisation", stage_routing),
+    ("mutualisation", stage_mutualisation),
+]
+
+
+# --- MESURES ---
+def measure(stages, ctx, repeat):
+    results = {}
+    for name, func in stages:
+        best = float("inf")
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            func(ctx)
+            best = min(best, time.perf_counter() - start)
+
+        gc.collect()
+        tracemalloc.start()
+        func(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {"ms": round(best * 1000, 2), "peak_mb": round(peak / 1e6, 2)}
+    return results
+
+
+def run_scale(n_stops, repeat, heavy=False, seed=0):
+    ctx = {"rows": list(iter_rows(n_stops, seed=seed))}
+    results = measure(STAGES + (HEAVY_STAGES if heavy else []), ctx, repeat)
+    tours = ctx["tables"]["tours"]
+    return {
+        "rows": len(ctx["rows"]), "tours": len(tours), "stops": len(ctx["tables"]["stops"]),
+        "stages": results,
+    }
+
+
+# --- RÉFÉRENCES ---
+def load_baselines(path=BASELINES):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baselines(results, path=BASELINES):
+    baselines = load_baselines(path)
+    baselines.setdefault("scales", {}).update(results)
+    baselines["machine"] = {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def regressions(current, reference, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    found = []
+    for stage, now in current["stages"].items():
+        ref = reference["stages"].get(stage)
+        if ref is None:
+            continue
+        if now["ms"] > ref["ms"] * (1 + time_tolerance) and now["ms"] - ref["ms"] > NOISE_FLOOR_MS:
+            found.append((stage, "temps", ref["ms"], now["ms"]))
+        if now["peak_mb"] > ref["peak_mb"] * (1 + memory_tolerance) and now["peak_mb"] - ref["peak_mb"] > NOISE_FLOOR_MB:
+            found.append((stage, "mémoire", ref["peak_mb"], now["peak_mb"]))
+    return found
+
+
+def report(n_stops, current, reference):
+    print(f"\n{n_stops} arrêts : {current['rows']} soumissions, {current['tours']} tournées")
+    print(f"  {'étape':<20} {'temps':>10} {'réf.':>10} {'pic mémoire':>12} {'réf.':>10}")
+    for stage, now in current["stages"].items():
+        ref = (reference or {}).get("stages", {}).get(stage, {})
+        ref_ms = f"{ref['ms']:.1f} ms" if "ms" in ref else "-"
+        ref_mb = f"{ref['peak_mb']:.1f} Mo" if "peak_mb" in ref else "-"
+        print(f"  {stage:<20} {now['ms']:>7.1f} ms {ref_ms:>10} {now['peak_mb']:>9.1f} Mo {ref_mb:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Temps et mémoire de chaque étape du pipeline")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="nombres d'arrêts synthétiques")
+    parser.add_argument("--repeat", type=int, default=3, help="meilleur temps sur N passes")
+    parser.add_argument("--heavy", action="store_true", help="inclut optimisation des tournées et mutualisation")
+    parser.add_argument("--save", action="store_true", help="enregistre les résultats comme nouvelles références")
+    parser.add_argument("--baselines", default=BASELINES)
+    args = parser.parse_args(argv)
+
+    reference = load_baselines(args.baselines).get("scales", {})
+    results, failures = {}, []
+    for n_stops in args.scales:
+        current = results[str(n_stops)] = run_scale(n_stops, args.repeat, heavy=args.heavy)
+        report(n_stops, current, reference.get(str(n_stops)))
+        if str(n_stops) in reference:
+            failures += [(n_stops,) + r for r in regressions(current, reference[str(n_stops)])]
+
+    if args.save:
+        save_baselines(results, args.baselines)
+        print(f"\nRéférences enregistrées dans {args.baselines}")
+        return 0
+    if failures:
+        print("\nRégressions :")
+        for n_stops, stage, kind, ref, now in failures:
+            print(f"  {n_stops} arrêts, {stage} ({kind}) : {ref} -> {now}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
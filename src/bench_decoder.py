@@ -0,0 +1,152 @@
+# --- BANC D'ESSAI DU DÉCODAGE ---
+# Compare le débit d'aplatissement de `data_json` (chaîne JSON) entre l'approche historique
+# des dashboards (json.loads + chaînes de .get() + float() champ par champ, tuples par
+# tournée) et le décodeur validé (schéma compilé, colonnes typées), avec chaque backend JSON.
+#
+#   python src/bench_decoder.py --rows 5000 --tours 6 --stops 12
+
+import argparse
+import json
+import random
+import time
+
+import pandas as pd
+
+import decoder
+from flatten import PATH_COLUMNS, STOP_COLUMNS, TOUR_COLUMNS, assemble, flatten_row
+
+
+# --- APPROCHE HISTORIQUE (référence) ---
+def legacy_to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def legacy_to_coord(value):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def legacy_flatten_row(row):
+    content = row.get("data_json")
+    if isinstance(content, str):
+        try:
+            content = json.loads(content)
+        except ValueError:
+            content = {}
+    content = content if isinstance(content, dict) else {}
+
+    depot_data = content.get("depot") or {}
+    depot_coords = depot_data.get("pData") or {}
+    vehicle_type = (depot_data.get("veh") or {}).get("type", "Non précisé")
+    depot_lon = legacy_to_coord(depot_coords.get("lon"))
+    depot_lat = legacy_to_coord(depot_coords.get("lat"))
+    has_depot = depot_lon is not None and depot_lat is not None
+
+    tours, stops, paths = [], [], []
+    for i, t in enumerate(content.get("tours") or []):
+        t_stops = t.get("stops") or []
+        stats = t.get("stats") or {}
+        tours.append((
+            row.get("id"), row.get("nom_producteur", "Inconnu"), row.get("created_at"),
+            t.get("day", "Indéfini"), t.get("name", "Sans nom"), vehicle_type,
+            legacy_to_float(stats.get("ca", 0)), legacy_to_float(stats.get("cost", 0)),
+            legacy_to_float(stats.get("ratio", 0)), legacy_to_float(stats.get("dist", 0)),
+            legacy_to_float(stats.get("time", 0)),
+            sum(legacy_to_float(s.get("vol", 0)) for s in t_stops), len(t_stops),
+            depot_lon, depot_lat,
+        ))
+        path = [[depot_lon, depot_lat]] if has_depot else None
+        for order, s in enumerate(t_stops):
+            lon, lat = legacy_to_coord(s.get("lon")), legacy_to_coord(s.get("lat"))
+            stops.append((i, order, s.get("client"), lon, lat, legacy_to_float(s.get("vol", 0))))
+            if path is not None and lon is not None and lat is not None:
+                path.append([lon, lat])
+        if path is not None:
+            path.append([depot_lon, depot_lat])
+            paths.append((i, path))
+    return tours, stops, paths
+
+
+def legacy_assemble(parts):
+    tours, stops, paths = [], [], []
+    for row_tours, row_stops, row_paths in parts:
+        offset = len(tours)
+        tours.extend(row_tours)
+        stops.extend((offset + s[0],) + s[1:] for s in row_stops)
+        paths.extend((offset + p[0], p[1]) for p in row_paths)
+    return (pd.DataFrame.from_records(tours, columns=TOUR_COLUMNS), pd.DataFrame.from_records(stops, columns=STOP_COLUMNS),
+            pd.DataFrame.from_records(paths, columns=PATH_COLUMNS))
+
+
+# --- DONNÉES ---
+def sample_rows(n_rows, n_tours, n_stops, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        lon0, lat0 = 6.5 + rng.random(), 43.6 + rng.random()
+        content = {
+            "depot": {"pData": {"lon": lon0, "lat": lat0}, "veh": {"type": rng.choice(["VUL", "Camion", "Voiture"])}},
+            "tours": [{
+                "day": rng.choice(["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi"]),
+                "name": f"Tournée {t + 1}",
+                "stats": {"ca": rng.uniform(200, 2000), "cost": rng.uniform(20, 200), "ratio": rng.uniform(2, 30),
+                          "dist": rng.uniform(10, 150), "time": rng.uniform(30, 300)},
+                "stops": [{"client": f"Client {rng.randrange(500)}", "lon": lon0 + rng.gauss(0, 0.05),
+                           "lat": lat0 + rng.gauss(0, 0.05), "vol": rng.uniform(1, 50)} for _ in range(n_stops)],
+            } for t in range(n_tours)],
+        }
+        rows.append({"id": i + 1, "nom_producteur": f"Producteur {i % 50}", "created_at": "2024-05-01T08:00:00+00:00",
+                     "data_json": json.dumps(content)})
+    return rows
+
+
+def timed(func, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Débit d'aplatissement de data_json")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--tours", type=int, default=6)
+    parser.add_argument("--stops", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rows = sample_rows(args.rows, args.tours, args.stops)
+    size_mb = sum(len(r["data_json"]) for r in rows) / 1e6
+    runs = [
+        ("historique (json + .get)", lambda rs: [legacy_flatten_row(r) for r in rs]),
+        ("historique + assemblage", lambda rs: legacy_assemble(legacy_flatten_row(r) for r in rs)),
+    ]
+    backends = ["orjson", "json"] if decoder.orjson is not None else ["json"]
+    for backend in backends:
+        def run(rs, backend=backend):
+            saved = decoder.orjson
+            decoder.orjson = saved if backend == "orjson" else None
+            try:
+                return [flatten_row(r) for r in rs]
+            finally:
+                decoder.orjson = saved
+        runs.append((f"décodeur validé ({backend})", run))
+    runs.append(("décodeur validé + assemblage", lambda rs: assemble(flatten_row(r) for r in rs)))
+
+    print(f"{args.rows} lignes, {args.rows * args.tours} tournées, {args.rows * args.tours * args.stops} arrêts, {size_mb:.1f} Mo de JSON")
+    for label, func in runs:
+        elapsed = timed(func, rows, args.repeat)
+        print(f"{label:<32} {elapsed * 1000:8.0f} ms  {args.rows / elapsed:9.0f} lignes/s  {size_mb / elapsed:6.1f} Mo/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+# --- GRAPHIQUES AGRÉGÉS ---
+# Les graphiques du tableau de bord ne transmettent pas une marque par tournée :
+#   - barres CA / coût : une barre par producteur, sommée depuis le cube d'indicateurs ;
+#   - nuage ratio / CA : SVG jusqu'à quelques milliers de tournées, une trace WebGL
+#     (scattergl) au-delà, puis grille de densité calculée côté serveur pour les gros volumes ;
+#   - évolution : un point par période et par producteur, lu dans les agrégats de trends.py.
+# Les figures sont mémorisées par état des filtres dans la vue publiée (cf. tenants.py) :
+# une exécution qui ne change pas la sélection ne reconstruit rien.
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+
+from instrument import span
+from kpi import CUBE_KEYS
+from tenants import nbytes
+
+FIGURE_CACHE_SIZE = 32  # états de filtres mémorisés par vue
+BAR_COLORS = ["#27ae60", "#e74c3c"]
+DENSITY_BINS = (60, 40)
+
+_lock = threading.Lock()  # caches partagés par les sessions d'une même vue
+
+
+class FigureCache(OrderedDict):
+    # Figures d'une vue par état des filtres ; nbytes() mesure chaque nouvelle figure une fois
+    def __init__(self):
+        super().__init__()
+        self._sizes = {}
+
+    def nbytes(self):
+        with _lock:
+            figures = list(self.items())
+        self._sizes = {key: self._sizes.get(key) or nbytes(figure.to_plotly_json()) for key, figure in figures}
+        return sum(self._sizes.values())
+
+
+def figure_cache():
+    return FigureCache()
+
+
+def cached_figure(cache, key, build):
+    with _lock:
+        figure = cache.get(key)
+        if figure is not None:
+            cache.move_to_end(key)
+            return figure
+    figure = build()
+    with _lock:
+        cache[key] = figure
+        if len(cache) > FIGURE_CACHE_SIZE:
+            cache.popitem(last=False)
+    return figure
+
+
+def selection_key(territory_key, sel):
+    return (territory_key, tuple(sorted(sel["prods"])), tuple(sorted(sel["days"])), tuple(sorted(sel["vehs"])))
+
+
+def producer_bar(cube, sel):
+    # Une barre par producteur et par mesure, quel que soit le nombre de tournées
+    with span("graphique.barres", cells=len(cube)):
+        mask = cube[CUBE_KEYS[0]].isin(sel["prods"]) & cube[CUBE_KEYS[1]].isin(sel["days"]) & cube[CUBE_KEYS[2]].isin(sel["vehs"])
+        by_producer = (
+            cube[mask].groupby("Producteur", observed=True)[["CA", "Coût"]].sum()
+            .rename(columns={"CA": "CA (€)", "Coût": "Coût (€)"}).reset_index()
+        )
+        by_producer["Producteur"] = by_producer["Producteur"].astype(str)
+        return px.bar(
+            by_producer,
+            x="Producteur",
+            y=["CA (€)", "Coût (€)"],
+            barmode="group",
+            color_discrete_sequence=BAR_COLORS,
+            template="plotly_white"
+        )
+
+
+def _density(tours):
+    # Cases calculées ici : seule la matrice des effectifs est transmise au navigateur
+    x, y = tours["CA (€)"].to_numpy(), tours["Ratio (%)"].to_numpy()
+    counts, x_edges, y_edges = np.histogram2d(x, y, bins=DENSITY_BINS)
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=np.where(counts.T > 0, counts.T, np.nan),
+        colorscale="Blues",
+        colorbar={"title": "Tournées"},
+        hovertemplate="CA ≈ %{x:,.0f} €<br>Ratio ≈ %{y:.1f} %<br>%{z:.0f} tournées<extra></extra>",
+    ))
+    return fig.update_layout(template="plotly_white", xaxis_title="CA (€)", yaxis_title="Ratio (%)")
+
+
+def _webgl(tours):
+    # Une seule trace WebGL : la couleur suit le producteur sans une trace (et une légende) par producteur
+    prod = tours["Producteur"]
+    size = tours["Distance (km)"].to_numpy()
+    fig = go.Figure(go.Scattergl(
+        x=tours["CA (€)"].to_numpy(),
+        y=tours["Ratio (%)"].to_numpy(),
+        mode="markers",
+        marker={
+            "size": size, "sizemode": "area", "sizeref": 2 * max(size.max(), 1) / 40 ** 2, "sizemin": 2,
+            "color": prod.cat.codes.to_numpy(), "colorscale": "Turbo", "opacity": 0.6,
+        },
+        text=prod.astype(str).to_numpy(),
+        hovertext=tours["Tournée"].astype(str).to_numpy(),
+        hovertemplate="<b>%{hovertext}</b><br>%{text}<br>CA %{x:,.0f} €<br>Ratio %{y:.1f} %<extra></extra>",
+    ))
+    return fig.update_layout(template="plotly_white", xaxis_title="CA (€)", yaxis_title="Ratio (%)")
+
+
+def efficiency_scatter(tours, ratio_alert=None, webgl_rows=5_000, density_rows=50_000):
+    with span("graphique.nuage", tours=len(tours)):
+        if len(tours) > density_rows:
+            fig = _density(tours)
+        elif len(tours) > webgl_rows:
+            fig = _webgl(tours)
+        else:
+            fig = px.scatter(
+                tours,
+                x="CA (€)",
+                y="Ratio (%)",
+                size="Distance (km)",
+                color="Producteur",
+                hover_name="Tournée",
+                template="plotly_white",
+                size_max=40
+            )
+        # Ligne de seuil de rentabilité critique
+        if ratio_alert is not None:
+            fig.add_hline(y=ratio_alert, line_dash="dot", line_color="#e67e22", annotation_text="Seuil critique")
+        return fig
+
+
+def trend_chart(series, metric):
+    with span("graphique.tendance", points=len(series)):
+        fig = px.line(series, x="Période", y=metric, color="Producteur", markers=True, template="plotly_white")
+        return fig.update_layout(xaxis_title=None, legend_title=None)
@@ -0,0 +1,205 @@
+# --- DIAGNOSTIC EN LIGNE DE COMMANDE ---
+# Calcule le diagnostic sans Streamlit, à partir d'un export local de la table (tableau
+# JSON ou NDJSON) ou d'une instance Supabase locale. Les lignes sont traitées par lots :
+# chaque lot est aplati, ajouté au cube d'indicateurs (mesures additives) et écrit dans
+# l'export CSV, puis libéré. La mémoire reste bornée par la taille d'un lot, celle du cube
+# (producteurs × jours × véhicules) et la fenêtre d'ids récents gardée pour écarter les doublons.
+#
+#   python src/cli.py export_tournees.ndjson -o resultats/
+#   python src/cli.py --supabase-url http://localhost:54321 --supabase-key ... --table tournees_catl
+#   python src/standin.py data.ndjson --port 54321   -> API REST de substitution pour la commande précédente
+#   python src/cli.py export_tournees.ndjson --trace trace.json    -> temps par étape (chrome://tracing)
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+
+import pandas as pd
+
+import instrument
+from flatten import assemble, flatten_row, write_export_csv
+from kpi import CUBE_KEYS, build_cube, derive, merge_cubes, query
+from rest import ASYNC_FETCH, RestClient
+from sync import PAGE_SIZE, fetch_pages
+
+BATCH_SIZE = 500
+READ_CHUNK = 1 << 20  # caractères lus à la fois dans un tableau JSON
+# Ids récents mémorisés pour écarter les doublons (pages qui se chevauchent) : un doublon plus
+# éloigné dans le flux serait compté deux fois
+DEDUP_WINDOW = 200_000
+KEY_ARGS = dict(zip(CUBE_KEYS, ("selected_prods", "selected_days", "selected_vehs")))
+
+
+# --- LECTURE EN FLUX ---
+def iter_json_array(f, chunk_size=READ_CHUNK):
+    # Décode les éléments d'un tableau JSON un par un, sans charger le fichier entier
+    decoder = json.JSONDecoder()
+    buf, pos, started, eof = "", 0, False, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Le fichier ne commence pas par un tableau JSON")
+                started, pos = True, pos + 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                pos = end
+                continue
+        if eof:
+            raise ValueError("Tableau JSON incomplet")
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+def iter_ndjson(f):
+    for line in f:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_file_rows(path):
+    with open(path, encoding="utf-8") as f:
+        head = f.read(1)
+        while head and head.isspace():
+            head = f.read(1)
+        f.seek(0)
+        yield from (iter_json_array(f) if head == "[" else iter_ndjson(f))
+
+
+def iter_supabase_rows(url, key, table, page_size=PAGE_SIZE):
+    if ASYNC_FETCH:
+        # Pages demandées en parallèle, lignes rendues dans l'ordre d'arrivée des pages
+        yield from RestClient(url, key).rows(table, page_size=page_size)
+        return
+    from supabase import create_client
+    client = create_client(url, key)
+    for page in fetch_pages(client, table, page_size=page_size):
+        yield from page
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- CALCUL ---
+def run(rows, out_dir, batch_size=BATCH_SIZE, log=print, dedup_window=DEDUP_WINDOW):
+    os.makedirs(out_dir, exist_ok=True)
+    export_path = os.path.join(out_dir, "export_tournees.csv")
+    for name in ("export_tournees.csv", "lignes_rejetees.csv"):
+        if os.path.exists(os.path.join(out_dir, name)):
+            os.remove(os.path.join(out_dir, name))
+
+    cube, seen, recent, rejected = merge_cubes([]), set(), deque(), []
+    n_rows = n_skipped = n_tours = 0
+    for batch in batched(rows, batch_size):
+        parts = []
+        for row in batch:
+            row_id = row.get("id")
+            # Une ligne déjà vue ne peut plus être retirée des agrégats écrits : la première fait foi
+            if row_id is not None and row_id in seen:
+                n_skipped += 1
+                continue
+            seen.add(row_id)
+            recent.append(row_id)
+            if len(recent) > dedup_window:
+                seen.discard(recent.popleft())
+            part = flatten_row(row)
+            if part.error:
+                rejected.append((row_id, part.error))
+            parts.append(part)
+        n_rows += len(parts)
+        with instrument.span("assemblage", rows=len(parts)):
+            tables = assemble(parts)
+        tours = tables["tours"]
+        if tours.empty:
+            continue
+        n_tours += len(tours)
+        cube = merge_cubes([cube, build_cube(tours)])
+        with instrument.span("export.csv", tours=len(tours)), open(export_path, "a", encoding="utf-8-sig", newline="") as f:
+            write_export_csv(tours, f, header=f.tell() == 0)
+        log(f"{n_rows} projets, {n_tours} tournées traités")
+
+    write_kpis(cube, out_dir)
+    if n_skipped:
+        log(f"{n_skipped} lignes en double ignorées")
+    if rejected:
+        pd.DataFrame(rejected, columns=["ID_Projet", "Motif"]).to_csv(os.path.join(out_dir, "lignes_rejetees.csv"), index=False, encoding="utf-8-sig")
+        log(f"{len(rejected)} lignes rejetées (contenu non conforme), voir lignes_rejetees.csv")
+    return cube
+
+
+def kpi_table(cube, by):
+    rows = []
+    for value in cube[by].unique():
+        kpis = derive(query(cube, **{KEY_ARGS[by]: [value]}))
+        rows.append({by: value, **kpis})
+    return pd.DataFrame(rows)
+
+
+def write_kpis(cube, out_dir):
+    cube.to_csv(os.path.join(out_dir, "cube_indicateurs.csv"), index=False, encoding="utf-8-sig")
+    for by, name in zip(CUBE_KEYS, ("producteur", "jour", "vehicule")):
+        kpi_table(cube, by).to_csv(os.path.join(out_dir, f"indicateurs_par_{name}.csv"), index=False, encoding="utf-8-sig")
+    totals = {k: getattr(v, "item", lambda: v)() for k, v in derive(query(cube)).items()}
+    # Indicateur indéfini (aucune tournée) : null, NaN n'étant pas du JSON valide
+    totals = {k: None if isinstance(v, float) and not math.isfinite(v) else v for k, v in totals.items()}
+    with open(os.path.join(out_dir, "indicateurs_globaux.json"), "w", encoding="utf-8") as f:
+        json.dump(totals, f, ensure_ascii=False, indent=2, allow_nan=False)
+
+
+# --- POINT D'ENTRÉE ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diagnostic logistique sans interface (KPI + export CSV)")
+    parser.add_argument("input", nargs="?", help="Export local de la table (tableau JSON ou NDJSON)")
+    parser.add_argument("-o", "--output", default="resultats", help="Dossier de sortie")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Lignes aplaties par lot")
+    parser.add_argument("--supabase-url", default=os.environ.get("SUPABASE_URL"), help="Instance Supabase (locale) à lire à la place d'un fichier")
+    parser.add_argument("--supabase-key", default=os.environ.get("SUPABASE_KEY"))
+    parser.add_argument("--table", default="tournees", help="Table Supabase à lire")
+    parser.add_argument("--trace", help="Fichier de trace (format Chrome Trace) des étapes chronométrées")
+    args = parser.parse_args(argv)
+    if args.trace:
+        instrument.enable()
+
+    if args.input:
+        rows = iter_file_rows(args.input)
+    elif args.supabase_url and args.supabase_key:
+        rows = iter_supabase_rows(args.supabase_url, args.supabase_key, args.table)
+    else:
+        parser.error("Indiquer un fichier d'export ou --supabase-url / --supabase-key")
+
+    start = time.perf_counter()
+    cube = run(rows, args.output, args.batch_size, log=lambda msg: print(msg, file=sys.stderr))
+    totals = derive(query(cube))
+    print(f"{totals['n_tours']} tournées, {totals['total_km']:.0f} km, {totals['total_cost']:.0f} € "
+          f"({time.perf_counter() - start:.1f} s) -> {args.output}", file=sys.stderr)
+    if args.trace:
+        print(f"Trace : {instrument.export(args.trace)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# --- MODÈLE DE COÛT PAR VÉHICULE ---
+# Recalcule localement le coût et le ratio de chaque tournée à partir de ses mesures
+# (distance, temps, nombre d'arrêts, volume) et de tarifs par type de véhicule (`veh.type`),
+# au lieu de se fier aux `stats.cost` / `stats.ratio` calculés par l'outil du producteur.
+# Les tournées dont le volume dépasse la charge utile du véhicule sont signalées.
+# Un seul passage vectorisé : les tarifs sont indexés par les codes de la catégorie
+# Véhicule, sans boucle par tournée ; il est refait à chaque rafraîchissement des données.
+#
+#   DIAG_COST_MODEL=tarifs.json   -> {"VUL": {"km": 0.45, "heure": 25, "arrêt": 1.5, "capacité": 800}, ...}
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from instrument import span
+
+COST_MODEL_FILE = os.environ.get("DIAG_COST_MODEL")
+RATES = ["km", "heure", "arrêt", "capacité"]  # €/km, €/heure, €/arrêt, charge utile (kg)
+VEHICLE_MODEL = {
+    "Vélo cargo": {"km": 0.10, "heure": 22.0, "arrêt": 0.5, "capacité": 150},
+    "Voiture": {"km": 0.35, "heure": 22.0, "arrêt": 1.0, "capacité": 300},
+    "VUL": {"km": 0.45, "heure": 25.0, "arrêt": 1.5, "capacité": 800},
+    "Camion": {"km": 0.80, "heure": 30.0, "arrêt": 2.5, "capacité": 3500},
+}
+# Tarif appliqué aux véhicules non décrits (dont « Non précisé ») ; tournée signalée
+DEFAULT_VEHICLE = "VUL"
+
+
+def load_cost_model(path=COST_MODEL_FILE):
+    # Tarifs par défaut, complétés ou remplacés véhicule par véhicule par le fichier local
+    model = {vehicle: dict(rates) for vehicle, rates in VEHICLE_MODEL.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            overrides = json.load(f)
+        # Le véhicule par défaut d'abord : un véhicule ajouté hérite de ses tarifs locaux,
+        # quel que soit l'ordre du fichier
+        for vehicle, rates in sorted(overrides.items(), key=lambda item: item[0] != DEFAULT_VEHICLE):
+            unknown = set(rates) - set(RATES)
+            if unknown:
+                raise ValueError(f"{path} : tarif inconnu pour {vehicle} : {', '.join(sorted(unknown))}")
+            model[vehicle] = {**model.get(vehicle, model[DEFAULT_VEHICLE]), **rates}
+    return model
+
+
+def rate_table(model):
+    return pd.DataFrame.from_dict(model, orient="index", columns=RATES).rename_axis("Véhicule")
+
+
+def model_costs(tours, model=None):
+    # Une ligne par tournée, alignée sur `tours`
+    model = load_cost_model() if model is None else model
+    with span("coûts", tours=len(tours)):
+        vehicle = tours["Véhicule"]
+        if not isinstance(vehicle.dtype, pd.CategoricalDtype):
+            vehicle = vehicle.astype("category")
+        categories = [str(c) for c in vehicle.cat.categories]
+
+        # Tarifs par catégorie (dernière ligne : véhicule absent), puis lus par code
+        default = model[DEFAULT_VEHICLE]
+        known = np.array([c in model for c in categories] + [False])
+        table = np.array([[model.get(c, default)[r] for r in RATES] for c in categories] + [[default[r] for r in RATES]], dtype=float)
+        codes = vehicle.cat.codes.to_numpy()
+        codes = np.where(codes < 0, len(categories), codes)
+        per_km, per_hour, per_stop, capacity = table[codes].T
+
+        cost = (
+            tours["Distance"].to_numpy(dtype=float) * per_km
+            + tours["Temps"].to_numpy(dtype=float) / 60 * per_hour
+            + tours["Nb Arrêts"].to_numpy(dtype=float) * per_stop
+        )
+        ca = tours["CA"].to_numpy(dtype=float)
+        volume = tours["Volume (kg)"].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = np.where(ca > 0, cost / ca * 100, np.nan)
+            load = np.where(capacity > 0, volume / capacity * 100, np.nan)
+        return pd.DataFrame({
+            "Coût Modèle": cost,
+            "Ratio Modèle": ratio,
+            "Capacité (kg)": capacity,
+            "Charge (%)": load,
+            "Surcharge": volume > capacity,
+            "Tarif par défaut": ~known[codes],
+        }, index=tours.index)
+
+
+def cost_summary(tours, costs):
+    # Coût déclaré et coût modèle par type de véhicule
+    df = pd.DataFrame({
+        "Véhicule": tours["Véhicule"].to_numpy(),
+        "Tournées": 1,
+        "Coût Déclaré": tours["Coût"].to_numpy(),
+        "Coût Modèle": costs["Coût Modèle"].to_numpy(),
+        "Surcharges": costs["Surcharge"].to_numpy(),
+    })
+    summary = df.groupby("Véhicule", observed=True).sum()
+    summary["Écart (%)"] = (summary["Coût Modèle"] / summary["Coût Déclaré"].where(summary["Coût Déclaré"] > 0) - 1) * 100
+    return summary.reset_index()
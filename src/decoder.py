@@ -0,0 +1,179 @@
+# --- DÉCODAGE VALIDÉ DE `data_json` ---
+# Un schéma unique décrit le contenu envoyé par l'outil de saisie (dépôt, véhicule,
+# tournées, arrêts, stats). Il est compilé une fois en une fonction de conversion : chaque
+# objet JSON est lu champ par champ et rendu en tuple positionnel de valeurs déjà typées
+# (float, str, NaN pour une coordonnée absente), prêtes à être versées dans des colonnes. Un contenu non
+# conforme lève SchemaError avec le chemin du champ fautif, au lieu d'être ignoré en silence.
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+NAN = float("nan")
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# --- TYPES DU SCHÉMA ---
+def number(default=0.0):
+    return ("number", default)
+
+
+def coord():
+    return ("coord", NAN)
+
+
+def text(default=None):
+    return ("text", default)
+
+
+def obj(**fields):
+    return ("object", fields)
+
+
+def array(item):
+    return ("array", item)
+
+
+CONTENT_SCHEMA = obj(
+    depot=obj(
+        pData=obj(lon=coord(), lat=coord()),
+        veh=obj(type=text("Non précisé")),
+    ),
+    tours=array(obj(
+        day=text("Indéfini"),
+        name=text("Sans nom"),
+        stats=obj(ca=number(), cost=number(), ratio=number(), dist=number(), time=number()),
+        stops=array(obj(client=text(), lon=coord(), lat=coord(), vol=number())),
+    )),
+)
+
+
+# --- COMPILATION ---
+# Le schéma est traduit en une seule fonction Python générée, sans appel par champ :
+# les valeurs déjà du bon type passent par un test `type(...) is ...` en ligne, les
+# autres (entiers, chaînes numériques, valeurs absentes) par les fonctions lentes ci-dessous.
+def format_path(path):
+    # Les chemins sont des couples (parent, clé) chaînés, construits seulement en cas d'écart
+    parts = []
+    while path is not None:
+        path, key = path
+        parts.append(f"[{key}]" if isinstance(key, int) else f".{key}")
+    return "data_json" + "".join(reversed(parts))
+
+
+def _fail(path, expected, value):
+    raise SchemaError(f"{format_path(path)} : attendu {expected}, reçu {value!r:.40}")
+
+
+def _number(value, path, default):
+    if value is None or value == "":
+        return default
+    value_type = type(value)
+    if value_type is float or value_type is int or value_type is bool:
+        # Un booléen vaut 1.0 / 0.0, comme le float(...) des dashboards d'origine
+        return float(value)
+    if value_type is str:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    _fail(path, "nombre", value)
+
+
+def _coord(value, path):
+    # Même convention que les dashboards : une coordonnée vide ou nulle est ignorée (NaN)
+    return _number(value, path, NAN) if value else NAN
+
+
+def _text(value, path, default):
+    if value is None:
+        return default
+    if type(value) is int or type(value) is float or type(value) is bool:
+        return str(value)
+    _fail(path, "texte", value)
+
+
+def _object(value, path):
+    if value is None:
+        return {}
+    _fail(path, "objet", value)
+
+
+def _array(value, path):
+    if value is None:
+        return []
+    _fail(path, "liste", value)
+
+
+def _emit(node, expr, target, path, lines, indent, names):
+    kind, arg = node
+    pad = "    " * indent
+    if kind == "number":
+        lines.append(f"{pad}{target} = {expr}")
+        lines.append(f"{pad}if type({target}) is not float: {target} = _number({target}, {path}, {arg!r})")
+    elif kind == "coord":
+        lines.append(f"{pad}{target} = {expr}")
+        lines.append(f"{pad}if type({target}) is not float or not {target}: {target} = _coord({target}, {path})")
+    elif kind == "text":
+        lines.append(f"{pad}{target} = {expr}")
+        lines.append(f"{pad}if type({target}) is not str: {target} = _text({target}, {path}, {arg!r})")
+    elif kind == "object":
+        d = f"d{next(names)}"
+        lines.append(f"{pad}{d} = {expr}")
+        lines.append(f"{pad}if type({d}) is not dict: {d} = _object({d}, {path})")
+        fields = []
+        for name, child in arg.items():
+            var = f"v{next(names)}"
+            _emit(child, f"{d}.get({name!r})", var, f"({path}, {name!r})", lines, indent, names)
+            fields.append(var)
+        lines.append(f"{pad}{target} = ({', '.join(fields)},)")
+    elif kind == "array":
+        k = next(names)
+        a, i, item = f"a{k}", f"i{k}", f"v{k}"
+        lines.append(f"{pad}{a} = {expr}")
+        lines.append(f"{pad}if type({a}) is not list: {a} = _array({a}, {path})")
+        lines.append(f"{pad}{target} = []")
+        lines.append(f"{pad}for {i}, {item} in enumerate({a}):")
+        _emit(arg, item, item, f"({path}, {i})", lines, indent + 1, names)
+        lines.append(f"{pad}    {target}.append({item})")
+    else:
+        raise ValueError(f"Type de schéma inconnu : {kind}")
+
+
+def compile_schema(node):
+    lines = ["def convert(value):"]
+    _emit(node, "value", "result", "None", lines, 1, iter(range(1_000_000)))
+    lines.append("    return result")
+    namespace = {"_number": _number, "_coord": _coord, "_text": _text, "_object": _object, "_array": _array}
+    exec(compile("\n".join(lines), "<schéma data_json>", "exec"), namespace)
+    return namespace["convert"]
+
+
+_convert_content = compile_schema(CONTENT_SCHEMA)
+
+
+def decode(raw):
+    # Renvoie ((lon, lat), (type,)), [(jour, nom, stats, arrêts), ...] ; lève SchemaError
+    if raw is None or raw == "":
+        raise SchemaError("data_json vide")
+    if isinstance(raw, (str, bytes)):
+        try:
+            raw = loads(raw)
+        except ValueError as e:
+            raise SchemaError(f"data_json illisible : {e}") from None
+    if type(raw) is not dict:
+        _fail(None, "objet", raw)
+    return _convert_content(raw)
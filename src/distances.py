@@ -0,0 +1,336 @@
+# --- MATRICE DE DISTANCES PERSISTANTE ---
+# Distances et temps de trajet entre dépôts et clients, mémorisés par paire de points
+# (coordonnées arrondies à ~1 m) : ils ne changent pas d'une session à l'autre. Les paires
+# absentes sont calculées par lots, soit à vol d'oiseau (haversine vectorisée multipliée par un
+# facteur de détour routier), soit sur un graphe routier fourni localement (plus courts
+# chemins). Le cache est borné en nombre de paires (les moins récemment lues sont oubliées)
+# et écrit au format Arrow à côté des instantanés, pour être relu au démarrage. Chaque
+# enregistrement n'écrit que les paires ajoutées depuis le précédent, dans un segment à part
+# (`distances.arrow.<n>`) ; le fichier principal n'est réécrit qu'après une éviction ou quand
+# les segments s'accumulent.
+#
+#   DIAG_DETOUR_FACTOR=1.3             -> km routiers estimés = km à vol d'oiseau x facteur
+#   DIAG_ROAD_GRAPH=routes.parquet     -> arêtes lon_a, lat_a, lon_b, lat_b, km[, min] (CSV ou Parquet)
+#   DIAG_DISTANCE_PAIRS=2000000        -> nombre maximal de paires conservées
+
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+except ImportError:
+    dijkstra = None
+
+from instrument import count, span
+from routing import EARTH_RADIUS_KM
+from spatial import GridIndex
+from store import SNAPSHOT_DIR
+
+COORD_SCALE = 1e5  # 5 décimales : ~1 m
+DETOUR_FACTOR = float(os.environ.get("DIAG_DETOUR_FACTOR", 1.0))
+ROAD_GRAPH = os.environ.get("DIAG_ROAD_GRAPH")
+MAX_PAIRS = int(os.environ.get("DIAG_DISTANCE_PAIRS", 2_000_000))
+EVICT_TO = 0.75  # fraction de MAX_PAIRS conservée après éviction
+BATCH_PAIRS = 250_000
+AVERAGE_SPEED_KMH = 40.0  # temps de trajet estimé quand le graphe ne fournit pas de durées
+SNAP_KM = 1.0  # distance maximale d'un point au nœud routier le plus proche
+SOURCE_BATCH = 32  # nœuds de départ par appel à dijkstra
+CACHE_FILE = os.path.join(SNAPSHOT_DIR, "distances.arrow")
+MAX_SEGMENTS = 32  # au-delà, segments et fichier principal sont fusionnés
+
+
+def point_keys(lon, lat):
+    lon_i = np.round(np.asarray(lon, dtype=float) * COORD_SCALE).astype(np.int64)
+    lat_i = np.round(np.asarray(lat, dtype=float) * COORD_SCALE).astype(np.int64)
+    return (lon_i << 32) + (lat_i & 0xFFFFFFFF)
+
+
+def key_coords(keys):
+    low = keys & 0xFFFFFFFF
+    lat_i = np.where(low >= 1 << 31, low - (1 << 32), low)
+    return ((keys - low) >> 32) / COORD_SCALE, lat_i / COORD_SCALE
+
+
+def haversine_pairs(lon_a, lat_a, lon_b, lat_b):
+    lon_a, lat_a, lon_b, lat_b = (np.radians(x) for x in (lon_a, lat_a, lon_b, lat_b))
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+# --- GRAPHE ROUTIER LOCAL ---
+class RoadGraph:
+    def __init__(self, path, snap_km=SNAP_KM):
+        if dijkstra is None:
+            raise ImportError("scipy est requis pour lire un graphe routier (DIAG_ROAD_GRAPH)")
+        edges = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+        ends = np.r_[point_keys(edges["lon_a"], edges["lat_a"]), point_keys(edges["lon_b"], edges["lat_b"])]
+        nodes, ids = np.unique(ends, return_inverse=True)
+        a, b = ids[:len(edges)], ids[len(edges):]
+        self.path = path
+        self.snap_km = snap_km
+        self.weights = {
+            field: csr_matrix((edges[field].to_numpy(dtype=float), (a, b)), shape=(len(nodes), len(nodes)))
+            for field in ("km", "min") if field in edges
+        }
+        self.node_lon, self.node_lat = key_coords(nodes)
+        self.index = GridIndex(self.node_lon, self.node_lat, cell_km=snap_km)
+
+    def snap(self, lon, lat):
+        # Nœud le plus proche de chaque point (-1 au-delà de `snap_km`) et distance d'accès
+        node = np.full(len(lon), -1)
+        access = np.zeros(len(lon))
+        q, p, d = self.index.query_radius(lon, lat, self.snap_km)
+        order = np.lexsort((d, q))
+        q, p, d = q[order], p[order], d[order]
+        first = np.r_[True, q[1:] != q[:-1]] if len(q) else np.zeros(0, dtype=bool)
+        node[q[first]], access[q[first]] = p[first], d[first]
+        return node, access
+
+    def pairs(self, lon_a, lat_a, lon_b, lat_b):
+        # km et minutes par paire ; NaN si un point est hors graphe ou injoignable
+        node_a, access_a = self.snap(lon_a, lat_a)
+        node_b, access_b = self.snap(lon_b, lat_b)
+        result = {field: np.full(len(lon_a), np.nan) for field in ("km", "min")}
+        ok = np.flatnonzero((node_a >= 0) & (node_b >= 0))
+        sources = np.unique(node_a[ok])
+        for field, weights in self.weights.items():
+            for start in range(0, len(sources), SOURCE_BATCH):
+                batch = sources[start:start + SOURCE_BATCH]
+                rows = dijkstra(weights, directed=False, indices=batch)
+                sel = ok[np.isin(node_a[ok], batch)]
+                result[field][sel] = rows[np.searchsorted(batch, node_a[sel]), node_b[sel]]
+        access = (access_a + access_b)
+        result["km"] += access
+        if "min" in self.weights:
+            result["min"] += access / AVERAGE_SPEED_KMH * 60
+        else:
+            result["min"] = result["km"] / AVERAGE_SPEED_KMH * 60
+        for values in result.values():
+            values[~np.isfinite(values)] = np.nan
+        return result["km"], result["min"]
+
+
+# --- CACHE DE PAIRES ---
+# Points internés (clé de coordonnées -> identifiant) ; une paire est une clé entière unique
+# (identifiant le plus petit, identifiant le plus grand), retrouvée par table de hachage.
+def pair_keys(ids_a, ids_b):
+    return (np.minimum(ids_a, ids_b) << 32) + np.maximum(ids_a, ids_b)
+
+
+class DistanceMatrix:
+    def __init__(self, path=CACHE_FILE, detour=DETOUR_FACTOR, graph=ROAD_GRAPH, max_pairs=MAX_PAIRS):
+        self.path = path
+        self.detour = detour
+        self.graph = RoadGraph(graph) if isinstance(graph, str) else graph
+        self.max_pairs = max_pairs
+        self.hits = self.misses = 0
+        self._lock = threading.Lock()
+        self._clock = 0
+        self._points = pd.Index(np.zeros(0, dtype=np.int64))
+        self._pairs = pd.Index(np.zeros(0, dtype=np.int64))
+        self._km = np.zeros(0)
+        self._min = np.zeros(0, dtype=np.float32)
+        self._used = np.zeros(0, dtype=np.int64)
+        self._saved = 0  # paires déjà sur disque (en tête des tableaux)
+        self._rewrite = False  # tableaux réordonnés (éviction) : tout est à réécrire
+        self._segments = []
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def signature(self):
+        # Les distances mémorisées ne valent que pour la méthode qui les a produites
+        return f"graphe={self.graph.path}" if self.graph is not None else f"détour={self.detour}"
+
+    def _intern(self, keys):
+        ids = self._points.get_indexer(keys)
+        if (ids < 0).any():
+            self._points = self._points.append(pd.Index(np.unique(keys[ids < 0])))
+            ids = self._points.get_indexer(keys)
+        return ids
+
+    def _compute(self, pairs):
+        points = self._points.to_numpy()
+        lon_a, lat_a = key_coords(points[pairs >> 32])
+        lon_b, lat_b = key_coords(points[pairs & 0xFFFFFFFF])
+        km = haversine_pairs(lon_a, lat_a, lon_b, lat_b) * self.detour
+        minutes = km / AVERAGE_SPEED_KMH * 60
+        if self.graph is not None:
+            road_km, road_min = self.graph.pairs(lon_a, lat_a, lon_b, lat_b)
+            found = ~np.isnan(road_km)
+            km[found], minutes[found] = road_km[found], road_min[found]
+        return km, minutes
+
+    def lookup(self, keys, i, j):
+        # Clés de points (cf. point_keys) ; renvoie (km, minutes) des paires (keys[i], keys[j])
+        with self._lock:
+            self._clock += 1
+            ids = self._intern(keys)
+            pairs = pair_keys(ids[i], ids[j])
+            pos = self._pairs.get_indexer(pairs)
+            missing = pos < 0
+            self.hits += int((~missing).sum())
+            self.misses += int(missing.sum())
+            count("distances.calculées", int(missing.sum()))
+            if missing.any():
+                new = np.unique(pairs[missing])
+                km, minutes = np.empty(len(new)), np.empty(len(new), dtype=np.float32)
+                for start in range(0, len(new), BATCH_PAIRS):
+                    part = slice(start, start + BATCH_PAIRS)
+                    km[part], minutes[part] = self._compute(new[part])
+                self._append(new, km, minutes, np.full(len(new), self._clock))
+                pos = self._pairs.get_indexer(pairs)
+            self._used[pos] = self._clock
+            km, minutes = self._km[pos], self._min[pos]
+            if len(self._km) > self.max_pairs:
+                self._evict()
+            return km, minutes
+
+    def _append(self, pairs, km, minutes, used):
+        self._pairs = self._pairs.append(pd.Index(pairs))
+        self._km, self._min, self._used = np.r_[self._km, km], np.r_[self._min, minutes], np.r_[self._used, used]
+
+    def _evict(self):
+        # Paires les moins récemment lues oubliées, puis points qui ne servent plus renumérotés
+        keep = np.sort(np.argsort(-self._used, kind="stable")[:int(self.max_pairs * EVICT_TO)])
+        pairs = self._pairs.to_numpy()[keep]
+        ids_a, ids_b = pairs >> 32, pairs & 0xFFFFFFFF
+        used_points, inverse = np.unique(np.r_[ids_a, ids_b], return_inverse=True)
+        self._points = pd.Index(self._points.to_numpy()[used_points])
+        self._pairs = pd.Index(pair_keys(inverse[:len(keep)], inverse[len(keep):]))
+        self._km, self._min, self._used = self._km[keep], self._min[keep], self._used[keep]
+        self._rewrite = True
+
+    def matrices(self, groups, field="km"):
+        # Une matrice carrée par groupe de points (lon, lat), toutes les paires lues en un lot
+        with span("distances", groups=len(groups)):
+            sizes = [len(lon) for lon, _ in groups]
+            offsets = np.cumsum([0] + sizes)[:-1]
+            lon = np.concatenate([np.asarray(g[0], dtype=float) for g in groups] + [np.zeros(0)])
+            lat = np.concatenate([np.asarray(g[1], dtype=float) for g in groups] + [np.zeros(0)])
+            located = ~(np.isnan(lon) | np.isnan(lat))
+            keys = point_keys(np.where(located, lon, 0), np.where(located, lat, 0))
+            triangles = {n: np.triu_indices(n, 1) for n in set(sizes)}
+            empty = [np.zeros(0, dtype=np.int64)]
+            i = np.concatenate([triangles[n][0] + o for n, o in zip(sizes, offsets)] + empty)
+            j = np.concatenate([triangles[n][1] + o for n, o in zip(sizes, offsets)] + empty)
+
+            # Points sans coordonnées : distance inconnue (NaN), comme pour le calcul direct
+            valid = located[i] & located[j]
+            values = np.full(len(i), np.nan)
+            km, minutes = self.lookup(keys, i[valid], j[valid])
+            values[valid] = km if field == "km" else minutes
+            values[valid & (keys[i] == keys[j])] = 0.0  # points confondus après arrondi
+
+            result, start = [], 0
+            for n in sizes:
+                ti, tj = triangles[n]
+                matrix = np.zeros((n, n))
+                matrix[ti, tj] = matrix[tj, ti] = values[start:start + len(ti)]
+                start += len(ti)
+                result.append(matrix)
+            return result
+
+    def matrix(self, lon, lat, field="km"):
+        return self.matrices([(lon, lat)], field)[0]
+
+    def path_lengths(self, coords, ends, field="km"):
+        # Longueur de tracés mis à la suite (cf. flatten.path_coordinates) : seules les étapes
+        # consécutives sont lues, pas la matrice complète
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        last = np.zeros(len(coords), dtype=bool)
+        last[np.asarray(ends, dtype=np.int64) - 1] = True
+        i = np.flatnonzero(~last)
+        located = ~np.isnan(coords).any(axis=1)
+        keys = point_keys(np.where(located, coords[:, 0], 0), np.where(located, coords[:, 1], 0))
+        valid = located[i] & located[i + 1]
+        legs = np.full(len(i), np.nan)
+        km, minutes = self.lookup(keys, i[valid], i[valid] + 1)
+        legs[valid] = km if field == "km" else minutes
+        legs[valid & (keys[i] == keys[i + 1])] = 0.0
+        path = np.searchsorted(ends, i, side="right")
+        return np.bincount(path, weights=legs, minlength=len(ends))
+
+    # --- PERSISTANCE ---
+    # Copie envoyée à un processus de calcul : la configuration seulement, le cache est relu
+    # depuis le disque dans le processus
+    def __getstate__(self):
+        graph = self.graph.path if self.graph is not None else None
+        return {"path": self.path, "detour": self.detour, "graph": graph, "max_pairs": self.max_pairs}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    # Paires écrites avec les clés de coordonnées de leurs deux points (pas les identifiants)
+    def _table(self, rows):
+        pairs, points = self._pairs.to_numpy()[rows], self._points.to_numpy()
+        table = pa.table({
+            "a": points[pairs >> 32], "b": points[pairs & 0xFFFFFFFF],
+            "km": self._km[rows], "min": self._min[rows], "used": self._used[rows],
+        })
+        return table.replace_schema_metadata({"signature": self.signature()})
+
+    def save(self):
+        with self._lock:
+            if self.path is None or (self._saved == len(self._km) and not self._rewrite):
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if self._rewrite or len(self._segments) >= MAX_SEGMENTS or not os.path.exists(self.path):
+                with span("distances.écriture", pairs=len(self._km)):
+                    tmp = self.path + ".tmp"
+                    feather.write_feather(self._table(slice(None)), tmp, compression="uncompressed")
+                    os.replace(tmp, self.path)
+                # Segments fusionnés (ou d'une autre méthode de calcul) : supprimés
+                for segment in self._segment_files():
+                    try:
+                        os.remove(segment)
+                    except FileNotFoundError:
+                        pass  # déjà fusionné par une autre session
+                self._segments = []
+            else:
+                # Nom propre au processus : deux sessions n'écrivent jamais le même segment
+                segment = f"{self.path}.{time.time_ns()}-{os.getpid()}"
+                with span("distances.segment", pairs=len(self._km) - self._saved):
+                    feather.write_feather(self._table(slice(self._saved, None)), segment + ".tmp", compression="uncompressed")
+                    os.replace(segment + ".tmp", segment)
+                self._segments.append(segment)
+            self._saved = len(self._km)
+            self._rewrite = False
+
+    def _segment_files(self):
+        return sorted(glob.glob(glob.escape(self.path) + ".*[0-9]"))
+
+    def _load(self):
+        table = feather.read_table(self.path)
+        signature = (table.schema.metadata or {}).get(b"signature", b"").decode()
+        if signature != self.signature():
+            self._rewrite = True  # méthode de calcul changée : le cache repart de zéro
+            return
+        tables = [table]
+        for segment in self._segment_files():
+            try:
+                part = feather.read_table(segment)
+            except FileNotFoundError:
+                continue
+            if (part.schema.metadata or {}).get(b"signature", b"").decode() == signature:
+                tables.append(part)
+                self._segments.append(segment)
+        columns = {name: np.concatenate([t[name].to_numpy() for t in tables]) for name in table.column_names}
+        pairs = pair_keys(self._intern(columns["a"]), self._intern(columns["b"]))
+        # Une paire calculée par deux sessions figure dans deux segments : lue une fois
+        _, first = np.unique(pairs, return_index=True)
+        first.sort()
+        self._append(pairs[first], columns["km"][first], columns["min"][first], columns["used"][first])
+        self._clock = int(self._used.max()) if len(self._used) else 0
+        self._saved = len(self._km)
+
+    def stats(self):
+        with self._lock:
+            return {"paires": len(self._km), "points": len(self._points), "lectures": self.hits, "calculs": self.misses}
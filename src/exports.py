@@ -0,0 +1,105 @@
+# --- EXPORTS À LA DEMANDE ---
+# Les fichiers ne sont produits qu'au clic sur le bouton de téléchargement (données différées
+# de st.download_button), jamais à chaque exécution de la page. Ils sont écrits tranche par
+# tranche depuis les colonnes typées : la mémoire reste bornée par une tranche, plus le fichier.
+#   - tournées : registre (une ligne par tournée), cf. flatten.export_view ;
+#   - arrêts   : détail par livraison (client, position, volume) des tournées sélectionnées.
+# Formats : CSV (UTF-8 avec BOM, lisible par Excel), Parquet, XLSX (si xlsxwriter est installé).
+
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+from flatten import EXPORT_CHUNK_ROWS, EXPORT_DATE_FORMAT, export_view
+
+XLSX_MAX_ROWS = 1_048_576  # lignes par feuille, en-tête compris
+XLSX_DATE_FORMAT = "dd/mm/yyyy"
+
+STOP_TOUR_COLUMNS = ["ID_Projet", "Producteur", "Date", "Tournée", "Jour", "Véhicule"]
+STOP_EXPORT_COLUMNS = ["Ordre", "Client", "lon", "lat", "Volume (kg)"]
+
+FORMATS = {
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet"),
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def available_formats():
+    return [f for f in FORMATS if f != "xlsx" or xlsxwriter is not None]
+
+
+# --- TRANCHES ---
+# Au moins une tranche (éventuellement vide) : un export vide garde ses en-têtes
+def tour_chunks(tours, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, max(len(tours), 1), chunk_rows):
+        yield export_view(tours.iloc[start:start + chunk_rows])
+
+
+def stop_chunks(tables, mask, chunk_rows=EXPORT_CHUNK_ROWS):
+    tours, stops = tables["tours"], tables["stops"]
+    rows = np.flatnonzero(mask[stops["tour_id"].to_numpy()])
+    for start in range(0, max(len(rows), 1), chunk_rows):
+        part = stops.take(rows[start:start + chunk_rows])
+        tour_part = tours[STOP_TOUR_COLUMNS].take(part["tour_id"].to_numpy())
+        yield pd.concat([tour_part.reset_index(drop=True), part[STOP_EXPORT_COLUMNS].reset_index(drop=True)], axis=1)
+
+
+# --- FORMATS ---
+def write_csv(chunks, f, header=True):
+    # `f` binaire ; le BOM n'est écrit qu'en tête de fichier (pas en ajout)
+    text = io.TextIOWrapper(f, encoding="utf-8-sig", newline="", write_through=True)
+    for k, chunk in enumerate(chunks):
+        chunk.to_csv(text, header=header and k == 0, index=False, date_format=EXPORT_DATE_FORMAT)
+    text.detach()
+
+
+def write_parquet(chunks, f):
+    # Une tranche = un groupe de lignes ; catégories conservées en colonnes dictionnaire
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(f, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+def write_xlsx(chunks, f):
+    # Mode mémoire constante : chaque ligne est écrite sur disque dès qu'elle est complète
+    workbook = xlsxwriter.Workbook(f, {
+        "constant_memory": True, "nan_inf_to_errors": True, "remove_timezone": True,
+        "default_date_format": XLSX_DATE_FORMAT,
+    })
+    sheet, row = None, XLSX_MAX_ROWS
+    for chunk in chunks:
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for record in values.itertuples(index=False, name=None):
+            if row == XLSX_MAX_ROWS:
+                # Feuille pleine : la suite continue sur une nouvelle feuille, en-têtes répétés
+                sheet = workbook.add_worksheet(f"Export {len(workbook.worksheets()) + 1}")
+                sheet.write_row(0, 0, list(chunk.columns))
+                row = 1
+            sheet.write_row(row, 0, record)
+            row += 1
+    if sheet is None:
+        workbook.add_worksheet("Export 1").write_row(0, 0, list(chunk.columns))
+    workbook.close()
+
+
+WRITERS = {"csv": write_csv, "parquet": write_parquet, "xlsx": write_xlsx}
+
+
+def export_file(chunks, fmt):
+    buffer = io.BytesIO()
+    WRITERS[fmt](chunks, buffer)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,230 @@
+# --- MOTEUR D'APLATISSEMENT DES TOURNÉES ---
+# Transforme les lignes brutes des tables `tournees` / `tournees_catl` en tables
+# colonnaires : tournées, arrêts et tracés. Seuls les envois nouveaux ou modifiés sont
+# aplatis à chaque rafraîchissement : TableSync garde l'empreinte (row_digest) de chaque
+# ligne par id, et une ligne relue à l'identique n'est pas re-parsée.
+# Encodage compact : libellés répétés en catégories, compteurs en entiers 32 bits, dates
+# typées ; les coordonnées des tracés ne sont matérialisées que pour la carte.
+
+import hashlib
+import json
+from array import array
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from decoder import NAN, SchemaError, decode
+from instrument import span
+
+TOUR_COLUMNS = [
+    "ID_Projet", "Producteur", "Date", "Jour", "Tournée", "Véhicule",
+    "CA", "Coût", "Ratio", "Distance", "Temps", "Volume (kg)", "Nb Arrêts",
+    "depot_lon", "depot_lat",
+]
+# Champs communs à toutes les tournées d'une ligne, et mesures par tournée (schéma `stats`)
+META_COLUMNS = ["ID_Projet", "Producteur", "Date", "Véhicule", "depot_lon", "depot_lat"]
+STAT_COLUMNS = ["CA", "Coût", "Ratio", "Distance", "Temps"]
+STOP_COLUMNS = ["tour_id", "Ordre", "Client", "lon", "lat", "Volume (kg)"]
+# Tournées tracées (dépôt géolocalisé) ; coordonnées reconstruites par path_coordinates()
+PATH_COLUMNS = ["tour_id"]
+DEPOT_COLUMNS = ["ID_Projet", "Producteur", "Véhicule", "depot_lon", "depot_lat"]
+# Colonnes encodées en catégories (codes entiers partagés par les filtres et la carte)
+DICTIONARY_COLUMNS = ["Producteur", "Jour", "Véhicule", "Tournée", "Client"]
+INT32_COLUMNS = ["tour_id", "Ordre", "Nb Arrêts"]
+
+# Colonnes affichées par les dashboards cartographiques (main / catl)
+DISPLAY_COLUMNS = ["Producteur", "Jour", "Tournée", "Véhicule", "Coût", "Distance", "Volume (kg)", "Nb Arrêts"]
+
+# Registre des tournées (dashboard PNR, export CSV)
+EXPORT_COLUMNS = ["ID_Projet", "Producteur", "Date", "Tournée", "Jour", "CA", "Coût", "Ratio", "Distance", "Temps", "Nb Arrêts"]
+EXPORT_RENAME = {"CA": "CA (€)", "Coût": "Coût (€)", "Ratio": "Ratio (%)", "Distance": "Distance (km)", "Temps": "Temps (min)"}
+EXPORT_DATE_FORMAT = "%d/%m/%Y"
+EXPORT_CHUNK_ROWS = 50_000
+
+EMPTY_DEPOT = ((NAN, NAN), ("Non précisé",))
+
+# Résultat colonnaire d'une ligne ; `error` décrit un contenu rejeté par le schéma
+FlatRow = namedtuple("FlatRow", ["meta", "days", "names", "stats", "stop_counts", "clients", "lons", "lats", "vols", "error"])
+
+
+def row_digest(row):
+    # Empreinte du contenu d'une ligne (producteur, date, data_json), comparée par id
+    content = row.get("data_json")
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, default=str)
+    h = hashlib.blake2b(digest_size=16)
+    for part in (row.get("nom_producteur"), row.get("created_at"), content):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+# --- APLATISSEMENT D'UNE LIGNE ---
+def flatten_row(row):
+    # Les valeurs décodées sont versées directement dans des colonnes typées : listes pour
+    # le texte, array('d') pour les mesures et coordonnées (NaN quand elles manquent)
+    try:
+        with span("décodage json"):
+            depot, tours = decode(row.get("data_json"))
+        error = None
+    except SchemaError as e:
+        depot, tours, error = EMPTY_DEPOT, [], str(e)
+    (depot_lon, depot_lat), (vehicle_type,) = depot
+
+    days, names, clients = [], [], []
+    stats, stop_counts = array("d"), array("q")
+    lons, lats, vols = array("d"), array("d"), array("d")
+    for day, name, tour_stats, tour_stops in tours:
+        days.append(day)
+        names.append(name)
+        stats.extend(tour_stats)
+        stop_counts.append(len(tour_stops))
+        if tour_stops:
+            # Transposition des arrêts de la tournée, colonne par colonne
+            tour_clients, tour_lons, tour_lats, tour_vols = zip(*tour_stops)
+            clients.extend(tour_clients)
+            lons.extend(tour_lons)
+            lats.extend(tour_lats)
+            vols.extend(tour_vols)
+
+    meta = (row.get("id"), row.get("nom_producteur", "Inconnu"), row.get("created_at"), vehicle_type, depot_lon, depot_lat)
+    return FlatRow(meta, days, names, stats, stop_counts, clients, lons, lats, vols, error)
+
+
+# --- ASSEMBLAGE DES TABLES ---
+def assemble(parts):
+    metas, row_tours, days, names, clients = [], [], [], [], []
+    stats, stop_counts = array("d"), array("q")
+    lons, lats, vols = array("d"), array("d"), array("d")
+    for part in parts:
+        metas.append(part.meta)
+        row_tours.append(len(part.days))
+        days.extend(part.days)
+        names.extend(part.names)
+        clients.extend(part.clients)
+        stats.extend(part.stats)
+        stop_counts.extend(part.stop_counts)
+        lons.extend(part.lons)
+        lats.extend(part.lats)
+        vols.extend(part.vols)
+
+    # Champs de la ligne répétés sur chacune de ses tournées
+    n_tours = len(days)
+    meta = pd.DataFrame.from_records(metas, columns=META_COLUMNS).astype({"depot_lon": float, "depot_lat": float})
+    tours_df = meta.take(np.repeat(np.arange(len(metas)), row_tours)).reset_index(drop=True)
+
+    stats = np.asarray(stats, dtype=float).reshape(-1, len(STAT_COLUMNS))
+    lons, lats, vols = (np.asarray(a, dtype=float) for a in (lons, lats, vols))
+    stop_counts = np.asarray(stop_counts, dtype=np.int32)
+    stop_tour = np.repeat(np.arange(n_tours, dtype=np.int32), stop_counts)
+    stop_order = np.arange(len(stop_tour), dtype=np.int32) - np.repeat(np.cumsum(stop_counts, dtype=np.int32) - stop_counts, stop_counts)
+
+    columns = {"Jour": days, "Tournée": names}
+    columns.update((c, stats[:, k]) for k, c in enumerate(STAT_COLUMNS))
+    columns["Volume (kg)"] = np.bincount(stop_tour, weights=vols, minlength=n_tours)
+    columns["Nb Arrêts"] = stop_counts
+    tours_df = tours_df.assign(**columns)[TOUR_COLUMNS]
+    tours_df["Date"] = pd.to_datetime(tours_df["Date"], errors="coerce", utc=True)
+    tours_df = compact(tours_df)
+    stops_df = compact(pd.DataFrame({
+        "tour_id": stop_tour, "Ordre": stop_order, "Client": clients,
+        "lon": lons, "lat": lats, "Volume (kg)": vols,
+    }))
+    return {
+        "tours": tours_df,
+        "stops": stops_df,
+        "paths": paths_table(tours_df),
+        "depots": depots_table(tours_df),
+    }
+
+
+def traced_tours(tours):
+    depot_lon, depot_lat = tours["depot_lon"].to_numpy(), tours["depot_lat"].to_numpy()
+    return np.flatnonzero(~np.isnan(depot_lon) & ~np.isnan(depot_lat)).astype(np.int32)
+
+
+def paths_table(tours):
+    return pd.DataFrame({"tour_id": traced_tours(tours)}, columns=PATH_COLUMNS)
+
+
+def path_coordinates(tours, stops, tour_ids):
+    # Tracé de chaque tournée partant d'un dépôt géolocalisé : dépôt, arrêts géolocalisés
+    # dans l'ordre de passage, retour au dépôt (fermeture de la boucle). Renvoie les
+    # coordonnées (n, 2) de tous les tracés à la suite et la fin de chacun.
+    depot_lon, depot_lat = tours["depot_lon"].to_numpy(), tours["depot_lat"].to_numpy()
+    stop_tour = stops["tour_id"].to_numpy()
+    keep = ~np.isnan(stops["lon"].to_numpy()) & ~np.isnan(stops["lat"].to_numpy())
+    keep &= np.isin(stop_tour, tour_ids)
+
+    tour_id = np.r_[tour_ids, stop_tour[keep], tour_ids]
+    lon = np.r_[depot_lon[tour_ids], stops["lon"].to_numpy()[keep], depot_lon[tour_ids]]
+    lat = np.r_[depot_lat[tour_ids], stops["lat"].to_numpy()[keep], depot_lat[tour_ids]]
+    # Tri stable par tournée : les arrêts restent dans l'ordre de passage, encadrés par le dépôt
+    step = np.r_[np.zeros(len(tour_ids)), np.ones(keep.sum()), np.full(len(tour_ids), 2)]
+    order = np.lexsort((step, tour_id))
+    ends = np.cumsum(np.bincount(tour_id, minlength=len(tours))[tour_ids])
+    return np.column_stack((lon[order], lat[order])), ends
+
+
+def compact(df):
+    columns = {c: df[c].astype("category") for c in DICTIONARY_COLUMNS if c in df and not isinstance(df[c].dtype, pd.CategoricalDtype)}
+    columns.update((c, df[c].astype(np.int32)) for c in INT32_COLUMNS if c in df and df[c].dtype != np.int32)
+    return df.assign(**columns) if columns else df
+
+
+def depots_table(tours):
+    # Un dépôt par projet géolocalisé (et non un par tournée)
+    depots = tours.loc[tours["depot_lon"].notna() & tours["depot_lat"].notna(), DEPOT_COLUMNS]
+    return depots.drop_duplicates("ID_Projet").reset_index(drop=True)
+
+
+def append_tables(base, extra):
+    # Les identifiants de tournée des nouvelles lignes sont décalés à la suite des existants
+    if extra["tours"].empty:
+        return base
+    if base["tours"].empty:
+        return extra
+    offset = len(base["tours"])
+    stops = extra["stops"].assign(tour_id=extra["stops"]["tour_id"] + offset)
+    paths = extra["paths"].assign(tour_id=extra["paths"]["tour_id"] + offset)
+    tours = compact(pd.concat([base["tours"], extra["tours"]], ignore_index=True))
+    return {
+        "tours": tours,
+        "stops": compact(pd.concat([base["stops"], stops], ignore_index=True)),
+        "paths": pd.concat([base["paths"], paths], ignore_index=True),
+        "depots": depots_table(tours),
+    }
+
+
+def drop_projects(tables, project_ids):
+    # Retire les tournées de projets re-soumis et renumérote les identifiants de tournée
+    tours = tables["tours"]
+    keep = ~tours["ID_Projet"].isin(list(project_ids))
+    if keep.all():
+        return tables
+    new_ids = keep.cumsum() - 1
+    stops = tables["stops"][keep.to_numpy()[tables["stops"]["tour_id"].to_numpy()]]
+    paths = tables["paths"][keep.to_numpy()[tables["paths"]["tour_id"].to_numpy()]]
+    tours = tours[keep].reset_index(drop=True)
+    return {
+        "tours": tours,
+        "stops": stops.assign(tour_id=new_ids.to_numpy()[stops["tour_id"].to_numpy()]).reset_index(drop=True),
+        "paths": paths.assign(tour_id=new_ids.to_numpy()[paths["tour_id"].to_numpy()]).reset_index(drop=True),
+        "depots": depots_table(tours),
+    }
+
+
+def export_view(tours):
+    # Colonnes du registre renommées, sans copie ; la date reste typée (formatée à l'écriture)
+    return tours[EXPORT_COLUMNS].rename(columns=EXPORT_RENAME)
+
+
+def write_export_csv(tours, f, header=True, chunk_rows=EXPORT_CHUNK_ROWS):
+    # Export écrit par tranches : seule une tranche de lignes texte existe à la fois
+    for start in range(0, len(tours), chunk_rows):
+        export_view(tours.iloc[start:start + chunk_rows]).to_csv(
+            f, header=header and start == 0, index=False, date_format=EXPORT_DATE_FORMAT,
+        )
+    if header and not len(tours):
+        export_view(tours).to_csv(f, index=False)
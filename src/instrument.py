@@ -0,0 +1,132 @@
+# --- INSTRUMENTATION ---
+# Intervalles chronométrés (`span`) et compteurs (`count`) autour des étapes coûteuses :
+# requêtes Supabase, décodage JSON, aplatissement, filtres, graphiques, sérialisation pydeck.
+# Désactivée par défaut : `span` renvoie alors un objet vide partagé, sans horodatage ni
+# allocation. Les événements sont exportables au format Chrome Trace (chrome://tracing,
+# https://ui.perfetto.dev).
+#
+#   DIAG_TRACE=1                       -> active l'instrumentation et le panneau des temps
+#   DIAG_TRACE_FILE=trace.json         -> écrit les événements du processus à sa sortie
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+MAX_EVENTS = 200_000  # événements conservés pour l'export (les plus anciens sont oubliés)
+TRACE_FILE = os.environ.get("DIAG_TRACE_FILE")
+
+
+class _State:
+    enabled = os.environ.get("DIAG_TRACE", "") not in ("", "0") or bool(TRACE_FILE)
+
+
+_events = deque(maxlen=MAX_EVENTS)  # (nom, phase, début µs, durée µs, fil, arguments)
+_local = threading.local()
+_pid = os.getpid()
+
+
+def enabled():
+    return _State.enabled
+
+
+def enable(on=True):
+    _State.enabled = on
+
+
+def _now_us():
+    return time.perf_counter_ns() // 1000
+
+
+def _record(event):
+    _events.append(event)
+    collector = getattr(_local, "collector", None)
+    if collector is not None:
+        collector.append(event)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _now_us()
+        return self
+
+    def __exit__(self, *exc):
+        self.args["error"] = exc[0].__name__ if exc[0] is not None else None
+        _record((self.name, "X", self.start, _now_us() - self.start, threading.get_ident(), self.args))
+        return False
+
+
+def span(name, **args):
+    if not _State.enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def count(name, value=1):
+    if _State.enabled:
+        _record((name, "C", _now_us(), 0, threading.get_ident(), {"value": value}))
+
+
+class Collector:
+    # Événements émis par le fil courant pendant le bloc (une exécution de page Streamlit)
+    def __enter__(self):
+        self.events = []
+        self._previous = getattr(_local, "collector", None)
+        _local.collector = self.events
+        return self.events
+
+    def __exit__(self, *exc):
+        _local.collector = self._previous
+        return False
+
+
+# --- SYNTHÈSE ET EXPORT ---
+def summary(events):
+    spans = [(name, dur / 1000) for name, phase, _, dur, _, _ in events if phase == "X"]
+    counters = [(name, args["value"]) for name, phase, _, _, _, args in events if phase == "C"]
+    by_span = pd.DataFrame(spans, columns=["Étape", "ms"]).groupby("Étape", sort=False)["ms"].agg(["count", "sum", "max"])
+    by_span.columns = ["Appels", "Total (ms)", "Max (ms)"]
+    by_counter = pd.DataFrame(counters, columns=["Compteur", "Valeur"]).groupby("Compteur", sort=False)["Valeur"].sum()
+    return by_span.sort_values("Total (ms)", ascending=False).reset_index(), by_counter.reset_index()
+
+
+def chrome_trace(events=None):
+    events = list(_events) if events is None else events
+    trace = []
+    for name, phase, start, dur, tid, args in events:
+        event = {"name": name, "ph": phase, "ts": start, "pid": _pid, "tid": tid, "args": args}
+        if phase == "X":
+            event["dur"] = dur
+        trace.append(event)
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+
+def export(path, events=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(chrome_trace(events), f, default=str)
+    return path
+
+
+if TRACE_FILE:
+    atexit.register(lambda: export(TRACE_FILE))
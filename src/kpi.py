@@ -0,0 +1,60 @@
+# --- CUBE D'INDICATEURS PRÉCALCULÉ ---
+# Mesures additives agrégées par (producteur, jour, véhicule), calculées une fois par
+# version des données. Une sélection de la barre latérale se résout en sommant quelques
+# cellules ; les ratios sont dérivés des sommes et restent justes quelle que soit la pondération.
+
+import pandas as pd
+
+from instrument import span
+
+CUBE_KEYS = ["Producteur", "Jour", "Véhicule"]
+MEASURES = {
+    "Nb Tournées": ("Distance", "size"),
+    "Distance": ("Distance", "sum"),
+    "Nb Arrêts": ("Nb Arrêts", "sum"),
+    "Volume (kg)": ("Volume (kg)", "sum"),
+    "Coût": ("Coût", "sum"),
+    "CA": ("CA", "sum"),
+    "Temps": ("Temps", "sum"),
+    "Somme Ratios": ("Ratio", "sum"),
+}
+
+
+def build_cube(tours):
+    with span("cube", tours=len(tours)):
+        return tours.groupby(CUBE_KEYS, observed=True, sort=False).agg(**MEASURES).reset_index()
+
+
+def merge_cubes(cubes):
+    # Les mesures étant additives, des cubes partiels (par lot de lignes) se fusionnent par somme
+    cubes = [c for c in cubes if not c.empty]
+    if not cubes:
+        return pd.DataFrame(columns=CUBE_KEYS + list(MEASURES))
+    merged = pd.concat(cubes, ignore_index=True)
+    return merged.groupby(CUBE_KEYS, observed=True, sort=False)[list(MEASURES)].sum().reset_index()
+
+
+def query(cube, selected_prods=None, selected_days=None, selected_vehs=None):
+    mask = pd.Series(True, index=cube.index)
+    for column, selected in zip(CUBE_KEYS, (selected_prods, selected_days, selected_vehs)):
+        if selected is not None:
+            mask &= cube[column].isin(selected)
+    return cube.loc[mask, list(MEASURES)].sum()
+
+
+def derive(totals):
+    km, stops, vol = totals["Distance"], totals["Nb Arrêts"], totals["Volume (kg)"]
+    cost, ca, n_tours = totals["Coût"], totals["CA"], totals["Nb Tournées"]
+    return {
+        "total_km": km,
+        "total_stops": int(stops),
+        "total_vol": vol,
+        "total_cost": cost,
+        "total_ca": ca,
+        "n_tours": int(n_tours),
+        "density": km / stops if stops > 0 else 0,
+        "unit_cost": cost / vol if vol > 0 else 0,
+        "cost_ratio": cost / ca * 100 if ca > 0 else 0,
+        # Moyenne simple des ratios par tournée (exports) ; l'indicateur affiché est cost_ratio
+        "mean_ratio": totals["Somme Ratios"] / n_tours if n_tours > 0 else float("nan"),
+    }
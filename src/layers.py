@@ -0,0 +1,311 @@
+# --- COUCHES CARTOGRAPHIQUES COLONNAIRES ---
+# Tracés (par `tour_id`) et sites (dépôts et clients dédoublonnés) sont stockés en colonnes.
+# Le filtrage de la carte réutilise le masque booléen des tournées (`df_filtered`) :
+# un simple `take` par `tour_id`, sans boucle Python ni test `in` sur les listes.
+# Niveau de détail : vue éloignée = grille de densité des livraisons et tracés simplifiés
+# (Douglas-Peucker) avec une tolérance qui dépend du zoom.
+# En mode compact, seules les colonnes utiles sont émises sous des clés courtes, les
+# rayons et la couleur des dépôts sont portés par la couche, et le JSON n'est pas indenté.
+# Chaque élément ne porte que l'indice de sa couleur ; la table des couleurs (dépôts à
+# l'indice 0, puis la palette des producteurs, cf. palette.py) figure une fois par couche.
+# Pas de tableaux plats par couche : Streamlit ne transmet que du JSON (pas le transport
+# binaire de pydeck) et son infobulle ne lit que les champs de chaque élément. Le gain est
+# d'environ 4,5× sur la taille (29 Mo -> 6,4 Mo pour 51 000 points) et 7× sur le temps de
+# sérialisation ; au-delà, c'est le niveau de détail qui réduit le nombre d'éléments.
+
+import json
+
+import numpy as np
+import pandas as pd
+import pydeck as pdk
+from pydeck.bindings.json_tools import default_serialize
+
+from flatten import path_coordinates
+from instrument import span
+from tenants import nbytes
+
+DEPOT_COLOR = [30, 30, 30, 255]
+DEPOT_RADIUS = 250
+STOP_RADIUS = 120
+COORD_DECIMALS = 5  # ~1 m, largement suffisant pour l'affichage
+
+# Niveau de détail
+DENSITY_ZOOM = 9            # en dessous, les livraisons sont agrégées en grille
+MAX_DETAIL_POINTS = 20_000  # au-delà, la grille de densité est utilisée quel que soit le zoom
+GRID_CELL_PIXELS = 40
+SIMPLIFY_PIXELS = 1.5
+MIN_ZOOM, MAX_ZOOM = 5, 13
+DENSITY_COLOR = [230, 126, 34, 160]
+
+TOOLTIP = {"text": "{name}\nProducteur: {prod}\nVéhicule: {veh}"}
+# Les champs de l'infobulle restent des libellés : le rendu deck.gl de Streamlit remplace
+# `{champ}` par la valeur brute de l'élément, sans expression, donc sans table de codes
+# (contrairement aux couleurs, cf. color_accessor)
+COMPACT_TOOLTIP = {"text": "{n}\nProducteur: {p}\nVéhicule: {v}"}
+LEGACY_KEYS = {"n": "name", "p": "prod", "v": "veh"}
+
+
+def _coords(lon, lat):
+    return np.round(np.column_stack([lon, lat]), COORD_DECIMALS).tolist()
+
+
+def _object_array(items):
+    # Colonne d'objets (tableaux numpy de tailles variables) sans fusion en tableau 3D
+    column = np.empty(len(items), dtype=object)
+    for k, item in enumerate(items):
+        column[k] = item
+    return column
+
+
+def color_accessor(colors, field):
+    # Expression deck.gl évaluée par élément : table des couleurs indexée par le champ
+    return json.dumps(colors, separators=(",", ":")) + f"[{field}]"
+
+
+def build_geo(tables, palette, table=None):
+    tours, stops, paths = tables["tours"], tables["stops"], tables["paths"]
+
+    # Seules les tournées avec un dépôt géolocalisé ont un tracé et des points
+    path_tours = paths["tour_id"].to_numpy()
+    has_path = np.zeros(len(tours), dtype=bool)
+    has_path[path_tours] = True
+    geo_stops = stops[stops["lon"].notna() & stops["lat"].notna() & has_path[stops["tour_id"].to_numpy()]]
+
+    # Occurrences : un dépôt par tournée tracée, puis chaque arrêt géolocalisé
+    n_depots = len(path_tours)
+    tour_id = np.concatenate([path_tours, geo_stops["tour_id"].to_numpy()])
+    is_depot = np.arange(len(tour_id)) < n_depots
+    lon = np.concatenate([tours["depot_lon"].to_numpy()[path_tours], geo_stops["lon"].to_numpy()])
+    lat = np.concatenate([tours["depot_lat"].to_numpy()[path_tours], geo_stops["lat"].to_numpy()])
+    client = np.concatenate([np.full(n_depots, "", dtype=object), geo_stops["Client"].astype(str).to_numpy(dtype=object)])
+    prod_codes = tours["Producteur"].cat.codes.to_numpy()[tour_id]
+
+    # Sites uniques : un dépôt par projet, un client par (producteur, position, nom).
+    # Un site reste visible dès qu'une des tournées qui le desservent est sélectionnée.
+    project = tours["ID_Projet"].to_numpy()[tour_id]
+    keys = pd.DataFrame({
+        "depot": is_depot,
+        "a": np.where(is_depot, pd.factorize(project)[0], prod_codes),
+        "lon": np.where(is_depot, 0, np.round(lon * 10 ** COORD_DECIMALS)),
+        "lat": np.where(is_depot, 0, np.round(lat * 10 ** COORD_DECIMALS)),
+        "client": client,
+    })
+    member_site = keys.groupby(list(keys.columns), sort=False).ngroup().to_numpy()
+    first = np.unique(member_site, return_index=True)[1]
+
+    site_tour = tour_id[first]
+    site_depot = is_depot[first]
+    prod = tours["Producteur"].take(site_tour).reset_index(drop=True)
+    prod_str = prod.astype(str)
+
+    # Libellés et couleurs calculés une fois par producteur (code de catégorie) puis indexés ;
+    # l'indice 0 de la table des couleurs est celui des dépôts
+    producers = [str(p) for p in tours["Producteur"].cat.categories]
+    color_index = palette.indices(table, producers) + 1
+    colors = [DEPOT_COLOR] + palette.table(int(color_index.max()) if len(color_index) else 0)
+    depot_names = {p: f"DEPOT: {p}" for p in tours["Producteur"].cat.categories}
+    # Les coordonnées [lon, lat] des enregistrements pydeck ne sont produites qu'à l'émission
+    points = pd.DataFrame({
+        "lon": lon[first],
+        "lat": lat[first],
+        "name": np.where(site_depot, prod_str.map(depot_names), client[first] + " (" + prod_str + ")"),
+        "color": np.where(site_depot, 0, color_index[prod.cat.codes.to_numpy()]).astype(np.int16),
+        "radius": np.where(site_depot, DEPOT_RADIUS, STOP_RADIUS),
+        "type": pd.Categorical(np.where(site_depot, "Depot", "Livraison")),
+        "prod": prod,
+        "veh": tours["Véhicule"].take(site_tour).reset_index(drop=True),
+    })
+
+    # Tracés : vues (n, 2) sur un unique tableau de coordonnées arrondies
+    coords, ends = path_coordinates(tours, stops, path_tours)
+    coords = np.round(coords, COORD_DECIMALS)
+    starts = np.r_[0, ends[:-1]].astype(np.int64)
+    path_prod = tours["Producteur"].take(path_tours).reset_index(drop=True)
+    path_day = tours["Jour"].take(path_tours).reset_index(drop=True)
+    geo_paths = pd.DataFrame({
+        "tour_id": path_tours,
+        "path": _object_array([coords[a:b] for a, b in zip(starts.tolist(), ends.tolist())]),
+        "color": color_index[path_prod.cat.codes.to_numpy()].astype(np.int16),
+        "name": path_prod.astype(str) + " (" + path_day.astype(str) + ")",
+        "prod": path_prod,
+        "day": path_day,
+        "veh": tours["Véhicule"].take(path_tours).reset_index(drop=True),
+    })
+    return Geo({
+        "points": points,
+        "paths": geo_paths,
+        "member_site": member_site,
+        "member_tour": tour_id,
+        "colors": colors,
+    }, coords)
+
+
+class Geo(dict):
+    # Tables de la carte ; les tracés simplifiés par niveau de zoom (`simplified`) s'y ajoutent
+    # après la publication de la vue : nbytes() mesure chaque nouveau niveau une fois
+    def __init__(self, tables, coords):
+        super().__init__(tables, simplified={})
+        self._coords = coords.nbytes  # tableau unique dont la colonne `path` porte des vues
+        self._base = None
+        self._sizes = {}
+
+    def nbytes(self):
+        if self._base is None:
+            self._base = self._coords + nbytes({k: v for k, v in self.items() if k != "simplified"})
+        for zoom, paths in list(self["simplified"].items()):
+            if zoom not in self._sizes:
+                self._sizes[zoom] = nbytes(paths)
+        return self._base + sum(self._sizes.values())
+
+
+def tour_mask(df, selected_prods, selected_days, selected_vehs):
+    # Masque unique partagé par le tableau des tournées et les couches cartographiques
+    return (
+        df["Producteur"].isin(selected_prods) &
+        df["Jour"].isin(selected_days) &
+        df["Véhicule"].isin(selected_vehs)
+    ).to_numpy()
+
+
+def filter_geo(geo, mask):
+    paths, points = geo["paths"], geo["points"]
+    member_site = geo["member_site"][mask[geo["member_tour"]]]
+    visible = np.bincount(member_site, minlength=len(points)) > 0
+    return paths[mask[paths["tour_id"].to_numpy()]], points[visible]
+
+
+# --- NIVEAU DE DÉTAIL ---
+def degrees_per_pixel(zoom):
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def view_for(points, default_zoom=10):
+    # Centrage et zoom calculés sur l'emprise de la sélection
+    lon, lat = points["lon"].to_numpy(), points["lat"].to_numpy()
+    if len(lon) == 0:
+        return 0.0, 0.0, default_zoom
+    extent = max(lon.max() - lon.min(), (lat.max() - lat.min()) * 1.5, 1e-6)
+    zoom = int(np.clip(np.floor(np.log2(360.0 / extent)) + 1, MIN_ZOOM, MAX_ZOOM))
+    return float((lat.min() + lat.max()) / 2), float((lon.min() + lon.max()) / 2), zoom
+
+
+def simplify_path(path, tolerance):
+    pts = np.asarray(path, dtype=float)
+    n = len(pts)
+    if n < 4:
+        return path
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        a, b = stack.pop()
+        if b - a < 2:
+            continue
+        seg = pts[b] - pts[a]
+        rel = pts[a + 1:b] - pts[a]
+        norm = np.hypot(seg[0], seg[1])
+        if norm == 0:
+            # Boucle fermée (dépôt -> dépôt) : distance au point de départ
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            keep[a + 1 + i] = True
+            stack.append((a, a + 1 + i))
+            stack.append((a + 1 + i, b))
+    return pts[keep]
+
+
+def simplified_paths(geo, zoom):
+    # Mémorisé par niveau de zoom pour la version courante des données
+    cache = geo["simplified"]
+    if zoom not in cache:
+        tolerance = degrees_per_pixel(zoom) * SIMPLIFY_PIXELS
+        cache[zoom] = pd.Series(_object_array([simplify_path(p, tolerance) for p in geo["paths"]["path"]]), index=geo["paths"].index)
+    return cache[zoom]
+
+
+def density_grid(points, zoom):
+    cell = degrees_per_pixel(zoom) * GRID_CELL_PIXELS
+    gx = np.floor(points["lon"].to_numpy() / cell).astype(np.int64)
+    gy = np.floor(points["lat"].to_numpy() / cell).astype(np.int64)
+    grid = (
+        pd.DataFrame({"gx": gx, "gy": gy, "prod": points["prod"].cat.codes.to_numpy()})
+        .groupby(["gx", "gy"]).agg(count=("prod", "size"), prods=("prod", "nunique")).reset_index()
+    )
+    lon = (grid["gx"].to_numpy() + 0.5) * cell
+    lat = (grid["gy"].to_numpy() + 0.5) * cell
+    # Rayon en mètres proportionnel à la racine du nombre de livraisons de la cellule
+    cell_m = cell * 111_000 * np.cos(np.radians(lat))
+    counts = grid["count"].to_numpy()
+    return pd.DataFrame({
+        "c": _coords(lon, lat),
+        "n": [f"{k} livraisons" for k in counts],
+        "p": [f"{k} producteur(s)" for k in grid["prods"]],
+        "v": "—",
+        "r": np.round(cell_m / 2 * np.sqrt(counts / counts.max())).astype(int),
+    })
+
+
+def level_of_detail(geo, paths, points, zoom, detailed=False):
+    if detailed:
+        return paths, points, None
+    paths = paths.assign(path=simplified_paths(geo, zoom)[paths.index])
+    is_depot = (points["type"] == "Depot").to_numpy()
+    if zoom >= DENSITY_ZOOM and (~is_depot).sum() <= MAX_DETAIL_POINTS:
+        return paths, points, None
+    # Aucune livraison géolocalisée : pas de couche de densité, seuls dépôts et tracés
+    deliveries = points[~is_depot]
+    return paths, points[is_depot], density_grid(deliveries, zoom) if len(deliveries) else None
+
+
+# --- CHARGE UTILE PYDECK ---
+def point_records(points, with_color=True):
+    columns = [_coords(points["lon"].to_numpy(), points["lat"].to_numpy()), points["name"].tolist(), points["prod"].astype(str).tolist(), points["veh"].astype(str).tolist()]
+    if with_color:
+        columns.append(points["color"].tolist())
+        return [{"c": c, "n": n, "p": p, "v": v, "k": k} for c, n, p, v, k in zip(*columns)]
+    return [{"c": c, "n": n, "p": p, "v": v} for c, n, p, v in zip(*columns)]
+
+
+def path_records(paths):
+    return [
+        {"path": path.tolist(), "n": n, "p": p, "v": v, "k": k}
+        for path, n, p, v, k in zip(
+            paths["path"], paths["name"].tolist(), paths["prod"].astype(str).tolist(),
+            paths["veh"].astype(str).tolist(), paths["color"].tolist(),
+        )
+    ]
+
+
+def deck_layers(paths, points, colors, compact=True, density=None):
+    path_style = dict(width_scale=20, width_min_pixels=3, get_width=5, pickable=True)
+    point_style = dict(radius_min_pixels=5, radius_max_pixels=15, pickable=True)
+    density_layers = [] if density is None else [
+        pdk.Layer("ScatterplotLayer", density if compact else density.rename(columns=LEGACY_KEYS), id="density", get_position="c",
+                  get_color=DENSITY_COLOR, get_radius="r", radius_min_pixels=3, pickable=True),
+    ]
+    if not compact:
+        return density_layers + [
+            pdk.Layer("PathLayer", paths.assign(path=[p.tolist() for p in paths["path"]]), id="paths",
+                      get_color=color_accessor(colors, "color"), get_path="path", **path_style),
+            pdk.Layer("ScatterplotLayer", points, id="points", get_position="[lon, lat]",
+                      get_color=color_accessor(colors, "color"), get_radius="radius", **point_style),
+        ], TOOLTIP
+
+    is_depot = (points["type"] == "Depot").to_numpy()
+    return density_layers + [
+        pdk.Layer("PathLayer", path_records(paths), id="paths", get_color=color_accessor(colors, "k"), get_path="path", **path_style),
+        pdk.Layer("ScatterplotLayer", point_records(points[is_depot], with_color=False), id="depots", get_position="c",
+                  get_color=DEPOT_COLOR, get_radius=DEPOT_RADIUS, **point_style),
+        pdk.Layer("ScatterplotLayer", point_records(points[~is_depot]), id="stops", get_position="c",
+                  get_color=color_accessor(colors, "k"), get_radius=STOP_RADIUS, **point_style),
+    ], COMPACT_TOOLTIP
+
+
+class CompactDeck(pdk.Deck):
+    # Même contenu que pdk.Deck, sérialisé sans indentation ni tri des clés
+    def to_json(self):
+        with span("pydeck.sérialisation"):
+            return json.dumps(self, default=default_serialize, separators=(",", ":"))
@@ -0,0 +1,124 @@
+# --- ANALYSE DE MUTUALISATION ENTRE PRODUCTEURS ---
+# Repère, via l'index spatial en grille, les clients livrés le même jour par plusieurs
+# producteurs (arrêts à moins de `radius_km`), puis simule pour chaque paire de producteurs
+# une tournée commune : départ du dépôt du premier, passage au dépôt du second pour
+# l'enlèvement, puis livraison de l'ensemble des clients (doublons fusionnés). Le gain est
+# mesuré face à une tournée optimisée par producteur et par jour, pour isoler l'effet du
+# regroupement entre producteurs (les contraintes de capacité ne sont pas modélisées).
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from routing import optimize_route, run_chunks, with_distances
+from spatial import GridIndex, connected_components
+
+CLIENT_RADIUS_KM = 0.15
+MAX_MERGED_STOPS = 150  # au-delà, la simulation de tournée commune est ignorée
+MAX_PAIRS = 300         # paires simulées, par nombre de clients communs décroissant
+
+PAIR_COLUMNS = [
+    "Jour", "Producteur A", "Producteur B", "Clients Communs",
+    "Km Séparés", "Km Mutualisés", "Gain (%)", "Gain (km)", "Gain (€)",
+]
+
+
+def client_sites(tables, radius_km=CLIENT_RADIUS_KM):
+    # Étiquette chaque arrêt géolocalisé d'un site client, par jour de livraison
+    tours, stops, paths = tables["tours"], tables["stops"], tables["paths"]
+    geo = stops[stops["lon"].notna() & stops["lat"].notna() & stops["tour_id"].isin(paths["tour_id"])]
+    tour_id = geo["tour_id"].to_numpy()
+    geo = pd.DataFrame({
+        "tour_id": tour_id,
+        "Client": geo["Client"].to_numpy(),
+        "lon": geo["lon"].to_numpy(),
+        "lat": geo["lat"].to_numpy(),
+        "Producteur": tours["Producteur"].take(tour_id).to_numpy(),
+        "Jour": tours["Jour"].take(tour_id).to_numpy(),
+    })
+    if geo.empty:
+        return geo.assign(site=np.array([], dtype=np.int64))
+
+    index = GridIndex(geo["lon"].to_numpy(), geo["lat"].to_numpy(), cell_km=radius_km)
+    i, j, _ = index.query_pairs(radius_km)
+    day = pd.factorize(geo["Jour"])[0]
+    same_day = day[i] == day[j]
+    return geo.assign(site=connected_components(len(geo), i[same_day], j[same_day]))
+
+
+def shared_clients(sites):
+    grouped = sites.groupby("site").agg(
+        Jour=("Jour", "first"),
+        lon=("lon", "mean"),
+        lat=("lat", "mean"),
+        Clients=("Client", lambda c: sorted({str(x) for x in c})),
+        Producteurs=("Producteur", lambda p: sorted(set(p))),
+    )
+    grouped["Nb Producteurs"] = grouped["Producteurs"].str.len()
+    return grouped[grouped["Nb Producteurs"] >= 2].reset_index()
+
+
+def _route_km(chunk):
+    return [(key, optimize_route(lon, lat, dist)[2]) for key, lon, lat, dist in chunk]
+
+
+def _merged_km(chunk):
+    # Dépôt A, puis enlèvement au dépôt B (nœud 1) avant toute livraison
+    return [(key, optimize_route(lon, lat, dist, fixed_prefix=2)[2]) for key, lon, lat, dist in chunk]
+
+
+def _route(depot_lon, depot_lat, stops):
+    return np.r_[depot_lon, stops["lon"].to_numpy()], np.r_[depot_lat, stops["lat"].to_numpy()]
+
+
+def pair_inputs(tables, sites, pairs):
+    tours = tables["tours"]
+    depot_lon, depot_lat = tours["depot_lon"].to_numpy(), tours["depot_lat"].to_numpy()
+    stops_by_key = {k: g.drop_duplicates("site") for k, g in sites.groupby(["Jour", "Producteur"])}
+    first_tour = sites.groupby(["Jour", "Producteur"])["tour_id"].first().to_dict()
+
+    solo_routes, merged_routes, kept = {}, [], []
+    for day, prod_a, prod_b, n_shared in pairs:
+        key_a, key_b = (day, prod_a), (day, prod_b)
+        stops = pd.concat([stops_by_key[key_a], stops_by_key[key_b]]).drop_duplicates("site")
+        if len(stops) > MAX_MERGED_STOPS:
+            continue
+        for key in (key_a, key_b):
+            if key not in solo_routes:
+                t = first_tour[key]
+                solo_routes[key] = (key,) + _route(depot_lon[t], depot_lat[t], stops_by_key[key])
+        ta, tb = first_tour[key_a], first_tour[key_b]
+        merged_routes.append((len(kept),) + _route([depot_lon[ta], depot_lon[tb]], [depot_lat[ta], depot_lat[tb]], stops))
+        kept.append((day, prod_a, prod_b, n_shared))
+    return kept, list(solo_routes.values()), merged_routes
+
+
+def mutualisation_pairs(tables, radius_km=CLIENT_RADIUS_KM, max_pairs=MAX_PAIRS, workers=None, distances=None):
+    sites = client_sites(tables, radius_km)
+    shared = shared_clients(sites)
+
+    counts = {}
+    for day, producers in zip(shared["Jour"], shared["Producteurs"]):
+        for prod_a, prod_b in combinations(producers, 2):
+            counts[(day, prod_a, prod_b)] = counts.get((day, prod_a, prod_b), 0) + 1
+    ranked = sorted(counts.items(), key=lambda kv: -kv[1])[:max_pairs]
+
+    kept, solo_routes, merged_routes = pair_inputs(tables, sites, [k + (n,) for k, n in ranked])
+    solo_km = dict(run_chunks(_route_km, with_distances(solo_routes, distances), workers))
+    merged_km = dict(run_chunks(_merged_km, with_distances(merged_routes, distances), workers))
+
+    tours = tables["tours"]
+    rows = []
+    for key, (day, prod_a, prod_b, n_shared) in enumerate(kept):
+        separate_km = solo_km[(day, prod_a)] + solo_km[(day, prod_b)]
+        if separate_km <= 0:
+            continue
+        gain = 1 - merged_km[key] / separate_km
+        declared = tours[(tours["Jour"] == day) & tours["Producteur"].isin([prod_a, prod_b])]
+        rows.append((
+            day, prod_a, prod_b, n_shared, separate_km, merged_km[key],
+            gain * 100, declared["Distance"].sum() * gain, declared["Coût"].sum() * gain,
+        ))
+    pairs = pd.DataFrame(rows, columns=PAIR_COLUMNS)
+    return pairs.sort_values("Gain (€)", ascending=False, ignore_index=True), shared
@@ -0,0 +1,112 @@
+# --- PALETTE DES PRODUCTEURS ---
+# Une couleur par producteur, attribuée une fois puis conservée sur disque (palette.json, à
+# côté des instantanés) : elle ne change ni d'une exécution à l'autre, ni avec les nouvelles
+# données, ni au redémarrage, et l'état global de `random` n'est plus touché.
+# Les couleurs forment une suite fixe, calculée une fois : des teintes OKLCH dans le gamut
+# sRGB, ordonnées pour que chacune soit la plus éloignée (distance OKLab, proche de l'écart
+# perçu) des précédentes et des couleurs réservées de la carte (dépôts, densité). Chaque
+# nouveau producteur d'une table reçoit le premier indice libre : deux producteurs d'une même
+# carte n'ont la même couleur qu'au-delà de la longueur de la suite.
+# Les couches de la carte ne portent que cet indice (cf. layers.py) ; la table des couleurs
+# n'est transmise qu'une fois par couche.
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from layers import DENSITY_COLOR, DEPOT_COLOR
+from store import SNAPSHOT_DIR
+
+PALETTE_FILE = os.path.join(SNAPSHOT_DIR, "palette.json")
+ALPHA = 200
+LIGHTNESS = (0.68, 0.56, 0.78)
+CHROMA = (0.15, 0.10)
+HUE_STEP = 10  # degrés
+RESERVED = [DEPOT_COLOR, DENSITY_COLOR]
+
+
+# --- ESPACE OKLAB ---
+# Matrices de https://bottosson.github.io/posts/oklab/
+LMS_TO_LAB = np.array([[0.2104542553, 0.7936177850, -0.0040720468],
+                       [1.9779984951, -2.4285922050, 0.4505937099],
+                       [0.0259040371, 0.7827717662, -0.8086757660]])
+RGB_TO_LMS = np.array([[0.4122214708, 0.5363325363, 0.0514459929],
+                       [0.2119034982, 0.6806995451, 0.1073969566],
+                       [0.0883024619, 0.2817188376, 0.6299787005]])
+
+
+def _to_linear(rgb):
+    return np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
+def _to_srgb(linear):
+    linear = np.clip(linear, 0, None)
+    return np.where(linear <= 0.0031308, linear * 12.92, 1.055 * linear ** (1 / 2.4) - 0.055)
+
+
+def srgb_to_oklab(rgb):
+    return np.cbrt(_to_linear(np.asarray(rgb, dtype=float)) @ RGB_TO_LMS.T) @ LMS_TO_LAB.T
+
+
+def oklab_to_linear(lab):
+    return (np.asarray(lab, dtype=float) @ np.linalg.inv(LMS_TO_LAB).T) ** 3 @ np.linalg.inv(RGB_TO_LMS).T
+
+
+def color_sequence():
+    # Candidats OKLCH (clarté x saturation x teinte) restés dans le gamut, puis ordre du point
+    # le plus éloigné : la i-ème couleur maximise son écart minimal aux i-1 premières
+    lightness, chroma, hue = np.meshgrid(LIGHTNESS, CHROMA, np.radians(np.arange(0, 360, HUE_STEP)), indexing="ij")
+    lab = np.column_stack([lightness.ravel(), chroma.ravel() * np.cos(hue.ravel()), chroma.ravel() * np.sin(hue.ravel())])
+    linear = oklab_to_linear(lab)
+    inside = ((linear >= -1e-6) & (linear <= 1 + 1e-6)).all(axis=1)
+    lab, rgb = lab[inside], np.round(_to_srgb(linear[inside]) * 255).astype(int)
+
+    reserved = srgb_to_oklab(np.array([c[:3] for c in RESERVED]) / 255)
+    nearest = np.linalg.norm(lab[:, None] - reserved[None], axis=2).min(axis=1)
+    order = []
+    for _ in range(len(lab)):
+        i = int(np.argmax(nearest))
+        order.append(i)
+        nearest = np.minimum(nearest, np.linalg.norm(lab - lab[i], axis=1))
+        nearest[i] = -1
+    return [[*map(int, rgb[i]), ALPHA] for i in order]
+
+
+# --- ATTRIBUTION ---
+class Palette:
+    def __init__(self, path=PALETTE_FILE):
+        self.path = path
+        self.colors = color_sequence()
+        self.assigned = {}  # table -> {producteur: indice}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.assigned = json.load(f)
+
+    def indices(self, table, producers):
+        # Indice de couleur de chaque producteur ; un nouveau venu prend le premier indice libre de sa table
+        with self._lock:
+            assigned = self.assigned.setdefault(table, {})
+            new = [p for p in dict.fromkeys(producers) if p not in assigned]
+            if new:
+                used = set(assigned.values())
+                free = (i for i in range(len(assigned) + len(new)) if i not in used)
+                for producer, index in zip(new, free):
+                    assigned[producer] = index
+                self.save()
+            return np.array([assigned[p] for p in producers], dtype=np.int32)
+
+    def table(self, size):
+        # Couleurs des indices 0..size-1 ; au-delà de la suite, les couleurs sont réutilisées
+        return [self.colors[i % len(self.colors)] for i in range(size)]
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.assigned, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
@@ -0,0 +1,131 @@
+# --- MODE AGRÉGATION SERVEUR ---
+# Variante de TableSync qui s'appuie sur les fonctions SQL de sql/diagnostic.sql : Postgres
+# aplatit `data_json` et agrège le cube producteur × jour × véhicule, l'application ne
+# reçoit que les tournées agrégées. Les arrêts géolocalisés (carte, optimisation,
+# mutualisation) ne sont demandés qu'au premier appel de `geometry()` pour une version.
+# Le cube et les numéros de tournée font partie des tables publiées : une vue garde ceux de
+# sa version, même si la source en a chargé une plus récente entre-temps.
+# Activé par la variable d'environnement DIAG_SERVER_SIDE=1.
+
+import os
+import threading
+import time
+
+import pandas as pd
+
+from flatten import PATH_COLUMNS, STOP_COLUMNS, TOUR_COLUMNS, compact, depots_table, paths_table
+from instrument import count, span
+from kpi import CUBE_KEYS, MEASURES
+from sync import PAGE_SIZE, REFRESH_INTERVAL, TableSync
+
+SERVER_SIDE = os.environ.get("DIAG_SERVER_SIDE", "") not in ("", "0")
+
+TOUR_FIELDS = {
+    "id_projet": "ID_Projet", "producteur": "Producteur", "created_at": "Date", "jour": "Jour",
+    "tournee": "Tournée", "vehicule": "Véhicule", "ca": "CA", "cout": "Coût", "ratio": "Ratio",
+    "distance": "Distance", "temps": "Temps", "volume_kg": "Volume (kg)", "nb_arrets": "Nb Arrêts",
+    "depot_lon": "depot_lon", "depot_lat": "depot_lat",
+}
+CUBE_FIELDS = dict(zip(
+    ["producteur", "jour", "vehicule", "nb_tournees", "distance", "nb_arrets", "volume_kg", "cout", "ca", "temps", "somme_ratios"],
+    CUBE_KEYS + list(MEASURES),
+))
+STOP_FIELDS = {"ordre": "Ordre", "client": "Client", "lon": "lon", "lat": "lat", "volume_kg": "Volume (kg)"}
+
+
+def fetch_rpc(client, function, params, page_size=PAGE_SIZE):
+    rows, start = [], 0
+    while True:
+        with span("supabase.rpc", function=function, start=start):
+            page = client.rpc(function, params).range(start, start + page_size - 1).execute().data or []
+        count("supabase.lignes", len(page))
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        start += page_size
+
+
+class ServerAggregate:
+    def __init__(self, client, table, page_size=PAGE_SIZE, refresh_interval=REFRESH_INTERVAL):
+        self.client = client
+        self.table = table
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+
+        self.state = None
+        self.tables = None
+        self.rejected = {}
+        self.version = 0
+        self.last_sync = None
+        self._geometry = {}  # version -> tables avec arrêts et tracés (dernière version demandée)
+        self._lock = threading.Lock()
+        self._swap_lock = threading.Lock()
+
+    @property
+    def project_count(self):
+        return (self.state or {}).get("projects", 0)
+
+    def _rpc(self, function):
+        return fetch_rpc(self.client, function, {"p_table": self.table}, self.page_size)
+
+    # --- RAFRAÎCHISSEMENT ---
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and self.last_sync is not None and time.monotonic() - self.last_sync < self.refresh_interval:
+                return self.tables
+            state = self.client.rpc("diagnostic_state", {"p_table": self.table}).execute().data
+            if state != self.state or self.tables is None:
+                self.load(state)
+            self.last_sync = time.monotonic()
+            return self.tables
+
+    def load(self, state):
+        raw = pd.DataFrame(self._rpc("diagnostic_tours"), columns=["tour_num"] + list(TOUR_FIELDS))
+        tours = raw.rename(columns=TOUR_FIELDS)[TOUR_COLUMNS]
+        tours["Date"] = pd.to_datetime(tours["Date"], errors="coerce", utc=True)
+        tours = compact(tours.astype({"depot_lon": float, "depot_lat": float}))
+
+        cube = pd.DataFrame(self._rpc("diagnostic_cube"), columns=list(CUBE_FIELDS)).rename(columns=CUBE_FIELDS)
+        rejected = {r["id_projet"]: "data_json illisible (décodage serveur)" for r in self._rpc("diagnostic_rejected")}
+        tables = {
+            "tours": tours,
+            "stops": pd.DataFrame(columns=STOP_COLUMNS),
+            "paths": pd.DataFrame(columns=PATH_COLUMNS),
+            "depots": depots_table(tours),
+            "cube": compact(cube),
+            "tour_nums": raw["tour_num"].to_numpy(),
+        }
+        with self._swap_lock:
+            self.tables = tables
+            self.rejected = rejected
+            self.state = state
+            self.version += 1
+
+    def current(self):
+        with self._swap_lock:
+            return self.tables, self.version
+
+    # --- GÉOMÉTRIE À LA DEMANDE ---
+    def geometry(self, tables, version):
+        # Arrêts rattachés aux tournées de `tables` (celles de la vue) : un arrêt dont la tournée
+        # n'y figure pas (données plus récentes côté serveur) est ignoré
+        with self._lock:
+            cached = self._geometry.get(version)
+            if cached is not None:
+                return cached
+            tours = tables["tours"]
+            stops = pd.DataFrame(self._rpc("diagnostic_stops"), columns=["id_projet", "tour_num"] + list(STOP_FIELDS))
+            # (projet, n° de tournée) -> identifiant positionnel de tournée
+            keys = pd.MultiIndex.from_arrays([tours["ID_Projet"].to_numpy(), tables["tour_nums"]])
+            tour_id = keys.get_indexer(pd.MultiIndex.from_arrays([stops["id_projet"].to_numpy(), stops["tour_num"].to_numpy()]))
+            stops = stops.rename(columns=STOP_FIELDS).assign(tour_id=tour_id)
+            stops = compact(stops[tour_id >= 0][STOP_COLUMNS].astype({"lon": float, "lat": float, "Volume (kg)": float}).reset_index(drop=True))
+            self._geometry = {version: {**tables, "stops": stops, "paths": paths_table(tours)}}
+            return self._geometry[version]
+
+
+def open_source(client, table, snapshot_dir=None, rest=None):
+    # Source de données des dashboards : agrégats serveur ou synchronisation incrémentale locale
+    if SERVER_SIDE:
+        return ServerAggregate(client, table)
+    return TableSync(client, table, snapshot_dir=snapshot_dir, rest=rest)
@@ -0,0 +1,164 @@
+# --- LECTURE CONCURRENTE DE L'API REST SUPABASE ---
+# Client asynchrone (httpx) de l'API PostgREST exposée par Supabase (`/rest/v1/<table>`).
+# La première page est demandée avec le décompte exact des lignes (`Prefer: count=exact`) ;
+# les pages suivantes sont alors lancées ensemble, dans la limite d'un pool de connexions
+# partagé par toutes les tables. Une page tronquée par la limite de lignes du serveur
+# (`max-rows`) est complétée par une requête de suite, au lieu d'arrêter la lecture.
+# Les erreurs réseau, 429 et 5xx sont retentées avec un délai exponentiel.
+#
+# Une boucle d'événements tourne dans un fil dédié ; `pages()` est un itérateur ordinaire
+# qui rend chaque page dès son arrivée, pour l'aplatir pendant que les autres se téléchargent.
+#
+#   DIAG_ASYNC_FETCH=0      -> revient aux requêtes séquentielles du client supabase
+#   DIAG_REST_POOL=8        -> connexions simultanées, toutes tables confondues
+#   DIAG_REST_RETRIES=4     -> nouvelles tentatives par page
+
+import asyncio
+import os
+import queue
+import random
+import re
+import threading
+
+import httpx
+
+from instrument import count, span
+
+ASYNC_FETCH = os.environ.get("DIAG_ASYNC_FETCH", "1") not in ("", "0")
+POOL_SIZE = int(os.environ.get("DIAG_REST_POOL", 8))
+RETRIES = int(os.environ.get("DIAG_REST_RETRIES", 4))
+BACKOFF = 0.5  # secondes, doublé à chaque tentative
+MAX_BACKOFF = 8.0
+TIMEOUT = 30.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+CONTENT_RANGE = re.compile(r"(?:(\d+)-(\d+)|\*)/(\d+|\*)")
+_DONE = object()
+
+
+class RestError(RuntimeError):
+    pass
+
+
+def incremental_filter(last_id=None, last_created_at=None):
+    # Même filtre que sync.fetch_pages, en paramètres PostgREST
+    if last_id is not None and last_created_at is not None:
+        return {"or": f'(id.gt.{last_id},created_at.gt."{last_created_at}")'}
+    if last_id is not None:
+        return {"id": f"gt.{last_id}"}
+    return {}
+
+
+def parse_total(response):
+    match = CONTENT_RANGE.match(response.headers.get("content-range", ""))
+    return int(match.group(3)) if match and match.group(3) != "*" else None
+
+
+def retry_delay(attempt, response=None):
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), MAX_BACKOFF)
+    return min(BACKOFF * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+
+class RestClient:
+    def __init__(self, url, key, pool_size=POOL_SIZE, retries=RETRIES, timeout=TIMEOUT, transport=None):
+        self.base = url.rstrip("/") + "/rest/v1"
+        self.headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        self.pool_size = pool_size
+        self.retries = retries
+        self.timeout = timeout
+        self.transport = transport
+        self._client = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="diag-rest", daemon=True)
+        self._thread.start()
+
+    def _http(self):
+        # Créé dans la boucle du client ; le sémaphore borne les requêtes en vol au pool
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(self.timeout, pool=None),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                transport=self.transport,
+            )
+            self._slots = asyncio.Semaphore(self.pool_size)
+        return self._client
+
+    def close(self):
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+    # --- REQUÊTES ---
+    async def _get(self, table, params, start, stop, exact=False):
+        client = self._http()
+        headers = {"Range-Unit": "items", "Range": f"{start}-{stop}"}
+        if exact:
+            headers["Prefer"] = "count=exact"
+        for attempt in range(self.retries + 1):
+            response = None
+            try:
+                async with self._slots:
+                    with span("supabase.get", table=table, start=start, attempt=attempt):
+                        response = await client.get(f"{self.base}/{table}", params=params, headers=headers)
+                if response.status_code not in RETRY_STATUS:
+                    break
+            except httpx.TransportError as e:
+                if attempt == self.retries:
+                    raise RestError(f"{table} [{start}-{stop}] : {e}") from e
+            if attempt < self.retries:
+                count("supabase.tentatives")
+                await asyncio.sleep(retry_delay(attempt, response))
+        if response.status_code >= 400:
+            raise RestError(f"{table} [{start}-{stop}] : HTTP {response.status_code} {response.text[:200]}")
+        rows = response.json()
+        count("supabase.lignes", len(rows))
+        return rows, parse_total(response)
+
+    async def _pages(self, table, params, page_size, emit):
+        params = {"select": "*", "order": "id.asc", **params}
+        first, total = await self._get(table, params, 0, page_size - 1, exact=True)
+        emit(first)
+        if total is None:
+            # Décompte indisponible : lecture séquentielle jusqu'à une page vide
+            start = len(first)
+            while first:
+                first, _ = await self._get(table, params, start, start + page_size - 1)
+                emit(first)
+                start += len(first)
+            return
+
+        # Pages restantes lancées ensemble ; une page plus courte que demandé (limite de lignes
+        # du serveur) relance la suite de sa plage
+        step = max(len(first), 1)
+        tasks = {
+            asyncio.ensure_future(self._get(table, params, start, min(start + step, total) - 1)): start
+            for start in range(len(first), total, step)
+        }
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                start = tasks.pop(task)
+                rows, _ = task.result()
+                emit(rows)
+                stop = min(start + step, total)
+                if rows and start + len(rows) < stop:
+                    tasks[asyncio.ensure_future(self._get(table, params, start + len(rows), stop - 1))] = start + len(rows)
+
+    def pages(self, table, params=None, page_size=1000):
+        # Itérateur synchrone : pages dans leur ordre d'arrivée
+        pages = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(self._pages(table, params or {}, page_size, pages.put), self._loop)
+        future.add_done_callback(lambda f: pages.put(_DONE))
+        while True:
+            page = pages.get()
+            if page is _DONE:
+                future.result()  # relaie l'erreur éventuelle
+                return
+            if page:
+                yield page
+
+    def rows(self, table, params=None, page_size=1000):
+        for page in self.pages(table, params, page_size):
+            yield from page
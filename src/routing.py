@@ -0,0 +1,195 @@
+# --- RÉ-OPTIMISATION DES TOURNÉES ---
+# Pour chaque tournée (dépôt + arrêts géolocalisés), calcule un ordre de passage amélioré
+# (plus proche voisin, puis 2-opt et Or-opt vectorisés sur une matrice de distances
+# haversine, ou lue dans le cache de distances.py) et le compare à l'ordre soumis. Le gain relatif est appliqué à la distance
+# et au coût déclarés (`stats.dist`, `stats.cost`) pour estimer l'économie potentielle.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0
+MIN_PARALLEL_TOURS = 200  # en dessous, le coût de lancement des processus ne vaut pas le coup
+CHUNK_SIZE = 100
+# Processus de calcul démarrés depuis un processus serveur neuf, jamais par fork de l'application :
+# un fork copierait l'état des fils en cours (Streamlit, rafraîchissement, client REST), verrous compris
+MP_CONTEXT = multiprocessing.get_context("forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+EPS = 1e-9
+
+RESULT_COLUMNS = ["tour_id", "Ordre Optimisé", "Km Ordre Soumis", "Km Ordre Optimisé", "Gain (%)", "Gain (km)", "Gain (€)"]
+
+
+# --- DISTANCES ---
+def haversine_matrix(lon, lat):
+    lon, lat = np.radians(lon), np.radians(lat)
+    dlon = lon[:, None] - lon[None, :]
+    dlat = lat[:, None] - lat[None, :]
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:, None]) * np.cos(lat[None, :]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def path_km(path):
+    pts = np.radians(np.asarray(path, dtype=float))
+    if len(pts) < 2:
+        return 0.0
+    dlon, dlat = np.diff(pts[:, 0]), np.diff(pts[:, 1])
+    a = np.sin(dlat / 2) ** 2 + np.cos(pts[:-1, 1]) * np.cos(pts[1:, 1]) * np.sin(dlon / 2) ** 2
+    return float((2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))).sum())
+
+
+def route_length(route, dist):
+    return float(dist[route[:-1], route[1:]].sum())
+
+
+# --- HEURISTIQUES ---
+def nearest_neighbour(dist):
+    n = len(dist)
+    route = [0]
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[route[-1]])
+        nxt = int(np.argmin(row))
+        route.append(nxt)
+        visited[nxt] = True
+    route.append(0)
+    return np.array(route)
+
+
+def two_opt(route, dist):
+    # Meilleure inversion de segment à chaque passe, évaluée pour toutes les paires d'arêtes
+    route = route.copy()
+    m = len(route) - 1
+    if m < 4:
+        return route
+    while True:
+        a, b = route[:-1], route[1:]
+        delta = dist[a[:, None], a[None, :]] + dist[b[:, None], b[None, :]] - dist[a, b][:, None] - dist[a, b][None, :]
+        delta = np.triu(delta, k=2)
+        i, j = np.unravel_index(np.argmin(delta), delta.shape)
+        if delta[i, j] >= -EPS:
+            return route
+        route[i + 1:j + 1] = route[i + 1:j + 1][::-1]
+
+
+def or_opt(route, dist, max_segment=3):
+    # Meilleur déplacement d'un segment de 1 à 3 arrêts, évalué pour tous les couples
+    # (début de segment, arête d'insertion) à la fois, dans les deux sens
+    route = route.copy()
+    m = len(route) - 1
+    edges = np.arange(m)
+    while True:
+        best_gain, best_move = EPS, None
+        for seg_len in range(1, min(max_segment, m - 2) + 1):
+            starts = np.arange(1, m - seg_len + 1)
+            ends = starts + seg_len - 1
+            prev, nxt = route[starts - 1], route[ends + 1]
+            first, last = route[starts], route[ends]
+            removal = dist[prev, first] + dist[last, nxt] - dist[prev, nxt]
+
+            u, v = route[:-1], route[1:]
+            base = dist[u, v][None, :]
+            forward = dist[u[None, :], first[:, None]] + dist[last[:, None], v[None, :]] - base
+            backward = dist[u[None, :], last[:, None]] + dist[first[:, None], v[None, :]] - base
+            gain = removal[:, None] - np.minimum(forward, backward)
+            touching = (edges[None, :] >= starts[:, None] - 1) & (edges[None, :] <= ends[:, None])
+            gain[touching] = -np.inf
+
+            i, e = np.unravel_index(np.argmax(gain), gain.shape)
+            if gain[i, e] > best_gain:
+                best_gain, best_move = gain[i, e], (starts[i], ends[i], e, backward[i, e] < forward[i, e])
+
+        if best_move is None:
+            return route
+        start, end, e, reverse = best_move
+        segment = route[start:end + 1][::-1] if reverse else route[start:end + 1]
+        rest = np.r_[route[:start], route[end + 1:]]
+        # Position d'insertion : après le nœud `route[e]`, recalculée dans la route sans le segment
+        k = e if e < start else e - (end - start + 1)
+        route = np.r_[rest[:k + 1], segment, rest[k + 1:]]
+
+
+def optimize_route(lon, lat, dist=None, fixed_prefix=1):
+    # Le nœud 0 est le dépôt ; les nœuds 1..fixed_prefix-1 (ex. dépôt d'enlèvement) sont
+    # parcourus ensuite dans cet ordre, puis les arrêts, ordonnés sur le chemin qui part du
+    # dernier nœud fixé et revient au dépôt. Renvoie (ordre des nœuds 1..n-1, km soumis, km optimisé)
+    if dist is None:
+        dist = haversine_matrix(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    n = len(dist)
+    last = fixed_prefix - 1
+    prefix_km = float(dist[np.arange(last), np.arange(1, last + 1)].sum())
+
+    # Chemin ramené à une boucle : le nœud 0 de la sous-matrice part du dernier nœud fixé
+    # (ligne) et revient au dépôt (colonne). Les heuristiques ne déplacent jamais le nœud 0.
+    nodes = np.r_[last, np.arange(fixed_prefix, n)]
+    sub = dist[np.ix_(nodes, nodes)]
+    sub[:, 0] = dist[nodes, 0]
+    sub[0, 0] = 0.0
+    submitted = np.r_[0, np.arange(1, len(sub)), 0]
+    route = two_opt(nearest_neighbour(sub), sub)
+    route = two_opt(or_opt(route, sub), sub)
+    best = min((submitted, route), key=lambda r: route_length(r, sub))
+    order = np.r_[np.arange(1, fixed_prefix), nodes[best[1:-1]]] - 1
+    return order, prefix_km + route_length(submitted, sub), prefix_km + route_length(best, sub)
+
+
+def _optimize_chunk(chunk):
+    results = []
+    for tour_id, lon, lat, orders, dist in chunk:
+        order, km_submitted, km_optimized = optimize_route(lon, lat, dist)
+        results.append((tour_id, orders[order].tolist(), km_submitted, km_optimized))
+    return results
+
+
+# --- CALCUL SUR TOUTES LES TOURNÉES ---
+def tour_inputs(tables):
+    tours, stops, paths = tables["tours"], tables["stops"], tables["paths"]
+    geo_stops = stops[stops["lon"].notna() & stops["lat"].notna() & stops["tour_id"].isin(paths["tour_id"])]
+    depot_lon, depot_lat = tours["depot_lon"].to_numpy(), tours["depot_lat"].to_numpy()
+    inputs = []
+    for tour_id, group in geo_stops.groupby("tour_id", sort=True):
+        if len(group) < 2:
+            continue
+        # L'ordre optimisé est exprimé dans la numérotation `Ordre` des arrêts soumis
+        inputs.append((
+            tour_id,
+            np.r_[depot_lon[tour_id], group["lon"].to_numpy()],
+            np.r_[depot_lat[tour_id], group["lat"].to_numpy()],
+            group["Ordre"].to_numpy(),
+        ))
+    return inputs
+
+
+def with_distances(items, distances):
+    # Matrices lues en un lot dans le cache partagé (distances.py) avant l'envoi aux processus ;
+    # sans cache, chaque tournée calcule sa matrice haversine
+    if distances is None:
+        return [item + (None,) for item in items]
+    matrices = distances.matrices([(item[1], item[2]) for item in items])
+    distances.save()
+    return [item + (dist,) for item, dist in zip(items, matrices)]
+
+
+def run_chunks(func, items, workers=None, chunk_size=CHUNK_SIZE, min_parallel=MIN_PARALLEL_TOURS):
+    # `func` traite une liste d'éléments ; réparti sur un pool de processus si le volume le justifie
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    if len(items) < min_parallel or workers == 1:
+        return [r for chunk in chunks for r in func(chunk)]
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=MP_CONTEXT) as pool:
+        return [r for chunk_result in pool.map(func, chunks) for r in chunk_result]
+
+
+def optimize_tours(tables, workers=None, distances=None):
+    results = run_chunks(_optimize_chunk, with_distances(tour_inputs(tables), distances), workers)
+
+    df = pd.DataFrame(results, columns=["tour_id", "Ordre Optimisé", "Km Ordre Soumis", "Km Ordre Optimisé"])
+    tours = tables["tours"].iloc[df["tour_id"].to_numpy()]
+    gain = np.where(df["Km Ordre Soumis"] > 0, 1 - df["Km Ordre Optimisé"] / df["Km Ordre Soumis"], 0.0)
+    df["Gain (%)"] = gain * 100
+    df["Gain (km)"] = tours["Distance"].to_numpy() * gain
+    # Le coût déclaré est supposé proportionnel aux kilomètres parcourus
+    df["Gain (€)"] = tours["Coût"].to_numpy() * gain
+    return df[RESULT_COLUMNS]
@@ -0,0 +1,309 @@
+# --- SIMULATEUR DE SCÉNARIOS ---
+# Évalue des variantes des tournées soumises : changer le véhicule d'un producteur, déplacer
+# son dépôt, fusionner deux jours de livraison, supprimer les petits arrêts. Seules les
+# tournées touchées par un scénario sont recalculées : les longueurs de tracé de référence
+# sont calculées une fois par version des données (matrice de distances de distances.py), et
+# chaque tournée ou regroupement recalculé est mémorisé pour les variantes suivantes.
+#
+# Comme pour la ré-optimisation (routing.py), l'effet d'un changement est appliqué en relatif
+# aux kilomètres et au coût déclarés (`stats.dist`, `stats.cost`) :
+#   - km      = km déclarés x (tracé du scénario / tracé soumis) ;
+#   - coût    = coût déclaré x même ratio x (coût kilométrique du nouveau véhicule / de l'ancien),
+#               coût kilométrique observé par type de véhicule sur l'ensemble des tournées ;
+#   - fusion  = une seule tournée optimisée par producteur pour les deux jours, comparée aux
+#               tournées de chaque jour optimisées séparément (cf. mutualisation.py).
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from distances import DistanceMatrix
+from flatten import path_coordinates
+from instrument import span
+from routing import optimize_route, run_chunks
+from tenants import nbytes
+
+MEMO_SIZE = 100_000  # tracés recalculés et scénarios mémorisés
+MIN_PARALLEL_SCENARIOS = 8
+# Saisie des changements (éditeur du dashboard) : type -> (libellé, format de la valeur)
+CHANGE_LABELS = {
+    "véhicule": ("Changer de véhicule", "type de véhicule"),
+    "dépôt": ("Déplacer le dépôt", "lon, lat"),
+    "fusion": ("Fusionner deux jours", "Lundi > Mardi"),
+    "seuil": ("Supprimer les petits arrêts", "kg minimum"),
+}
+ALL_PRODUCERS = "Tous"
+RESULT_COLUMNS = [
+    "Scénario", "Km", "Δ Km", "Coût (€)", "Δ Coût (€)", "Volume (kg)", "€/kg", "Δ €/kg", "Tournées recalculées",
+]
+BASELINE = "Situation actuelle"
+
+
+def kilometre_rates(tours):
+    by_vehicle = tours.groupby("Véhicule", observed=True)[["Coût", "Distance"]].sum()
+    rates = by_vehicle["Coût"] / by_vehicle["Distance"].where(by_vehicle["Distance"] > 0)
+    return {str(v): r for v, r in rates.items() if np.isfinite(r)}
+
+
+class ScenarioEngine:
+    def __init__(self, tables, distances=None):
+        tours, stops = tables["tours"], tables["stops"]
+        self.distances = distances if distances is not None else DistanceMatrix(path=None)
+        self.producer = tours["Producteur"].astype(str).to_numpy()
+        self.day = tours["Jour"].astype(str).to_numpy()
+        self.vehicle = tours["Véhicule"].astype(str).to_numpy()
+        self.depot = tours[["depot_lon", "depot_lat"]].to_numpy(dtype=float)
+        self.km = tours["Distance"].to_numpy(dtype=float)
+        self.cost = tours["Coût"].to_numpy(dtype=float)
+        self.volume = tours["Volume (kg)"].to_numpy(dtype=float)
+        self.rates = kilometre_rates(tours)
+        self.vehicles = sorted(self.rates)
+
+        # Arrêts regroupés par tournée, dans l'ordre de passage
+        order = np.lexsort((stops["Ordre"].to_numpy(), stops["tour_id"].to_numpy()))
+        stop_tour = stops["tour_id"].to_numpy()[order]
+        self.stop_lon = stops["lon"].to_numpy(dtype=float)[order]
+        self.stop_lat = stops["lat"].to_numpy(dtype=float)[order]
+        self.stop_vol = stops["Volume (kg)"].to_numpy(dtype=float)[order]
+        self.stop_start = np.searchsorted(stop_tour, np.arange(len(tours) + 1))
+        self.smallest_stop = np.full(len(tours), np.inf)
+        np.minimum.at(self.smallest_stop, stop_tour, self.stop_vol)
+
+        # Tracés soumis de référence (tournées à dépôt géolocalisé), calculés en un lot
+        with span("scénarios.référence", tours=len(tours)):
+            traced = tables["paths"]["tour_id"].to_numpy()
+            self.model_km = np.full(len(tours), np.nan)
+            self.model_km[traced] = self.distances.path_lengths(*path_coordinates(tours, stops, traced))
+        self.baseline = self._totals(self.km.sum(), self.cost.sum(), self.volume.sum())
+
+        self._memo = OrderedDict()
+        self._memo_bytes = 0
+        self._lock = threading.Lock()
+
+    # Copie envoyée aux processus de calcul : sans verrou ni mémo
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_memo"], state["_memo_bytes"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._memo = OrderedDict()
+        self._memo_bytes = 0
+        self._lock = threading.Lock()
+
+    def nbytes(self):
+        # Tableaux par tournée et par arrêt, et mémo (compté à chaque entrée ajoutée ou retirée)
+        return sum(v.nbytes for v in self.__dict__.values() if isinstance(v, np.ndarray)) + self._memo_bytes
+
+    def _memoized(self, key, compute):
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        return self._remember(key, compute())
+
+    def _remember(self, key, value):
+        with self._lock:
+            if key not in self._memo:
+                self._memo_bytes += nbytes(key) + nbytes(value)
+            self._memo[key] = value
+            if len(self._memo) > MEMO_SIZE:
+                self._memo_bytes -= nbytes(self._memo.popitem(last=False))
+        return value
+
+    # --- TRACÉS ---
+    def _ranges(self, tour_ids):
+        # Indices des arrêts des tournées, à la suite, et rang de la tournée propriétaire
+        first, counts = self.stop_start[tour_ids], self.stop_start[tour_ids + 1] - self.stop_start[tour_ids]
+        owner = np.repeat(np.arange(len(tour_ids)), counts)
+        return np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts), owner
+
+    def _kept(self, index, threshold):
+        keep = self.stop_vol[index] >= threshold
+        located = keep & ~np.isnan(self.stop_lon[index]) & ~np.isnan(self.stop_lat[index])
+        return keep, located
+
+    def _loops_km(self, tour_ids, depots, min_kg):
+        # Tracés dans l'ordre soumis (dépôt, arrêts conservés géolocalisés, dépôt) et volume
+        # conservé de plusieurs tournées, en un seul lot
+        index, owner = self._ranges(tour_ids)
+        keep, located = self._kept(index, min_kg[owner])
+        kept_vol = np.bincount(owner[keep], weights=self.stop_vol[index[keep]], minlength=len(tour_ids))
+        n, stops = len(tour_ids), index[located]
+        owners = np.r_[np.arange(n), owner[located], np.arange(n)]
+        lon = np.r_[depots[:, 0], self.stop_lon[stops], depots[:, 0]]
+        lat = np.r_[depots[:, 1], self.stop_lat[stops], depots[:, 1]]
+        order = np.lexsort((np.r_[np.zeros(n), np.ones(len(stops)), np.full(n, 2)], owners))
+        ends = np.cumsum(np.bincount(owners, minlength=n))
+        return self.distances.path_lengths(np.column_stack((lon[order], lat[order])), ends), kept_vol
+
+    def _optimized_km(self, tour_ids, depot, min_kg):
+        # Une tournée optimisée (cf. routing.optimize_route) pour les arrêts conservés des tournées
+        index, owner = self._ranges(tour_ids)
+        keep, located = self._kept(index, min_kg[owner])
+        stops = index[located]
+        lon, lat = np.r_[depot[0], self.stop_lon[stops]], np.r_[depot[1], self.stop_lat[stops]]
+        if len(stops) < 2:
+            return float(self.distances.path_lengths(np.column_stack((np.r_[lon, lon[0]], np.r_[lat, lat[0]])), [len(lon) + 1])[0])
+        return optimize_route(lon, lat, self.distances.matrix(lon, lat))[2]
+
+    def _group_ratios(self, groups, depot, min_kg):
+        # (ratio km du scénario / km de référence, volume conservé) de chaque regroupement ;
+        # 1 si non calculable. Les tournées seules sont recalculées en un lot, les fusions une à une.
+        results, singles = {}, []
+        for key, (members, merged) in groups.items():
+            memo_key = (tuple(members), tuple(np.round(depot[members[0]], 5)), tuple(min_kg[members]), merged)
+            with self._lock:
+                cached = self._memo.get(memo_key)
+            if cached is not None:
+                results[key] = cached
+            elif merged:
+                base = sum(self._memoized(("optimisée", t), lambda t=t: self._optimized_km(
+                    np.array([t]), self.depot[t], np.zeros(1))) for t in members)
+                new = self._optimized_km(members, depot[members[0]], min_kg[members])
+                index, owner = self._ranges(members)
+                kept = self.stop_vol[index][self._kept(index, min_kg[members][owner])[0]].sum()
+                results[key] = self._remember(memo_key, (new / base if base > 0 and np.isfinite(new) else 1.0, kept))
+            else:
+                singles.append((key, members[0], memo_key))
+
+        if singles:
+            ids = np.array([t for _, t, _ in singles])
+            new, kept = self._loops_km(ids, depot[ids], min_kg[ids])
+            base = self.model_km[ids]
+            ratio = np.where((base > 0) & np.isfinite(new), new / np.where(base > 0, base, 1), 1.0)
+            for (key, _, memo_key), r, v in zip(singles, ratio, kept):
+                results[key] = self._remember(memo_key, (r, v))
+        return results
+
+    # --- ÉVALUATION ---
+    def _totals(self, km, cost, volume):
+        return {"Km": km, "Coût (€)": cost, "Volume (kg)": volume, "€/kg": cost / volume if volume > 0 else np.nan}
+
+    def evaluate(self, changes):
+        return dict(self._memoized(scenario_key(changes), lambda: self._evaluate(changes)))
+
+    def _evaluate(self, changes):
+        vehicle, depot, day = self.vehicle.copy(), self.depot.copy(), self.day.copy()
+        min_kg = np.zeros(len(day))
+        rerouted = np.zeros(len(day), dtype=bool)
+        merged = set()  # (producteur, jour) regroupés en une tournée
+        for change in changes:
+            kind, producer = change[0], change[1]
+            scope = self.producer == producer if producer else np.ones(len(day), dtype=bool)
+            if kind == "véhicule":
+                vehicle[scope] = change[2]
+            elif kind == "dépôt":
+                depot[scope] = (change[2], change[3])
+                rerouted |= scope
+            elif kind == "fusion":
+                source, target = change[2], change[3]
+                moved = scope & ((day == source) | (day == target))
+                day[moved] = target
+                merged.update((p, target) for p in np.unique(self.producer[moved]))
+                rerouted |= moved
+            elif kind == "seuil":
+                min_kg[scope] = np.maximum(min_kg[scope], change[2])
+                rerouted |= scope & (self.smallest_stop < change[2])
+            else:
+                raise ValueError(f"Changement inconnu : {kind}")
+
+        # Regroupements à recalculer : une tournée seule, ou toutes celles d'un (producteur, jour) fusionné
+        members = {}
+        for t in np.flatnonzero(rerouted):
+            key = (self.producer[t], day[t]) if (self.producer[t], day[t]) in merged else t
+            members.setdefault(key, []).append(t)
+        groups = {key: (np.array(ids), isinstance(key, tuple) and len(ids) > 1) for key, ids in members.items()}
+
+        ratio = np.ones(len(day))
+        volume = self.volume.copy()
+        for key, (r, kept) in self._group_ratios(groups, depot, min_kg).items():
+            ids = groups[key][0]
+            total = self.volume[ids].sum()
+            ratio[ids] = r
+            volume[ids] = self.volume[ids] * (kept / total if total > 0 else 1)
+
+        # Seules les tournées touchées changent les totaux de référence
+        touched = np.flatnonzero(rerouted | (vehicle != self.vehicle))
+        rate = np.array([
+            self.rates.get(new, np.nan) / self.rates.get(old, np.nan) for new, old in zip(vehicle[touched], self.vehicle[touched])
+        ])
+        rate = np.where(np.isfinite(rate), rate, 1.0)
+        km = self.km[touched] * ratio[touched]
+        cost = self.cost[touched] * ratio[touched] * rate
+        totals = self._totals(
+            self.baseline["Km"] + km.sum() - self.km[touched].sum(),
+            self.baseline["Coût (€)"] + cost.sum() - self.cost[touched].sum(),
+            self.baseline["Volume (kg)"] + volume[touched].sum() - self.volume[touched].sum(),
+        )
+        totals["Tournées recalculées"] = len(touched)
+        return totals
+
+    def compare(self, scenarios, workers=None):
+        # `scenarios` : nom -> liste de changements ; une ligne par scénario, écarts à la référence.
+        # Seuls les scénarios absents du mémo sont évalués ; dans des processus s'ils sont nombreux,
+        # et les résultats et tracés qu'ils ont calculés reviennent alors dans le mémo du moteur.
+        with span("scénarios", count=len(scenarios)):
+            with self._lock:
+                missing = [(name, changes) for name, changes in scenarios.items() if scenario_key(changes) not in self._memo]
+            if len(missing) >= MIN_PARALLEL_SCENARIOS and workers != 1:
+                items = [(self, name, changes) for name, changes in missing]
+                # Une tranche par processus : le moteur n'est sérialisé qu'une fois par tranche
+                chunk_size = max(1, -(-len(items) // (workers or os.cpu_count() or 1)))
+                for key, value in run_chunks(_evaluate_chunk, items, workers, chunk_size, min_parallel=0):
+                    self._remember(key, value)
+            rows = [dict(self.baseline, **{"Scénario": BASELINE, "Tournées recalculées": 0})]
+            rows += [dict(self.evaluate(changes), **{"Scénario": name}) for name, changes in scenarios.items()]
+        df = pd.DataFrame(rows)
+        for column in ("Km", "Coût (€)", "€/kg"):
+            df[f"Δ {column}"] = df[column] - self.baseline[column]
+        return df[RESULT_COLUMNS]
+
+
+def scenario_key(changes):
+    return ("scénario",) + tuple(tuple(change) for change in changes)
+
+
+def parse_changes(rows, vehicles, days):
+    # Lignes (scénario, type, producteur, valeur) -> {scénario: [changements]} et erreurs de saisie
+    by_label = {label: kind for kind, (label, _) in CHANGE_LABELS.items()}
+    scenarios, errors = {}, []
+    for k, (name, label, producer, value) in enumerate(rows, start=1):
+        if not name or label not in by_label:
+            continue
+        kind, value = by_label[label], str(value or "").strip()
+        producer = None if producer in (None, "", ALL_PRODUCERS) else producer
+        try:
+            if kind == "véhicule":
+                if value not in vehicles:
+                    raise ValueError(f"véhicule parmi {', '.join(vehicles)}")
+                change = (kind, producer, value)
+            elif kind == "dépôt":
+                lon, lat = (float(x) for x in value.replace(";", ",").split(","))
+                change = (kind, producer, lon, lat)
+            elif kind == "fusion":
+                source, target = (x.strip() for x in value.split(">"))
+                if source not in days or target not in days:
+                    raise ValueError(f"jours parmi {', '.join(days)}")
+                change = (kind, producer, source, target)
+            else:
+                change = (kind, producer, float(value.replace(",", ".")))
+        except ValueError as e:
+            hint = CHANGE_LABELS[kind][1]
+            errors.append(f"Ligne {k} ({name}) : valeur « {value} » invalide, attendu « {hint} »" + (f" ({e})" if "parmi" in str(e) else ""))
+            continue
+        scenarios.setdefault(name, []).append(change)
+    return scenarios, errors
+
+
+def _evaluate_chunk(chunk):
+    # Exécuté dans un processus, sur une copie du moteur au mémo vide : renvoie tout ce qui a
+    # été mémorisé (scénarios et tracés recalculés) pour le moteur parent
+    engine = chunk[0][0]
+    for _, _, changes in chunk:
+        engine.evaluate(changes)
+    return list(engine._memo.items())
@@ -0,0 +1,83 @@
+# --- INDEX SPATIAL EN GRILLE ---
+# Les points sont projetés en kilomètres (équirectangulaire autour de la latitude moyenne),
+# rangés par cellule carrée puis triés par clé de cellule. Une requête de voisinage ne lit
+# que les 3 x 3 cellules autour du point, retrouvées par recherche dichotomique (O(log n)).
+
+import numpy as np
+
+KM_PER_DEGREE = 111.32
+
+
+def project_km(lon, lat, ref_lat=None):
+    lon, lat = np.asarray(lon, dtype=float), np.asarray(lat, dtype=float)
+    if ref_lat is None:
+        ref_lat = float(np.nanmean(lat)) if len(lat) else 0.0
+    return lon * KM_PER_DEGREE * np.cos(np.radians(ref_lat)), lat * KM_PER_DEGREE
+
+
+class GridIndex:
+    def __init__(self, lon, lat, cell_km):
+        self.cell_km = cell_km
+        self.ref_lat = float(np.nanmean(lat)) if len(lat) else 0.0
+        self.x, self.y = project_km(lon, lat, self.ref_lat)
+        self.cx = np.floor(self.x / cell_km).astype(np.int64)
+        self.cy = np.floor(self.y / cell_km).astype(np.int64)
+        keys = self._key(self.cx, self.cy)
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+
+    @staticmethod
+    def _key(cx, cy):
+        return (cx << 32) + (cy & 0xFFFFFFFF)
+
+    def _candidates(self, cx, cy):
+        # Paires (requête, point indexé) pour les 9 cellules voisines de chaque requête
+        queries, points = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                keys = self._key(cx + dx, cy + dy)
+                lo = np.searchsorted(self.sorted_keys, keys, side="left")
+                hi = np.searchsorted(self.sorted_keys, keys, side="right")
+                counts = hi - lo
+                q = np.repeat(np.arange(len(keys)), counts)
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                queries.append(q)
+                points.append(self.order[np.repeat(lo, counts) + offsets])
+        return np.concatenate(queries), np.concatenate(points)
+
+    def query_pairs(self, radius_km):
+        # Toutes les paires (i < j) de points indexés à moins de `radius_km`
+        if radius_km > self.cell_km:
+            raise ValueError("radius_km doit être inférieur ou égal à la taille de cellule")
+        i, j = self._candidates(self.cx, self.cy)
+        keep = i < j
+        i, j = i[keep], j[keep]
+        d = np.hypot(self.x[i] - self.x[j], self.y[i] - self.y[j])
+        keep = d <= radius_km
+        return i[keep], j[keep], d[keep]
+
+    def query_radius(self, lon, lat, radius_km):
+        # Paires (requête, point indexé) à moins de `radius_km` des points donnés
+        if radius_km > self.cell_km:
+            raise ValueError("radius_km doit être inférieur ou égal à la taille de cellule")
+        x, y = project_km(lon, lat, self.ref_lat)
+        cx = np.floor(x / self.cell_km).astype(np.int64)
+        cy = np.floor(y / self.cell_km).astype(np.int64)
+        q, p = self._candidates(cx, cy)
+        d = np.hypot(x[q] - self.x[p], y[q] - self.y[p])
+        keep = d <= radius_km
+        return q[keep], p[keep], d[keep]
+
+
+def connected_components(n, i, j):
+    # Étiquetage des composantes connexes par propagation du plus petit identifiant
+    labels = np.arange(n)
+    while True:
+        low = np.minimum(labels[i], labels[j])
+        new = labels.copy()
+        np.minimum.at(new, i, low)
+        np.minimum.at(new, j, low)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
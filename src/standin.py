@@ -0,0 +1,154 @@
+# --- API REST DE SUBSTITUTION ---
+# Serveur local qui imite le sous-ensemble de l'API PostgREST de Supabase lu par rest.py :
+# `GET /rest/v1/<table>?select=*&order=id.asc` avec les filtres `id=gt.N` ou
+# `or=(id.gt.N,created_at.gt."…")`, l'en-tête `Range`, le décompte `Prefer: count=exact`
+# et la réponse `Content-Range`. Sert un export local (JSON ou NDJSON) ou des soumissions
+# synthétiques, avec au besoin une limite de lignes par réponse, une latence et des erreurs
+# aléatoires, pour éprouver la pagination concurrente sans instance Supabase.
+#
+#   python src/standin.py tournees=export.ndjson --port 54321
+#   python src/standin.py --synthetic 100000 --max-rows 1000 --latency 0.2 --fail-rate 0.05
+#   SUPABASE_URL=http://localhost:54321 SUPABASE_KEY=local streamlit run src/app.py
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from cli import iter_file_rows
+from synthetic import iter_rows
+
+RANGE = re.compile(r"(\d+)-(\d*)")
+OR_FILTER = re.compile(r'\(id\.gt\.(-?\d+),created_at\.gt\."?([^")]*)"?\)')
+
+
+class StandIn:
+    def __init__(self, tables, max_rows=None, latency=0.0, fail_rate=0.0, seed=0):
+        # tables : nom -> lignes ; triées par id comme le demande `order=id.asc`
+        self.tables = {name: sorted(rows, key=lambda r: r["id"]) for name, rows in tables.items()}
+        self.ids = {name: [r["id"] for r in rows] for name, rows in self.tables.items()}
+        self.max_rows = max_rows
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def select(self, table, query):
+        rows, ids = self.tables[table], self.ids[table]
+        if "or" in query:
+            match = OR_FILTER.fullmatch(query["or"])
+            if not match:
+                raise ValueError(f"filtre non pris en charge : {query['or']}")
+            last_id, last_created_at = int(match.group(1)), match.group(2)
+            return [r for r in rows if r["id"] > last_id or r["created_at"] > last_created_at]
+        if "id" in query:
+            op, _, value = query["id"].partition(".")
+            if op != "gt":
+                raise ValueError(f"filtre non pris en charge : id={query['id']}")
+            return rows[bisect_right(ids, int(value)):]
+        return rows
+
+    def handle(self, path, query, headers):
+        # Renvoie (statut, en-têtes, corps)
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.fail_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return 503, {"Retry-After": "0"}, b'{"message": "indisponible"}'
+        prefix, _, table = path.rpartition("/")
+        if prefix != "/rest/v1" or table not in self.tables:
+            return 404, {}, json.dumps({"message": f"table inconnue : {table}"}).encode()
+        try:
+            rows = self.select(table, query)
+        except ValueError as e:
+            return 400, {}, json.dumps({"message": str(e)}).encode()
+
+        start, stop = 0, len(rows) - 1
+        match = RANGE.fullmatch(headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            if match.group(2):
+                stop = min(stop, int(match.group(2)))
+        if self.max_rows:
+            stop = min(stop, start + self.max_rows - 1)
+        page = rows[start:stop + 1]
+
+        total = str(len(rows)) if "count=exact" in headers.get("Prefer", "") else "*"
+        content_range = f"{start}-{start + len(page) - 1}/{total}" if page else f"*/{total}"
+        status = 206 if page and len(page) < len(rows) else 200
+        return status, {"Content-Range": content_range}, json.dumps(page, ensure_ascii=False).encode()
+
+
+def make_handler(standin):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            status, headers, body = standin.handle(url.path, query, self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(standin, host="127.0.0.1", port=0):
+    # Démarre le serveur dans un fil ; port=0 choisit un port libre (server.server_address)
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="diag-standin", daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API REST Supabase de substitution, pour les essais locaux")
+    parser.add_argument("tables", nargs="*", help="table=fichier.ndjson (ou tableau .json)")
+    parser.add_argument("--synthetic", type=int, default=0, help="arrêts synthétiques servis pour --synthetic-tables")
+    parser.add_argument("--synthetic-tables", default="tournees,tournees_catl,tournees_pnr")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--max-rows", type=int, default=None, help="lignes au plus par réponse (max-rows de PostgREST)")
+    parser.add_argument("--latency", type=float, default=0.0, help="délai ajouté à chaque réponse (secondes)")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="part des requêtes refusées en 503")
+    args = parser.parse_args(argv)
+
+    tables = {}
+    for spec in args.tables:
+        name, _, path = spec.partition("=")
+        if not path:
+            parser.error(f"{spec} : attendu table=fichier")
+        tables[name] = list(iter_file_rows(path))
+    if args.synthetic:
+        for seed, name in enumerate(t.strip() for t in args.synthetic_tables.split(",") if t.strip()):
+            tables[name] = list(iter_rows(args.synthetic, seed=seed))
+    if not tables:
+        parser.error("Indiquer au moins une table ou --synthetic")
+
+    standin = StandIn(tables, args.max_rows, args.latency, args.fail_rate)
+    server = serve(standin, args.host, args.port)
+    print(f"{', '.join(f'{n} ({len(r)})' for n, r in tables.items())} -> http://{args.host}:{server.server_address[1]}/rest/v1/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
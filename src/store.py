@@ -0,0 +1,68 @@
+# --- INSTANTANÉ COLONNAIRE SUR DISQUE ---
+# Les tables aplaties (tournées, arrêts, tracés, dépôts) sont écrites au format Arrow IPC
+# non compressé, relu par projection mémoire au démarrage : les colonnes numériques des
+# DataFrames relus pointent directement dans le fichier projeté (lecture seule, sans copie).
+# Les valeurs manquantes restent des NaN et non des nulls Arrow, qu'il faudrait recopier à la
+# lecture. Les libellés répétés (producteur, jour, véhicule, tournée, client) sont encodés
+# en dictionnaire ; seuls leurs codes (1 à 2 octets par ligne) et les dates sont convertis.
+# Un fichier `meta.json` conserve le point haut de la synchronisation pour reprendre sans
+# tout rapatrier après un redémarrage.
+
+import json
+import os
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from flatten import compact
+from instrument import span
+
+SNAPSHOT_DIR = os.environ.get(
+    "DIAG_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "snapshots"),
+)
+TABLE_NAMES = ["tours", "stops", "paths", "depots"]
+
+
+def snapshot_path(table, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, table)
+
+
+def _write_atomic(path, write):
+    tmp = path + ".tmp"
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def save_snapshot(path, tables, meta):
+    os.makedirs(path, exist_ok=True)
+    with span("instantané.écriture", path=path):
+        for name in TABLE_NAMES:
+            df = compact(tables[name])
+            table = pa.table({c: pa.array(df[c], from_pandas=False) for c in df.columns})
+            _write_atomic(
+                os.path.join(path, f"{name}.arrow"),
+                lambda tmp: feather.write_feather(table, tmp, compression="uncompressed"),
+            )
+
+    # Le méta-fichier est écrit en dernier : il valide l'instantané
+    def write_meta(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, default=str)
+    _write_atomic(os.path.join(path, "meta.json"), write_meta)
+
+
+def load_snapshot(path):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None, None
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+
+    tables = {}
+    with span("instantané.lecture", path=path):
+        for name in TABLE_NAMES:
+            table = feather.read_table(os.path.join(path, f"{name}.arrow"), memory_map=True)
+            # Un bloc par colonne : pandas ne consolide pas (ce qui recopierait tout)
+            tables[name] = compact(table.to_pandas(split_blocks=True))
+    return tables, meta
@@ -0,0 +1,172 @@
+# --- SYNCHRONISATION INCRÉMENTALE SUPABASE ---
+# Conserve un instantané local d'une table et ne rapatrie que les lignes dont l'`id`
+# ou le `created_at` dépasse le dernier point haut connu. Les résultats sont lus
+# page par page (requêtes `range`) puis fusionnés dans les tables aplaties en cache.
+# Avec un client REST (rest.RestClient), les pages sont demandées en parallèle et
+# chacune est aplatie dès son arrivée, pendant le téléchargement des suivantes.
+
+import threading
+import time
+from collections import deque
+
+from flatten import append_tables, assemble, drop_projects, flatten_row, row_digest
+from instrument import count, span
+from rest import incremental_filter
+from store import load_snapshot, save_snapshot, snapshot_path
+
+PAGE_SIZE = 1000
+REFRESH_INTERVAL = 60  # secondes entre deux interrogations de Supabase
+CHANGE_LOG = 64  # versions dont les soumissions modifiées restent connues (cf. changes_since)
+
+
+def fetch_pages(client, table, last_id=None, last_created_at=None, page_size=PAGE_SIZE):
+    start = 0
+    while True:
+        query = client.table(table).select("*")
+        if last_id is not None and last_created_at is not None:
+            query = query.or_(f'id.gt.{last_id},created_at.gt."{last_created_at}"')
+        elif last_id is not None:
+            query = query.gt("id", last_id)
+        with span("supabase.execute", table=table, start=start):
+            page = query.order("id").range(start, start + page_size - 1).execute().data or []
+        count("supabase.lignes", len(page))
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        start += page_size
+
+
+class TableSync:
+    def __init__(self, client, table, page_size=PAGE_SIZE, refresh_interval=REFRESH_INTERVAL, snapshot_dir=None, rest=None):
+        self.client = client
+        self.rest = rest
+        self.table = table
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+        self.snapshot = snapshot_path(table, snapshot_dir) if snapshot_dir else None
+
+        self.project_ids = set()
+        self.digests = {}  # id -> empreinte du contenu aplati (row_digest)
+        self.rejected = {}  # id -> motif, pour les envois dont le contenu ne respecte pas le schéma
+        self.last_id = None
+        self.last_created_at = None
+        self.tables = None
+        self.version = 0
+        self.last_sync = None
+        self.changes = deque(maxlen=CHANGE_LOG)  # (version, ID_Projet ajoutés ou remplacés ; None = tout)
+        self._lock = threading.Lock()  # une seule synchronisation à la fois
+        self._swap_lock = threading.Lock()  # lecture cohérente de (tables, version)
+
+        if self.snapshot:
+            self.load()
+
+    @property
+    def project_count(self):
+        return len(self.project_ids)
+
+    # --- INSTANTANÉ LOCAL ---
+    def load(self):
+        tables, meta = load_snapshot(self.snapshot)
+        if tables is None:
+            return False
+        with self._swap_lock:
+            self.tables = tables
+            self.version += 1
+            self.changes.append((self.version, None))
+        self.project_ids = set(meta.get("project_ids", []))
+        self.digests = dict(meta.get("digests", []))
+        self.rejected = dict(meta.get("rejected", []))
+        self.last_id = meta.get("last_id")
+        self.last_created_at = meta.get("last_created_at")
+        return True
+
+    def save(self):
+        save_snapshot(self.snapshot, self.tables, {
+            "table": self.table,
+            "project_ids": sorted(self.project_ids),
+            "digests": sorted(self.digests.items()),
+            "rejected": sorted(self.rejected.items()),
+            "last_id": self.last_id,
+            "last_created_at": self.last_created_at,
+        })
+
+    def current(self):
+        with self._swap_lock:
+            return self.tables, self.version
+
+    def changes_since(self, version, until):
+        # Soumissions ajoutées ou remplacées entre deux versions ; None si le journal ne
+        # remonte pas jusque-là (ou qu'un instantané a été relu) : tout est à reprendre
+        with self._swap_lock:
+            entries = [ids for v, ids in self.changes if version < v <= until]
+        if len(entries) != until - version or any(ids is None for ids in entries):
+            return None
+        return set().union(*entries)
+
+    def geometry(self, tables, version):
+        # Arrêts et tracés font partie des tables synchronisées (cf. ServerAggregate.geometry)
+        return tables
+
+    # --- RAFRAÎCHISSEMENT ---
+    def refresh(self, force=False):
+        with self._lock:
+            if self.client is None and self.rest is None:
+                # Mode hors-ligne : l'instantané local fait foi
+                return self.tables
+            if not force and self.last_sync is not None and time.monotonic() - self.last_sync < self.refresh_interval:
+                return self.tables
+            with span("synchronisation", table=self.table):
+                if self.rest is not None:
+                    params = incremental_filter(self.last_id, self.last_created_at)
+                    pages = self.rest.pages(self.table, params, self.page_size)
+                else:
+                    pages = fetch_pages(self.client, self.table, self.last_id, self.last_created_at, self.page_size)
+                self.merge_pages(pages)
+            self.last_sync = time.monotonic()
+            return self.tables
+
+    def merge_pages(self, pages):
+        # Chaque page est aplatie dès réception, sauf les lignes relues à l'identique (même id,
+        # même empreinte) ; l'assemblage attend la dernière. Les points hauts ne sont avancés
+        # qu'une fois toutes les pages reçues : une lecture interrompue sera reprise en entier
+        parts, digests = {}, {}
+        for rows in pages:
+            with span("aplatissement", rows=len(rows)):
+                for row in rows:
+                    row_id, digest = row.get("id"), row_digest(row)
+                    if self.digests.get(row_id) == digest:
+                        count("lignes.inchangées")
+                        continue
+                    parts[row_id] = (row.get("created_at"), flatten_row(row))
+                    digests[row_id] = digest
+        if not parts and self.tables is not None:
+            return self.tables
+
+        resent = self.project_ids.intersection(parts)
+        self.digests.update(digests)
+        for row_id, (created_at, part) in parts.items():
+            self.project_ids.add(row_id)
+            if part.error:
+                self.rejected[row_id] = part.error
+            else:
+                self.rejected.pop(row_id, None)
+            # Les pages peuvent arriver dans le désordre : les points hauts sont des maxima
+            if row_id is not None and (self.last_id is None or row_id > self.last_id):
+                self.last_id = row_id
+            if created_at is not None and (self.last_created_at is None or created_at > self.last_created_at):
+                self.last_created_at = created_at
+
+        # Une ligne re-soumise remplace ses anciennes tournées, sans re-parser le reste
+        with span("assemblage", rows=len(parts)):
+            new_tables = assemble(part for _, part in parts.values())
+            if self.tables is not None:
+                new_tables = append_tables(drop_projects(self.tables, resent), new_tables)
+        # Bascule atomique : les lecteurs voient l'ancienne ou la nouvelle version, jamais un mélange
+        with self._swap_lock:
+            self.tables = new_tables
+            self.version += 1
+            self.changes.append((self.version, frozenset(parts)))
+        if self.snapshot:
+            self.save()
+        return self.tables
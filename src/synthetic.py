@@ -0,0 +1,136 @@
+# --- GÉNÉRATEUR DE DONNÉES SYNTHÉTIQUES ---
+# Produit des soumissions au format de la table Supabase `tournees` (id, nom_producteur,
+# created_at, data_json) à l'échelle voulue, de 100 à plusieurs millions d'arrêts : producteurs
+# avec dépôt et véhicule, clients propres et clients partagés entre producteurs (mutualisation),
+# tournées hebdomadaires. Une petite part d'envois « sales » (coordonnées vides, mesures en
+# texte, contenu illisible) exerce les mêmes chemins que les vraies données.
+#
+#   python src/synthetic.py --stops 100000 --out donnees.ndjson
+#   python src/cli.py donnees.ndjson -o resultats/          -> pipeline complet sur ces données
+
+import argparse
+import datetime
+import json
+import random
+
+from territories import WEEK_DAYS
+
+# Emprises (lon min, lat min, lon max, lat max) des territoires suivis
+AREAS = {
+    "pnr": (6.60, 43.70, 7.20, 44.00),
+    "catl": (5.30, 50.45, 5.85, 50.75),
+}
+VEHICLES = ["VUL", "Camion", "Voiture", "Vélo cargo"]
+STOPS_PER_TOUR = (4, 20)
+TOURS_PER_PROJECT = (1, 8)
+CLIENTS_PER_PRODUCER = 40
+SHARED_CLIENTS = 0.25  # part des arrêts chez un client commun à plusieurs producteurs
+DIRTY_RATE = 0.01
+START_DATE = datetime.datetime(2026, 1, 5, 8, tzinfo=datetime.timezone.utc)
+
+
+def producer_count(n_stops):
+    # ~500 arrêts hebdomadaires par producteur, au moins 3 pour garder des filtres utiles
+    return max(3, min(5_000, n_stops // 500))
+
+
+class Producer:
+    def __init__(self, rng, index, area):
+        lon_min, lat_min, lon_max, lat_max = area
+        self.name = f"Producteur {index + 1:04d}"
+        self.lon = rng.uniform(lon_min, lon_max)
+        self.lat = rng.uniform(lat_min, lat_max)
+        self.vehicle = rng.choice(VEHICLES)
+        self.clients = [
+            (f"{self.name} - Client {k + 1}", self.lon + rng.gauss(0, 0.06), self.lat + rng.gauss(0, 0.04))
+            for k in range(CLIENTS_PER_PRODUCER)
+        ]
+
+
+def shared_clients(rng, area, n):
+    lon_min, lat_min, lon_max, lat_max = area
+    return [(f"Magasin {k + 1}", rng.uniform(lon_min, lon_max), rng.uniform(lat_min, lat_max)) for k in range(n)]
+
+
+def make_stop(rng, producer, shared, dirty):
+    name, lon, lat = rng.choice(shared) if rng.random() < SHARED_CLIENTS else rng.choice(producer.clients)
+    stop = {"client": name, "lon": round(lon, 6), "lat": round(lat, 6), "vol": round(rng.uniform(2, 80), 1)}
+    if dirty and rng.random() < DIRTY_RATE:
+        # Saisie incomplète ou mesure transmise en texte
+        stop.update(rng.choice([{"lon": ""}, {"lat": None}, {"vol": str(stop["vol"])}]))
+    return stop
+
+
+def make_tour(rng, producer, shared, n_stops, number, dirty):
+    stops = [make_stop(rng, producer, shared, dirty) for _ in range(n_stops)]
+    dist = n_stops * rng.uniform(3, 9)
+    cost = dist * rng.uniform(0.4, 1.2) + n_stops * 2
+    ca = sum(float(s["vol"] or 0) for s in stops) * rng.uniform(4, 12)
+    return {
+        "day": rng.choice(WEEK_DAYS[:6]),
+        "name": f"Tournée {number}",
+        "stats": {
+            "ca": round(ca, 2), "cost": round(cost, 2), "ratio": round(cost / ca * 100, 2) if ca else 0,
+            "dist": round(dist, 1), "time": round(dist * 1.5 + n_stops * 8),
+        },
+        "stops": stops,
+    }
+
+
+def iter_rows(n_stops, seed=0, area="pnr", dirty=True):
+    # Générateur : à 1 M d'arrêts, seule la soumission en cours est en mémoire
+    rng = random.Random(seed)
+    bounds = AREAS[area]
+    producers = [Producer(rng, i, bounds) for i in range(producer_count(n_stops))]
+    shared = shared_clients(rng, bounds, max(10, len(producers) * 4))
+    remaining, row_id = n_stops, 0
+    while remaining > 0:
+        row_id += 1
+        producer = rng.choice(producers)
+        tours = []
+        for number in range(1, rng.randint(*TOURS_PER_PROJECT) + 1):
+            n = min(remaining, rng.randint(*STOPS_PER_TOUR))
+            tours.append(make_tour(rng, producer, shared, n, number, dirty))
+            remaining -= n
+            if remaining == 0:
+                break
+        content = {"depot": {"pData": {"lon": round(producer.lon, 6), "lat": round(producer.lat, 6)}, "veh": {"type": producer.vehicle}},
+                   "tours": tours}
+        data_json = json.dumps(content, ensure_ascii=False)
+        if dirty and rng.random() < DIRTY_RATE / 5:
+            data_json = data_json[: len(data_json) // 2]  # envoi tronqué
+        created_at = START_DATE + datetime.timedelta(minutes=row_id * 7)
+        yield {"id": row_id, "nom_producteur": producer.name, "created_at": created_at.isoformat(), "data_json": data_json}
+
+
+def write_rows(rows, path):
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".ndjson") or path.endswith(".jsonl"):
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                count += 1
+        else:
+            f.write("[")
+            for row in rows:
+                f.write((",\n" if count else "\n") + json.dumps(row, ensure_ascii=False))
+                count += 1
+            f.write("\n]\n")
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génère des soumissions de tournées synthétiques")
+    parser.add_argument("--stops", type=int, default=10_000, help="nombre total d'arrêts")
+    parser.add_argument("--out", default="donnees_synthetiques.ndjson", help="fichier .ndjson/.jsonl ou tableau .json")
+    parser.add_argument("--area", choices=sorted(AREAS), default="pnr")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--clean", action="store_true", help="aucun envoi incomplet ou illisible")
+    args = parser.parse_args(argv)
+
+    count = write_rows(iter_rows(args.stops, args.seed, args.area, dirty=not args.clean), args.out)
+    print(f"{count} soumissions, {args.stops} arrêts -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
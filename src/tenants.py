@@ -0,0 +1,166 @@
+# --- CACHES PAR TERRITOIRE ---
+# Chaque table (locataire) a sa source de données et une vue publiée : les tables d'une version
+# et leurs résultats dérivés (cube, carte, optimisation...), recalculés avant chaque bascule
+# vers une nouvelle version (cf. warmer.py). La mémoire totale, caches internes des résultats
+# compris (figures, tracés par zoom, mémo des scénarios), est bornée : au-delà, le locataire
+# utilisé le moins récemment est libéré en entier (il se recharge depuis son instantané local
+# à la visite suivante). Un territoire jamais consulté n'est jamais chargé.
+
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from instrument import span
+
+CACHE_MAX_BYTES = int(os.environ.get("DIAG_CACHE_MB", 1024)) * 1024 * 1024
+
+
+def nbytes(value):
+    # Estimation de l'empreinte mémoire (tables pandas / numpy et conteneurs qui les portent).
+    # Un résultat qui garde ses propres caches fournit sa mesure par une méthode nbytes()
+    if callable(getattr(value, "nbytes", None)):
+        return value.nbytes()
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class View:
+    # Version publiée d'une source : tables aplaties et résultats dérivés calculés dessus.
+    # Une vue ne change plus une fois publiée (seuls des résultats manquants s'y ajoutent).
+    def __init__(self, source, tables, version):
+        self.source = source
+        self.tables = tables
+        self.version = version
+        self.derived = {}  # type -> valeur
+        self.sizes = {"source": nbytes(tables)}  # type -> octets
+
+    @property
+    def size(self):
+        # Les résultats à caches internes (figures, tracés par zoom, mémo des scénarios)
+        # grossissent après leur calcul : ils sont re-mesurés à chaque lecture
+        for kind, value in list(self.derived.items()):
+            if growing(value):
+                self.sizes[kind] = value.nbytes()
+        return sum(self.sizes.values())
+
+
+def growing(value):
+    return callable(getattr(value, "nbytes", None))
+
+
+class Tenant:
+    def __init__(self, source):
+        self.source = source
+        self.view = None
+        self.last_used = None  # horodatage (monotonic) de la dernière consultation par une session
+        self.lock = threading.Lock()  # une seule publication à la fois
+
+    @property
+    def size(self):
+        return self.view.size if self.view is not None else 0
+
+
+class TenantCache:
+    def __init__(self, factory, compute, max_bytes=CACHE_MAX_BYTES):
+        self.factory = factory  # table -> source (TableSync / ServerAggregate)
+        self.compute = compute  # type -> fonction(vue) calculant le résultat dérivé
+        self.max_bytes = max_bytes
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _tenant(self, table, touch=True):
+        # touch=False (préchauffage) : la consultation ne compte ni pour l'ordre d'éviction ni
+        # pour l'activité ; un locataire ainsi créé est le premier libérable
+        with self._lock:
+            tenant = self._tenants.get(table)
+            if tenant is None:
+                tenant = self._tenants[table] = Tenant(self.factory(table))
+                if not touch:
+                    self._tenants.move_to_end(table, last=False)
+            if touch:
+                self._tenants.move_to_end(table)
+                tenant.last_used = time.monotonic()
+            return tenant
+
+    def loaded(self):
+        with self._lock:
+            return list(self._tenants)
+
+    def active(self, max_idle):
+        # Tables consultées par une session depuis moins de `max_idle` secondes
+        now = time.monotonic()
+        with self._lock:
+            return [table for table, t in self._tenants.items() if t.last_used is not None and now - t.last_used < max_idle]
+
+    def source(self, table, touch=True):
+        return self._tenant(table, touch).source
+
+    def view(self, table):
+        return self._tenant(table).view
+
+    def publish(self, table, touch=True):
+        # Construit la vue de la version courante de la source, recalcule les résultats déjà
+        # demandés sur la vue précédente, puis bascule d'une seule affectation : une session
+        # en cours garde la vue qu'elle a lue, la suivante lit la nouvelle, déjà chaude.
+        tenant = self._tenant(table, touch)
+        with tenant.lock:
+            tables, version = tenant.source.current()
+            old = tenant.view
+            if tables is None or (old is not None and old.version == version):
+                return old
+            view = View(tenant.source, tables, version)
+            for kind in (old.derived if old is not None else ()):
+                with span(f"calcul.{kind}", table=table, version=version):
+                    view.derived[kind] = self.compute[kind](view)
+                view.sizes[kind] = nbytes(view.derived[kind])
+            with self._lock:
+                tenant.view = view
+                self._evict(table)
+            return view
+
+    def derived(self, view, kind):
+        # Résultat lu sur la vue de la session, même si une version plus récente a été publiée
+        # entre-temps : filtres, tables et résultats restent cohérents pendant toute l'exécution
+        if kind not in view.derived:
+            with span(f"calcul.{kind}", table=view.source.table, version=view.version):
+                value = self.compute[kind](view)
+            with self._lock:
+                view.derived[kind] = value
+                view.sizes[kind] = nbytes(value)
+                self._evict(view.source.table)
+        elif growing(view.derived[kind]):
+            # Ce qu'il a mis en cache depuis la dernière lecture compte dans le budget
+            with self._lock:
+                self._evict(view.source.table)
+        return view.derived[kind]
+
+    def _evict(self, keep):
+        while sum(t.size for t in self._tenants.values()) > self.max_bytes:
+            victim = next((table for table in self._tenants if table != keep), None)
+            if victim is None:
+                return
+            del self._tenants[victim]
+
+    def stats(self):
+        with self._lock:
+            return pd.DataFrame(
+                [
+                    (table, t.view.version if t.view else None, t.size / 1e6, ", ".join(sorted(t.view.derived)) if t.view else "")
+                    for table, t in self._tenants.items()
+                ],
+                columns=["Table", "Version", "Mémoire (Mo)", "Résultats en cache"],
+            )
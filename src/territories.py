@@ -0,0 +1,100 @@
+# --- CONFIGURATION DES TERRITOIRES ---
+# Un territoire = une table Supabase + une présentation (libellés, indicateurs affichés,
+# sections de la page, fond de carte). Deux territoires lisant la même table partagent
+# les mêmes données en mémoire (cf. tenants.py).
+
+POSITRON = "https://basemaps.cartocdn.com/gl/positron-gl-style/style.json"
+PNR_LOGO = "https://www.parcs-naturels-regionaux.fr/sites/federationpnr/files/styles/contenu/public/image/parc/sans_titre.png?itok=z_7I7Msh"
+WEEK_DAYS = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
+
+# Indicateurs : (clé de kpi.derive ou "projects", libellé, format)
+MAP_KPIS = [
+    ("total_km", "Flux Cumulés", "{:,.0f} km"),
+    ("total_stops", "Arrêts Desservis", "{}"),
+    ("density", "Densité (Km/Arrêt)", "{:.1f} km"),
+    ("unit_cost", "Coût Unitaire", "{:.2f} €/kg"),
+]
+MAP_SECTIONS = ["kpis", "map", "table", "costs", "trends", "routing", "mutualisation", "scenarios", "export"]
+
+TERRITORIES = {
+    "dix": {
+        "table": "tournees",
+        "page_title": "Diagnostic Territorial - Logistique",
+        "title": "🗺️ Diagnostic Logistique Territorial",
+        "sidebar_title": "🎛️ Filtres Avancés",
+        "kpi_title": "### 📊 Performance de la sélection",
+        "kpis": MAP_KPIS,
+        "sections": MAP_SECTIONS,
+        "map_style": POSITRON,
+        "no_data": "Aucune donnée disponible.",
+        "no_match": "Aucune donnée ne correspond à vos filtres actuels.",
+    },
+    "catl": {
+        "table": "tournees_catl",
+        "page_title": "Diagnostic Logistique - CATL",
+        "title": "🗺️ Diagnostic Logistique - CATL",
+        "subtitle": "**Visualisation des flux de la Ceinture Aliment-Terre de Liège**",
+        "sidebar_title": "🎛️ Filtres CATL",
+        "kpi_title": "### 📊 Performance Territoriale",
+        "kpis": MAP_KPIS,
+        "sections": MAP_SECTIONS,
+        "map_style": POSITRON,
+        "no_data": "Aucune donnée disponible pour le moment.",
+        "no_match": "Aucune donnée pour le CATL.",
+    },
+    "pnr": {
+        "table": "tournees",
+        "page_title": "PNR Préalpes - Dashboard Logistique",
+        "page_icon": "📊",
+        "title": "📊 Diagnostic Logistique Territorial",
+        "subtitle": "#### Parc Naturel Régional des Préalpes d'Azur",
+        "logo": PNR_LOGO,
+        "sidebar_title": "Filtres d'analyse",
+        "filters": ["Producteur", "Jour"],
+        "kpis": [
+            ("projects", "Projets Reçus", "{}"),
+            ("total_ca", "CA Cumulé", "{:,.0f} €"),
+            # Coût cumulé / CA cumulé, et non la moyenne des ratios : une petite tournée ne pèse pas autant qu'une grande
+            ("cost_ratio", "Ratio Moyen", "{:.1f} %"),
+            ("total_km", "Distance Totale", "{:,.0f} km"),
+        ],
+        # Ratio moyen au-delà duquel l'indicateur est signalé
+        "ratio_alert": 20,
+        "sections": ["kpis", "charts", "trends", "registry", "export"],
+        "export_prefix": "diagnostic_pnr",
+        "no_data": "👋 Bienvenue ! Aucune donnée n'a été transmise par les producteurs pour le moment.",
+        "no_match": "Aucune donnée ne correspond à vos filtres actuels.",
+        "css": """
+    <style>
+    .main { background-color: #f8f9fa; }
+    .stMetric { background-color: white; padding: 15px; border-radius: 10px; box-shadow: 0 2px 4px rgba(0,0,0,0.05); }
+    .stDataFrame { background-color: white; border-radius: 10px; }
+    h1, h2, h3 { color: #2c3e50; }
+    </style>
+    """,
+        "footer": "© 2026 DIX Autrement - Dashboard d'Analyse Territoriale",
+    },
+}
+
+DEFAULT_TERRITORY = "dix"
+DEFAULTS = {
+    "subtitle": None,
+    "kpi_title": None,
+    "page_icon": None,
+    "logo": None,
+    "css": None,
+    "footer": None,
+    "filters": ["Producteur", "Jour", "Véhicule"],
+    "ratio_alert": None,
+    "export_prefix": None,
+    "map_style": POSITRON,
+    # Nuage ratio / CA : WebGL au-delà de N tournées, grille de densité au-delà de M
+    "scatter_webgl_rows": 5_000,
+    "scatter_density_rows": 50_000,
+}
+
+
+def territory(key):
+    if key not in TERRITORIES:
+        raise KeyError(f"Territoire inconnu : {key} (disponibles : {', '.join(TERRITORIES)})")
+    return {**DEFAULTS, **TERRITORIES[key], "key": key}
@@ -0,0 +1,162 @@
+# --- ÉVOLUTION DANS LE TEMPS ---
+# Chaque soumission d'un producteur (ID_Projet, datée par `created_at`) est une version de
+# ses tournées. On en garde une ligne par soumission et par jour de livraison (mesures
+# additives du cube d'indicateurs), puis des agrégats par semaine et par mois
+# (période × producteur × jour × véhicule). À chaque nouvelle version des données, seules
+# les soumissions ajoutées ou re-soumises depuis la précédente (TableSync.changes_since)
+# sont retirées puis ajoutées aux agrégats : une année d'historique se lit dans quelques
+# centaines de cellules, sans reparcourir les tournées ni le JSON d'origine.
+
+import threading
+import weakref
+
+import pandas as pd
+
+from instrument import span
+from kpi import CUBE_KEYS, MEASURES
+
+PERIODS = {"Semaine": "W", "Mois": "M"}  # pas de temps -> fréquence pandas
+TREND_KEYS = ["Période"] + CUBE_KEYS
+VERSION_KEYS = ["ID_Projet", "Jour"]
+# Indicateur -> (numérateur, dénominateur ou None, facteur), calculé sur les sommes
+TREND_METRICS = {
+    "Ratio logistique (%)": ("Coût", "CA", 100),
+    "Km par arrêt": ("Distance", "Nb Arrêts", 1),
+    "Coût par kg (€)": ("Coût", "Volume (kg)", 1),
+    "Km par tournée": ("Distance", "Nb Tournées", 1),
+    "Distance (km)": ("Distance", None, 1),
+    "CA (€)": ("CA", None, 1),
+}
+MAX_LINES = 12  # au-delà, une seule courbe pour l'ensemble de la sélection
+ALL_PRODUCERS = "Ensemble"
+
+_stores = weakref.WeakKeyDictionary()  # source -> TrendStore, libéré avec le locataire
+_stores_lock = threading.Lock()
+
+
+def submissions(tours):
+    # Une ligne par (soumission, jour) : date, période et mesures additives
+    with span("tendances.versions", tours=len(tours)):
+        versions = tours.groupby(VERSION_KEYS, observed=True, sort=False).agg(
+            Producteur=("Producteur", "first"), Véhicule=("Véhicule", "first"), Date=("Date", "first"), **MEASURES,
+        ).reset_index()
+        for column in CUBE_KEYS:
+            versions[column] = versions[column].astype(str)
+        date = pd.to_datetime(versions["Date"], utc=True).dt.tz_convert(None)
+        for period, freq in PERIODS.items():
+            versions[period] = date.dt.to_period(freq).dt.start_time
+        return versions
+
+
+def bucket(versions, period):
+    # Soumissions sans date valide : hors des agrégats (clé de période manquante)
+    return versions.groupby([period] + CUBE_KEYS, sort=False)[list(MEASURES)].sum().rename_axis(TREND_KEYS)
+
+
+def build_trends(tours):
+    versions = submissions(tours)
+    return {"versions": versions, **{period: bucket(versions, period) for period in PERIODS}}
+
+
+class TrendStore:
+    # Agrégats tenus à jour d'une version des données à la suivante, pour une source
+    def __init__(self):
+        self.version = None
+        self.trends = None
+        self._lock = threading.Lock()
+
+    def update(self, source, tours, version):
+        with self._lock:
+            if version == self.version:
+                return self.trends
+            changed = None
+            if self.version is not None and version > self.version and hasattr(source, "changes_since"):
+                changed = source.changes_since(self.version, version)
+            if changed is None:
+                if self.version is not None and version < self.version:
+                    # Vue plus ancienne que les agrégats tenus : calcul à part, sans les remplacer
+                    return build_trends(tours)
+                with span("tendances.reconstruction", version=version):
+                    self.trends = build_trends(tours)
+            elif changed:
+                with span("tendances.mise_a_jour", version=version, projets=len(changed)):
+                    self.trends = self._apply(tours, list(changed))
+            self.version = version
+            return self.trends
+
+    def _apply(self, tours, ids):
+        # Mesures additives : on retire l'ancienne contribution des soumissions modifiées,
+        # puis on ajoute la nouvelle, période par période
+        versions = self.trends["versions"]
+        replaced = versions["ID_Projet"].isin(ids)
+        old = versions[replaced]
+        new = submissions(tours[tours["ID_Projet"].isin(ids)])
+        trends = {"versions": pd.concat([versions[~replaced], new], ignore_index=True)}
+        for period in PERIODS:
+            current = self.trends[period]
+            delta = bucket(new, period).sub(bucket(old, period), fill_value=0)
+            total = current.add(delta, fill_value=0)
+            trends[period] = total[total["Nb Tournées"] > 0].astype(current.dtypes.to_dict())
+        return trends
+
+
+def trend_store(source):
+    with _stores_lock:
+        store = _stores.get(source)
+        if store is None:
+            store = _stores[source] = TrendStore()
+        return store
+
+
+def trends_for(view):
+    return trend_store(view.source).update(view.source, view.tables["tours"], view.version)
+
+
+# --- REQUÊTES ---
+def metric_values(df, metric):
+    numerator, denominator, factor = TREND_METRICS[metric]
+    values = df[numerator] * factor
+    if denominator is not None:
+        values = values / df[denominator].where(df[denominator] > 0)
+    return values
+
+
+def trend_series(trends, period, sel, metric, max_lines=MAX_LINES):
+    # Lu dans les agrégats de la période : une courbe par producteur sélectionné, ou une
+    # seule pour l'ensemble s'ils sont trop nombreux
+    cells = trends[period]
+    mask = cells.index.get_level_values("Producteur").isin([str(p) for p in sel["prods"]])
+    mask &= cells.index.get_level_values("Jour").isin([str(d) for d in sel["days"]])
+    mask &= cells.index.get_level_values("Véhicule").isin([str(v) for v in sel["vehs"]])
+    cells = cells[mask]
+    if cells.index.get_level_values("Producteur").nunique() <= max_lines:
+        series = cells.groupby(level=["Période", "Producteur"]).sum().reset_index()
+    else:
+        series = cells.groupby(level="Période").sum().reset_index().assign(Producteur=ALL_PRODUCERS)
+    series[metric] = metric_values(series, metric)
+    return series.sort_values(["Producteur", "Période"])[["Période", "Producteur", metric]]
+
+
+def producer_history(trends, producer):
+    # Soumissions successives d'un producteur, de la plus ancienne à la plus récente
+    versions = trends["versions"]
+    history = (
+        versions[versions["Producteur"] == str(producer)]
+        .groupby("ID_Projet", sort=False)
+        .agg(Date=("Date", "first"), Véhicule=("Véhicule", "first"), **{m: (m, "sum") for m in MEASURES})
+        .sort_values("Date")
+        .reset_index()
+    )
+    history.insert(0, "Version", range(1, len(history) + 1))
+    ratio = metric_values(history, "Ratio logistique (%)")
+    return pd.DataFrame({
+        "Version": history["Version"],
+        "ID_Projet": history["ID_Projet"],
+        "Date": history["Date"],
+        "Véhicule": history["Véhicule"],
+        "Tournées": history["Nb Tournées"],
+        "Distance": history["Distance"],
+        "Km par arrêt": metric_values(history, "Km par arrêt"),
+        "Ratio logistique (%)": ratio,
+        "Évolution du ratio (pts)": ratio.diff(),
+    })
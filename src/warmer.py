@@ -0,0 +1,85 @@
+# --- PRÉCHAUFFAGE EN TÂCHE DE FOND ---
+# Un fil d'exécution par serveur rafraîchit les tables consultées avant l'échéance de
+# REFRESH_INTERVAL, recalcule leurs résultats dérivés et publie la nouvelle vue
+# (TenantCache.publish). Les sessions ne lisent que des vues publiées : aucune requête
+# utilisateur n'attend Supabase, sauf la toute première d'une table sans instantané local.
+# Seules les tables consultées récemment (ou épinglées) sont tenues chaudes, et le passage
+# du préchauffage ne compte pas comme une consultation (ordre d'éviction inchangé).
+#
+#   DIAG_WARM_INTERVAL=45                     -> période de rafraîchissement (secondes)
+#   DIAG_WARM_IDLE=900                        -> table plus rafraîchie sans consultation depuis (secondes)
+#   DIAG_PREWARM=tournees,tournees_catl       -> tables chargées dès le démarrage du serveur
+#   DIAG_WARM_WORKERS=4                       -> tables rafraîchies en même temps
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from instrument import span
+
+WARM_INTERVAL = int(os.environ.get("DIAG_WARM_INTERVAL", 45))
+WARM_IDLE = int(os.environ.get("DIAG_WARM_IDLE", 900))
+WARM_WORKERS = int(os.environ.get("DIAG_WARM_WORKERS", 4))
+PREWARM_TABLES = [t.strip() for t in os.environ.get("DIAG_PREWARM", "").split(",") if t.strip()]
+
+
+class Warmer:
+    def __init__(self, tenants, interval=WARM_INTERVAL, pinned=PREWARM_TABLES, workers=WARM_WORKERS, idle=WARM_IDLE):
+        self.tenants = tenants
+        self.interval = interval
+        self.idle = idle
+        self.workers = workers
+        self.pinned = set(pinned)  # tables tenues chaudes même si le cache les a libérées
+        self.last_warm = {}  # table -> (horodatage, durée en secondes)
+        self.errors = {}  # table -> dernière erreur
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="diag-warmer", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def warm(self, table):
+        started = time.monotonic()
+        try:
+            with span("préchauffage", table=table):
+                self.tenants.source(table, touch=False).refresh(force=True)
+                self.tenants.publish(table, touch=False)
+        except Exception as e:
+            # La vue précédente reste servie ; nouvelle tentative au prochain passage
+            self.errors[table] = str(e)
+            return False
+        self.errors.pop(table, None)
+        self.last_warm[table] = (time.time(), time.monotonic() - started)
+        return True
+
+    def _run(self):
+        # Les tables sont rafraîchies ensemble : leurs requêtes partagent le pool du client REST
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="diag-warm") as pool:
+            while True:
+                # Une table libérée par le cache ou délaissée par les sessions n'est plus
+                # rafraîchie, sauf si elle est épinglée
+                tables = sorted(self.pinned.union(self.tenants.active(self.idle)))
+                list(pool.map(self.warm, tables))
+                if self._stop.wait(self.interval):
+                    return
+
+    def stats(self):
+        now = time.time()
+        return pd.DataFrame(
+            [
+                (table, round(now - at), round(duration, 2), self.errors.get(table, ""))
+                for table, (at, duration) in sorted(self.last_warm.items())
+            ] + [(table, None, None, error) for table, error in sorted(self.errors.items()) if table not in self.last_warm],
+            columns=["Table", "Rafraîchie il y a (s)", "Durée (s)", "Erreur"],
+        )
@@ -0,0 +1,5 @@
+# Les modules de l'application sont à plat dans src/ (lancés par `streamlit run src/app.py`)
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,42 @@
+import json
+
+import bench
+from bench import main, regressions, run_scale
+from flatten import assemble, flatten_row
+from synthetic import iter_rows
+
+
+def test_synthetic_rows():
+    rows = list(iter_rows(20000, seed=2))
+    assert rows == list(iter_rows(20000, seed=2))
+    assert [r["id"] for r in rows] == list(range(1, len(rows) + 1))
+    assert any(p.error for p in map(flatten_row, rows))  # envois tronqués
+    assert not any(p.error for p in map(flatten_row, iter_rows(3000, seed=2, dirty=False)))
+    assert len(assemble(map(flatten_row, iter_rows(3000, seed=2, dirty=False)))["stops"]) == 3000
+
+
+def test_regressions_ignore_noise():
+    reference = {"stages": {"cube": {"ms": 100.0, "peak_mb": 10.0}, "carte": {"ms": 10.0, "peak_mb": 1.0}}}
+    current = {"stages": {
+        "cube": {"ms": 200.0, "peak_mb": 13.0},
+        "carte": {"ms": 30.0, "peak_mb": 1.9},  # +200 % mais sous les seuils absolus
+        "nouvelle": {"ms": 1e6, "peak_mb": 1e3},  # sans référence
+    }}
+    assert regressions(current, reference) == [("cube", "temps", 100.0, 200.0), ("cube", "mémoire", 10.0, 13.0)]
+
+
+def test_save_then_compare(tmp_path, capsys, monkeypatch):
+    monkeypatch.setattr(bench, "STAGES", bench.STAGES[:4])
+    path = str(tmp_path / "baselines.json")
+    assert main(["--scales", "100", "--repeat", "1", "--save", "--baselines", path]) == 0
+    with open(path, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert set(saved["scales"]["100"]["stages"]) == set(run_scale(100, 1)["stages"])
+
+    # Références hors d'atteinte (au-delà des seuils de bruit) : régression signalée
+    for stage in saved["scales"]["100"]["stages"].values():
+        stage.update(ms=-1000.0, peak_mb=-100.0)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(saved, f)
+    assert main(["--scales", "100", "--repeat", "1", "--baselines", path]) == 1
+    assert "Régressions" in capsys.readouterr().out
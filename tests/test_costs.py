@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from costs import VEHICLE_MODEL, cost_summary, load_cost_model, model_costs
+
+
+@pytest.fixture
+def tours():
+    return pd.DataFrame({
+        "Véhicule": pd.Categorical(["VUL", "Vélo cargo", "Triporteur", "VUL"]),
+        "Distance": [100.0, 10.0, 20.0, 0.0],
+        "Temps": [120.0, 60.0, 30.0, 0.0],
+        "Nb Arrêts": [10, 4, 2, 0],
+        "Volume (kg)": [500.0, 200.0, 100.0, 0.0],
+        "CA": [1000.0, 100.0, 0.0, 0.0],
+        "Coût": [120.0, 30.0, 20.0, 0.0],
+    }, index=[3, 5, 7, 9])
+
+
+def test_model_costs(tours):
+    costs = model_costs(tours, load_cost_model(None))
+    assert costs.index.equals(tours.index)
+    vul, bike = VEHICLE_MODEL["VUL"], VEHICLE_MODEL["Vélo cargo"]
+    expected = [
+        100 * vul["km"] + 2 * vul["heure"] + 10 * vul["arrêt"],
+        10 * bike["km"] + 1 * bike["heure"] + 4 * bike["arrêt"],
+        20 * vul["km"] + 0.5 * vul["heure"] + 2 * vul["arrêt"],  # véhicule inconnu : tarif VUL
+        0.0,
+    ]
+    np.testing.assert_allclose(costs["Coût Modèle"], expected)
+    np.testing.assert_allclose(costs["Ratio Modèle"], [expected[0] / 10, expected[1], np.nan, np.nan])
+    assert costs["Surcharge"].tolist() == [False, True, False, False]
+    assert costs["Tarif par défaut"].tolist() == [False, False, True, False]
+
+
+def test_cost_model_file(tmp_path, tours):
+    path = tmp_path / "tarifs.json"
+    path.write_text(json.dumps({"Triporteur": {"capacité": 50}, "VUL": {"km": 1.0}}), encoding="utf-8")
+    model = load_cost_model(str(path))
+    assert model["VUL"] == {**VEHICLE_MODEL["VUL"], "km": 1.0}
+    assert model["Triporteur"] == {**model["VUL"], "capacité": 50}  # hérite du VUL local
+
+    costs = model_costs(tours, model)
+    assert costs["Surcharge"].tolist() == [False, True, True, False]
+    assert not costs["Tarif par défaut"].any()
+
+    path.write_text(json.dumps({"VUL": {"péage": 3}}), encoding="utf-8")
+    with pytest.raises(ValueError, match="péage"):
+        load_cost_model(str(path))
+
+
+def test_cost_summary(tours):
+    summary = cost_summary(tours, model_costs(tours, load_cost_model(None))).set_index("Véhicule")
+    vul = VEHICLE_MODEL["VUL"]
+    assert summary.loc["VUL", ["Tournées", "Coût Déclaré", "Surcharges"]].tolist() == [2, 120.0, 0]
+    modelled = 100 * vul["km"] + 2 * vul["heure"] + 10 * vul["arrêt"]
+    assert summary.loc["VUL", "Écart (%)"] == pytest.approx((modelled / 120 - 1) * 100)
+    assert summary.loc["Vélo cargo", "Surcharges"] == 1
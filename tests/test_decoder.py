@@ -0,0 +1,72 @@
+import json
+import math
+
+import pytest
+
+from decoder import SchemaError, decode
+from flatten import assemble, flatten_row
+from synthetic import iter_rows
+
+
+def reference(content):
+    # Conversion des dashboards d'origine : dict.get avec valeur par défaut, puis float(...)
+    tours = []
+    for t in content.get("tours", []):
+        stats = t.get("stats", {})
+        stops = [
+            (s.get("client"),
+             float(s["lon"]) if s.get("lon") else math.nan,
+             float(s["lat"]) if s.get("lat") else math.nan,
+             float(s.get("vol", 0)))
+            for s in t.get("stops", [])
+        ]
+        measures = tuple(float(stats.get(k, 0)) for k in ("ca", "cost", "ratio", "dist", "time"))
+        tours.append((t.get("day", "Indéfini"), t.get("name", "Sans nom"), measures, stops))
+    depot = content.get("depot", {})
+    coords = depot.get("pData", {})
+    lon, lat = (float(coords[k]) if coords.get(k) else math.nan for k in ("lon", "lat"))
+    return ((lon, lat), (depot.get("veh", {}).get("type", "Non précisé"),)), tours
+
+
+def same(a, b):
+    if isinstance(a, float) and isinstance(b, float):
+        return a == b or (math.isnan(a) and math.isnan(b))
+    if isinstance(a, (tuple, list)) and isinstance(b, (tuple, list)):
+        return len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+
+EDGE_CASES = [
+    # Types que float(...) acceptait : entiers, chaînes numériques et booléens
+    json.dumps({"depot": {"pData": {"lon": 5, "lat": "44.5"}, "veh": {"type": "VUL"}},
+                "tours": [{"day": "Lundi", "name": "T1", "stats": {"ca": True, "cost": "12.5", "ratio": False, "dist": 3, "time": 0},
+                           "stops": [{"client": "A", "lon": 5.2, "lat": 0, "vol": True}, {"client": "B", "lon": "5.3", "lat": 44.1}]}]}),
+    json.dumps({"depot": {}, "tours": [{"stats": {}, "stops": []}]}),
+]
+
+
+def test_decode_matches_reference():
+    for data_json in [r["data_json"] for r in iter_rows(3000, seed=9, dirty=False)] + EDGE_CASES:
+        assert same(decode(data_json), reference(json.loads(data_json))), data_json[:80]
+
+
+def test_flatten_row_columns():
+    content = {"depot": {"pData": {"lon": 5.0, "lat": 44.0}, "veh": {"type": "VUL"}},
+               "tours": [{"day": "Mardi", "name": "T2", "stats": {"ca": True, "cost": 1, "ratio": "50", "dist": 2.5, "time": 10},
+                          "stops": [{"client": "C", "lon": 5.1, "lat": 44.1, "vol": 2}]}]}
+    part = flatten_row({"id": 1, "nom_producteur": "P", "created_at": "2025-01-01T00:00:00+00:00", "data_json": json.dumps(content)})
+    assert part.error is None
+    tables = assemble([part])
+    (_, _, stats, _), = reference(content)[1]
+    assert tables["tours"][["CA", "Coût", "Ratio", "Distance", "Temps"]].iloc[0].tolist() == list(stats) == [1.0, 1.0, 50.0, 2.5, 10.0]
+    assert tables["stops"]["Volume (kg)"].tolist() == [2.0]
+
+
+@pytest.mark.parametrize("content, path", [
+    ({"tours": [{"stats": {"ca": "beaucoup"}}]}, "data_json.tours[0].stats.ca"),
+    ({"tours": [{"stops": [{"lon": [1, 2]}]}]}, "data_json.tours[0].stops[0].lon"),
+    ({"tours": {"0": {}}}, "data_json.tours"),
+])
+def test_schema_error_path(content, path):
+    with pytest.raises(SchemaError, match=path.replace("[", r"\[").replace("]", r"\]")):
+        decode(json.dumps(content))
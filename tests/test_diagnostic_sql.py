@@ -0,0 +1,199 @@
+# Les fonctions de sql/diagnostic.sql, chargées dans un Postgres jetable, doivent rendre les
+# mêmes tournées, le même cube et les mêmes arrêts que l'aplatissement Python (flatten.py).
+#   DIAG_TEST_DATABASE_URL=postgresql://…   base existante (schéma temporaire, supprimé ensuite)
+#   DIAG_PG_BIN=/usr/lib/postgresql/16/bin  binaires initdb / pg_ctl, sinon cherchés dans le PATH
+# Sans l'un ni l'autre (ou sans psycopg, absent de requirements.txt), ces tests sont ignorés :
+#   pip install "psycopg[binary]"
+#   DIAG_TEST_DATABASE_URL="host=/tmp/pgd user=postgres dbname=postgres" python -m pytest tests/test_diagnostic_sql.py
+import json
+import os
+import shutil
+import subprocess
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from flatten import STOP_COLUMNS, TOUR_COLUMNS, assemble, flatten_row
+from kpi import CUBE_KEYS, MEASURES, build_cube
+from remote import CUBE_FIELDS, STOP_FIELDS, TOUR_FIELDS
+from synthetic import iter_rows
+
+psycopg = pytest.importorskip("psycopg")
+
+SQL_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql", "diagnostic.sql")
+N_STOPS = 3000
+
+
+def start_cluster(directory):
+    bin_dir = os.environ.get("DIAG_PG_BIN")
+    initdb = os.path.join(bin_dir, "initdb") if bin_dir else shutil.which("initdb")
+    if not initdb or not os.path.exists(initdb):
+        pytest.skip("Postgres introuvable : définir DIAG_TEST_DATABASE_URL ou DIAG_PG_BIN")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        pytest.skip("initdb refuse l'utilisateur root : définir DIAG_TEST_DATABASE_URL")
+    pg_ctl = os.path.join(os.path.dirname(initdb), "pg_ctl")
+    data = os.path.join(directory, "data")
+    subprocess.run([initdb, "-D", data, "-U", "postgres", "-A", "trust", "-E", "UTF8", "--locale=C"], check=True, capture_output=True)
+    subprocess.run(
+        [pg_ctl, "-D", data, "-o", f"-k {directory} -c listen_addresses=", "-l", os.path.join(directory, "log"), "-w", "start"],
+        check=True, capture_output=True,
+    )
+    return pg_ctl, data
+
+
+@pytest.fixture(scope="module")
+def rows():
+    rows = list(iter_rows(N_STOPS, seed=3))
+    sample = json.loads(rows[0]["data_json"])
+    extra = [
+        {"data_json": rows[0]["data_json"][:40]},  # envoi tronqué
+        {"data_json": json.dumps(json.dumps(sample))},  # chaîne JSON ré-encodée
+        {"data_json": json.dumps({**sample, "tours": "?"})},  # hors schéma
+        {"data_json": json.dumps({"depot": {}, "tours": [{"stops": [{"lon": "1.5", "lat": 0, "vol": None}]}]})},
+        {"data_json": json.dumps({"depot": {"pData": {"lon": 7.1, "lat": 43.7}, "veh": {"type": True}}, "tours": [  # booléens, lus par float() / str()
+            {"day": False, "stats": {"ca": True, "cost": False}, "stops": [{"client": True, "lon": 7.2, "lat": 43.8, "vol": True}]},
+        ]})},
+    ]
+    last = rows[-1]
+    for k, row in enumerate(extra, 1):
+        rows.append({"id": last["id"] + k, "nom_producteur": last["nom_producteur"], "created_at": last["created_at"], **row})
+    return rows
+
+
+@pytest.fixture(scope="module")
+def conn(rows, tmp_path_factory):
+    dsn = os.environ.get("DIAG_TEST_DATABASE_URL")
+    cluster = None
+    if dsn:
+        conn = psycopg.connect(dsn, autocommit=True, client_encoding="utf8")
+    else:
+        directory = str(tmp_path_factory.mktemp("pg"))
+        cluster = start_cluster(directory)
+        conn = psycopg.connect(host=directory, user="postgres", dbname="postgres", autocommit=True, client_encoding="utf8")
+    schema = f"diag_test_{uuid.uuid4().hex[:8]}"
+    conn.execute(f"create schema {schema}")
+    conn.execute(f"set search_path to {schema}")
+    conn.execute("create table tournees (id bigint primary key, nom_producteur text, created_at timestamptz, data_json text)")
+    with conn.cursor().copy("copy tournees (id, nom_producteur, created_at, data_json) from stdin") as copy:
+        for r in rows:
+            copy.write_row((r["id"], r["nom_producteur"], r["created_at"], r["data_json"]))
+    with open(SQL_FILE, encoding="utf-8") as f:
+        conn.execute(f.read())
+    yield conn
+    conn.execute(f"drop schema {schema} cascade")
+    conn.close()
+    if cluster is not None:
+        pg_ctl, data = cluster
+        subprocess.run([pg_ctl, "-D", data, "-m", "immediate", "stop"], capture_output=True)
+
+
+@pytest.fixture(scope="module")
+def parts(rows):
+    return [flatten_row(r) for r in rows]
+
+
+@pytest.fixture(scope="module")
+def tables(parts):
+    return assemble([p for p in parts if p.error is None])
+
+
+def rpc(conn, function, columns):
+    cur = conn.execute(f"select * from {function}('tournees')")
+    return pd.DataFrame(cur.fetchall(), columns=[c.name for c in cur.description])[columns]
+
+
+def assert_same(actual, expected):
+    for df in (actual, expected):
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].astype(str)
+    pd.testing.assert_frame_equal(actual.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+
+def test_tours(conn, tables):
+    sql = rpc(conn, "diagnostic_tours", list(TOUR_FIELDS)).rename(columns=TOUR_FIELDS)[TOUR_COLUMNS]
+    sql = sql.astype({"depot_lon": float, "depot_lat": float})
+    sql["Date"] = pd.to_datetime(sql["Date"], utc=True)
+    assert_same(sql, tables["tours"][TOUR_COLUMNS].copy())
+
+
+def test_cube(conn, tables):
+    sql = rpc(conn, "diagnostic_cube", list(CUBE_FIELDS)).rename(columns=CUBE_FIELDS)
+    expected = build_cube(tables["tours"])
+    assert_same(sql.sort_values(CUBE_KEYS), expected.sort_values(CUBE_KEYS))
+    assert list(sql.columns) == CUBE_KEYS + list(MEASURES)
+
+
+def test_stops(conn, tables):
+    sql = rpc(conn, "diagnostic_stops", ["id_projet", "tour_num"] + list(STOP_FIELDS)).rename(columns=STOP_FIELDS)
+    tours, stops = tables["tours"], tables["stops"]
+    # Arrêts géolocalisés seulement, rattachés à (projet, n° de tournée dans le projet)
+    stops = stops[stops["lon"].notna() & stops["lat"].notna()]
+    projects = tours["ID_Projet"].to_numpy()
+    first = np.r_[0, np.flatnonzero(projects[1:] != projects[:-1]) + 1]
+    tour_num = np.arange(len(tours)) - np.repeat(first, np.diff(np.r_[first, len(tours)]))
+    tour_id = stops["tour_id"].to_numpy()
+    expected = pd.DataFrame({
+        "id_projet": projects[tour_id], "tour_num": tour_num[tour_id],
+        **{c: stops[c].to_numpy() for c in STOP_COLUMNS if c != "tour_id"},
+    })
+    assert_same(sql, expected[sql.columns])
+
+
+def test_rejected(conn, parts):
+    sql = [r[0] for r in conn.execute("select * from diagnostic_rejected('tournees')").fetchall()]
+    assert sql == [p.meta[0] for p in parts if p.error is not None]
+    assert sql  # l'échantillon contient des envois tronqués
+
+
+class PgClient:
+    # Sous-ensemble du client supabase utilisé par ServerAggregate : rpc(...).range(...).execute().data
+    def __init__(self, conn):
+        self.conn = conn
+
+    def rpc(self, function, params, start=None, stop=None):
+        client = self
+
+        class Call:
+            def range(self, start, stop):
+                return client.rpc(function, params, start, stop)
+
+            def execute(self):
+                cur = client.conn.execute(f"select * from {function}(%(p_table)s)", params)
+                if cur.description[0].name == function:
+                    return type("Result", (), {"data": cur.fetchone()[0]})
+                rows = [dict(zip([c.name for c in cur.description], r)) for r in cur.fetchall()]
+                return type("Result", (), {"data": rows[start:None if stop is None else stop + 1]})
+
+        return Call()
+
+
+def test_view_keeps_its_version(conn, rows):
+    from remote import ServerAggregate
+
+    source = ServerAggregate(PgClient(conn), "tournees", page_size=100_000)
+    source.refresh(force=True)
+    tables, version = source.current()
+    cube = tables["cube"]
+
+    # Nouvel envoi chargé par la source avant que la vue ne demande sa géométrie
+    new_id = rows[-1]["id"] + 100
+    conn.execute(
+        "insert into tournees values (%s, %s, %s, %s)",
+        (new_id, "Nouveau producteur", rows[-1]["created_at"], rows[0]["data_json"]),
+    )
+    try:
+        source.refresh(force=True)
+        assert source.version == version + 1
+        geo = source.geometry(tables, version)
+        assert tables["cube"] is cube and "Nouveau producteur" not in set(cube["Producteur"].astype(str))
+        assert geo["stops"]["tour_id"].max() < len(tables["tours"])
+        assert len(geo["stops"]) == conn.execute(
+            "select count(*) from diagnostic_stops('tournees') where id_projet <> %s", (new_id,)
+        ).fetchone()[0]
+        latest, latest_version = source.current()
+        assert len(source.geometry(latest, latest_version)["stops"]) > len(geo["stops"])
+    finally:
+        conn.execute("delete from tournees where id = %s", (new_id,))
@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+
+from distances import DistanceMatrix
+
+
+def points(n, seed):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(6.8, 7.2, n), rng.uniform(43.6, 43.9, n)
+
+
+def files(tmp_path):
+    return sorted(os.listdir(tmp_path))
+
+
+def test_save_appends_new_pairs_only(tmp_path):
+    path = str(tmp_path / "distances.arrow")
+    cache = DistanceMatrix(path=path)
+    first = cache.matrix(*points(20, 1))
+    cache.save()
+    assert files(tmp_path) == ["distances.arrow"]
+
+    # Paires déjà connues : rien n'est écrit
+    before = os.stat(path).st_mtime_ns
+    cache.matrix(*points(20, 1))
+    cache.save()
+    assert files(tmp_path) == ["distances.arrow"] and os.stat(path).st_mtime_ns == before
+
+    # Nouvelles paires : un segment, le fichier principal n'est pas réécrit
+    second = cache.matrix(*points(15, 2))
+    cache.save()
+    assert len(files(tmp_path)) == 2 and os.stat(path).st_mtime_ns == before
+
+    reloaded = DistanceMatrix(path=path)
+    assert reloaded.stats()["paires"] == cache.stats()["paires"]
+    np.testing.assert_array_equal(reloaded.matrix(*points(20, 1)), first)
+    np.testing.assert_array_equal(reloaded.matrix(*points(15, 2)), second)
+    assert reloaded.stats()["calculs"] == 0
+
+
+def test_sessions_share_segments(tmp_path):
+    path = str(tmp_path / "distances.arrow")
+    base = DistanceMatrix(path=path)
+    base.matrix(*points(10, 1))
+    base.save()
+
+    # Deux sessions ajoutent des paires, dont une partie en commun
+    a, b = DistanceMatrix(path=path), DistanceMatrix(path=path)
+    lon, lat = points(12, 2)
+    a.matrix(lon, lat)
+    b.matrix(lon[:8], lat[:8])
+    b.matrix(*points(6, 3))
+    a.save()
+    b.save()
+    assert len(files(tmp_path)) == 3
+
+    merged = DistanceMatrix(path=path)
+    assert merged.stats()["paires"] == 45 + 66 + 15  # paires de 10, 12 et 6 points
+    merged.matrix(lon, lat)
+    assert merged.stats()["calculs"] == 0
+
+
+def test_eviction_rewrites_and_merges_segments(tmp_path):
+    path = str(tmp_path / "distances.arrow")
+    cache = DistanceMatrix(path=path, max_pairs=100)
+    cache.matrix(*points(10, 1))
+    cache.save()
+    cache.matrix(*points(10, 2))
+    cache.save()
+    assert len(files(tmp_path)) == 2
+
+    cache.matrix(*points(12, 3))  # 45 + 45 + 66 paires > 100 : éviction
+    cache.save()
+    assert files(tmp_path) == ["distances.arrow"]
+    assert DistanceMatrix(path=path).stats()["paires"] == cache.stats()["paires"] <= 100
@@ -0,0 +1,14 @@
+import pandas as pd
+
+from kpi import build_cube, derive, query
+
+
+def test_cost_ratio_weights_tours_by_revenue():
+    tours = pd.DataFrame({
+        "Producteur": ["A", "A"], "Jour": ["Lundi", "Mardi"], "Véhicule": ["VUL", "VUL"],
+        "Distance": [10.0, 50.0], "Nb Arrêts": [2, 8], "Volume (kg)": [20.0, 400.0],
+        "Coût": [50.0, 100.0], "CA": [100.0, 1000.0], "Ratio": [50.0, 10.0], "Temps": [30.0, 120.0],
+    })
+    kpi = derive(query(build_cube(tours)))
+    assert kpi["cost_ratio"] == 150 / 1100 * 100
+    assert kpi["mean_ratio"] == 30.0
@@ -0,0 +1,33 @@
+import json
+
+import numpy as np
+
+from flatten import assemble, flatten_row
+from layers import DENSITY_ZOOM, build_geo, deck_layers, filter_geo, level_of_detail, view_for
+from palette import Palette
+
+
+def row(row_id, producer, depot, stops):
+    content = {
+        "depot": {"pData": {"lon": depot[0], "lat": depot[1]}, "veh": {"type": "VUL"}},
+        "tours": [{"day": "Lundi", "name": "T1", "stats": {"dist": 10}, "stops": stops}],
+    }
+    return {"id": row_id, "nom_producteur": producer, "created_at": "2026-01-05T08:00:00+00:00", "data_json": json.dumps(content)}
+
+
+def test_far_apart_depots_without_geolocated_stops():
+    # Dépôts géolocalisés, arrêts sans coordonnées, emprise large : zoom sous le seuil de densité
+    tables = assemble([
+        flatten_row(row(1, "A", (5.3, 50.4), [{"client": "x", "lon": "", "lat": None, "vol": 5}])),
+        flatten_row(row(2, "B", (7.9, 44.5), [{"client": "y", "vol": 3}])),
+    ])
+    geo = build_geo(tables, Palette(path=None))
+    paths, points = filter_geo(geo, np.ones(len(tables["tours"]), dtype=bool))
+    _, _, zoom = view_for(points)
+    assert zoom < DENSITY_ZOOM
+
+    lod_paths, lod_points, density = level_of_detail(geo, paths, points, zoom)
+    assert density is None
+    assert len(lod_paths) == 2 and len(lod_points) == 2
+    layers, _ = deck_layers(lod_paths, lod_points, geo["colors"], density=density)
+    assert layers
@@ -0,0 +1,36 @@
+from itertools import permutations
+
+import numpy as np
+
+from mutualisation import _merged_km
+from routing import haversine_matrix, optimize_route
+
+# Dépôt A à lon 0, dépôt B à lon 0.10, clients entre les deux
+LON = np.array([0.0, 0.10, 0.02, 0.08, 0.04, 0.06])
+LAT = np.array([45.0, 45.0, 45.001, 45.001, 45.002, 45.0])
+
+
+def test_pickup_comes_first():
+    order, _, km = optimize_route(LON, LAT, fixed_prefix=2)
+    assert order[0] == 0  # nœud 1 (dépôt B) juste après le départ
+    assert sorted(order) == list(range(len(LON) - 1))
+    route = np.r_[0, order + 1, 0]
+    dist = haversine_matrix(LON, LAT)
+    assert np.isclose(dist[route[:-1], route[1:]].sum(), km)
+
+
+def test_merged_route_is_optimal_with_fixed_pickup():
+    dist = haversine_matrix(LON, LAT)
+    best = min(
+        dist[0, 1] + dist[1, p[0]] + sum(dist[a, b] for a, b in zip(p, p[1:])) + dist[p[-1], 0]
+        for p in permutations(range(2, len(LON)))
+    )
+    [(key, km)] = _merged_km([("paire", LON, LAT, None)])
+    assert np.isclose(km, best)
+
+
+def test_default_route_unchanged():
+    # Sans préfixe imposé, seul le dépôt est fixé : le dépôt B peut être visité n'importe quand
+    order, _, km = optimize_route(LON, LAT)
+    _, _, km_fixed = optimize_route(LON, LAT, fixed_prefix=2)
+    assert km <= km_fixed
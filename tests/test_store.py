@@ -0,0 +1,29 @@
+import pandas as pd
+
+from synthetic import iter_rows
+from sync import TableSync
+
+
+def test_snapshot_reload(tmp_path):
+    rows = list(iter_rows(2000, seed=7))
+    source = TableSync(None, "tournees", snapshot_dir=str(tmp_path))
+    source.merge_pages([rows[:-5]])
+
+    reloaded = TableSync(None, "tournees", snapshot_dir=str(tmp_path))
+    assert (reloaded.last_id, reloaded.last_created_at) == (source.last_id, source.last_created_at)
+    assert reloaded.project_ids == source.project_ids and reloaded.rejected == source.rejected
+    for name, df in source.tables.items():
+        pd.testing.assert_frame_equal(reloaded.tables[name], df.reset_index(drop=True))
+
+    # Colonnes numériques projetées depuis le fichier (lecture seule), NaN compris
+    stops = reloaded.tables["stops"]
+    assert stops["lon"].isna().any()
+    assert not stops["lon"].to_numpy().flags.writeable
+    assert not reloaded.tables["tours"]["Distance"].to_numpy().flags.writeable
+
+    # La synchronisation reprend sur les tables relues
+    reloaded.merge_pages([rows[-10:]])
+    source.merge_pages([rows[-10:]])
+    assert reloaded.last_id == rows[-1]["id"]
+    for name, df in source.tables.items():
+        pd.testing.assert_frame_equal(reloaded.tables[name].reset_index(drop=True), df.reset_index(drop=True))
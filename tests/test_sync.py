@@ -0,0 +1,94 @@
+import json
+
+import pandas as pd
+import pytest
+
+import sync
+from flatten import assemble, flatten_row
+from standin import StandIn
+from synthetic import iter_rows
+from sync import TableSync
+
+
+@pytest.fixture
+def rows():
+    return list(iter_rows(2000, seed=5, dirty=False))
+
+
+class FakeClient:
+    # Sous-ensemble du client supabase lu par fetch_pages, filtré comme PostgREST (cf. standin.py)
+    def __init__(self, rows):
+        self.rows = rows
+        self.served = []
+
+    def table(self, table):
+        client, query = self, {}
+
+        class Query:
+            def select(self, columns):
+                return self
+
+            def or_(self, expression):
+                query["or"] = f"({expression})"
+                return self
+
+            def gt(self, column, value):
+                query[column] = f"gt.{value}"
+                return self
+
+            def order(self, column):
+                return self
+
+            def range(self, start, stop):
+                query["range"] = (start, stop)
+                return self
+
+            def execute(self):
+                start, stop = query.pop("range")
+                data = StandIn({table: client.rows}).select(table, query)[start:stop + 1]
+                client.served.extend(r["id"] for r in data)
+                return type("Result", (), {"data": data})
+
+        return Query()
+
+
+def by_project(tables):
+    tours = tables["tours"].sort_values(["ID_Projet", "Date"], kind="stable").reset_index(drop=True)
+    return tours.astype({c: str for c in tours.select_dtypes("category").columns})
+
+
+def test_refresh_fetches_only_new_rows(rows):
+    client = FakeClient(rows[:-10])
+    source = TableSync(client, "tournees", page_size=7)
+    source.refresh(force=True)
+    assert source.last_id == rows[-11]["id"]
+
+    # Dix nouveaux envois et une soumission existante renvoyée plus tard (created_at plus récent)
+    resent = dict(rows[2], created_at="2099-01-01T00:00:00+00:00", data_json=rows[5]["data_json"])
+    client.rows = rows[:2] + [resent] + rows[3:]
+    client.served.clear()
+    source.refresh(force=True)
+
+    assert sorted(client.served) == sorted([resent["id"]] + [r["id"] for r in rows[-10:]])
+    assert (source.last_id, source.last_created_at) == (rows[-1]["id"], resent["created_at"])
+    pd.testing.assert_frame_equal(by_project(source.tables), by_project(assemble(flatten_row(r) for r in client.rows)))
+
+
+def test_identical_rows_are_not_reparsed(rows, monkeypatch):
+    source = TableSync(None, "tournees")
+    source.merge_pages([rows])
+    tables, version = source.current()
+
+    parsed, flatten_row = [], sync.flatten_row
+
+    def counting(row):
+        parsed.append(row["id"])
+        return flatten_row(row)
+
+    monkeypatch.setattr(sync, "flatten_row", counting)
+    edited = dict(rows[3], data_json=json.dumps({**json.loads(rows[3]["data_json"]), "tours": []}))
+    source.merge_pages([rows[:10] + [edited]])
+
+    assert parsed == [edited["id"]]
+    assert source.changes_since(version, source.version) == {edited["id"]}
+    assert len(source.tables["tours"]) < len(tables["tours"])
@@ -0,0 +1,44 @@
+import pytest
+
+from flatten import assemble, flatten_row
+from layers import build_geo, simplified_paths
+from palette import Palette
+from scenarios import ScenarioEngine
+from synthetic import iter_rows
+from tenants import TenantCache, nbytes
+
+
+@pytest.fixture(scope="module")
+def tables():
+    return assemble([p for p in map(flatten_row, iter_rows(3000, seed=1)) if p.error is None])
+
+
+class Source:
+    def __init__(self, table, tables):
+        self.table = table
+        self.tables = tables
+
+    def current(self):
+        return self.tables, 1
+
+
+def test_scenario_memo_is_counted(tables):
+    engine = ScenarioEngine(tables)
+    before = nbytes(engine)
+    assert before > 10 * len(tables["tours"]) * 8  # tableaux par tournée, et non la taille de l'objet
+    engine.compare({"seuil": [("seuil", None, 20.0)]}, workers=1)
+    assert nbytes(engine) > before
+
+
+def test_cache_growth_evicts(tables):
+    cache = TenantCache(lambda table: Source(table, tables), {"geo": lambda v: build_geo(v.tables, Palette(path=None))})
+    views = [cache.publish(table) for table in ("a", "b")]
+    for view in views:
+        cache.derived(view, "geo")
+    cache.max_bytes = sum(view.size for view in views) + 1
+
+    # Tracés simplifiés ajoutés après la mesure initiale : la prochaine lecture libère « a »
+    for zoom in range(5, 14):
+        simplified_paths(views[1].derived["geo"], zoom)
+    cache.derived(views[1], "geo")
+    assert cache.loaded() == ["b"]
@@ -0,0 +1,67 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from synthetic import iter_rows
+from sync import TableSync
+from trends import PERIODS, TrendStore, build_trends, trend_series
+
+
+@pytest.fixture(scope="module")
+def rows():
+    # Une soumission par jour sur un an, pour couvrir plusieurs semaines et mois
+    start = datetime.datetime(2025, 1, 1, 8, tzinfo=datetime.timezone.utc)
+    return [dict(r, created_at=(start + datetime.timedelta(days=k)).isoformat()) for k, r in enumerate(iter_rows(20000, seed=3))]
+
+
+def assert_same_trends(actual, expected):
+    for period in PERIODS:
+        a, b = actual[period].sort_index(), expected[period].sort_index()
+        assert a.index.equals(b.index), period
+        assert dict(a.dtypes) == dict(b.dtypes)
+        np.testing.assert_allclose(a.to_numpy(float), b.to_numpy(float))
+    assert len(actual["versions"]) == len(expected["versions"])
+
+
+def test_incremental_update_matches_rebuild(rows):
+    source, store = TableSync(None, "tournees"), TrendStore()
+    n = len(rows) // 2
+    source.merge_pages([rows[:n]])
+    store.update(source, source.tables["tours"], source.version)
+
+    for k in range(3):
+        # Nouveaux envois, et quelques soumissions renvoyées avec un autre contenu
+        resent = [dict(r, data_json=rows[(i * 7) % n]["data_json"]) for i, r in enumerate(rows[k * 5:k * 5 + 3])]
+        source.merge_pages([rows[n + k * 20:n + (k + 1) * 20] + resent])
+        if k == 1:
+            source.merge_pages([rows[n + 100:n + 110]])  # version que les agrégats n'ont pas vue
+        assert source.changes_since(store.version, source.version)  # mise à jour incrémentale
+        trends = store.update(source, source.tables["tours"], source.version)
+        assert_same_trends(trends, build_trends(source.tables["tours"]))
+
+
+def test_older_view_does_not_replace_trends(rows):
+    source, store = TableSync(None, "tournees"), TrendStore()
+    source.merge_pages([rows[:50]])
+    old_tours, old_version = source.current()
+    source.merge_pages([rows[50:]])
+    latest = store.update(source, source.tables["tours"], source.version)
+
+    older = store.update(source, old_tours["tours"], old_version)
+    assert_same_trends(older, build_trends(old_tours["tours"]))
+    assert store.trends is latest and store.version == source.version
+
+
+def test_monthly_ratio_from_sums(rows):
+    source = TableSync(None, "tournees")
+    source.merge_pages([rows])
+    tours = source.tables["tours"]
+    sel = {k: tours[c].unique() for k, c in (("prods", "Producteur"), ("days", "Jour"), ("vehs", "Véhicule"))}
+    series = trend_series(build_trends(tours), "Mois", sel, "Ratio logistique (%)", max_lines=1)
+
+    month = tours["Date"].dt.tz_convert(None).dt.to_period("M").dt.start_time
+    sums = tours.groupby(month)[["Coût", "CA"]].sum()
+    expected = sums["Coût"] / sums["CA"] * 100
+    assert (series["Producteur"] == "Ensemble").all() and len(series) == 12
+    np.testing.assert_allclose(series["Ratio logistique (%)"].to_numpy(), expected.to_numpy())
@@ -0,0 +1,41 @@
+from tenants import TenantCache
+from warmer import Warmer
+
+
+class Source:
+    def __init__(self, table):
+        self.table = table
+        self.tables = {}
+        self.version = 0
+        self.refreshes = 0
+
+    def refresh(self, force=False):
+        self.refreshes += 1
+        self.version += 1
+
+    def current(self):
+        return self.tables, self.version
+
+
+def test_warm_pass_keeps_recency_order():
+    cache = TenantCache(Source, {})
+    cache.view("tournees_catl")
+    cache.view("tournees")  # consultée en dernier : la plus récente
+    warmer = Warmer(cache, pinned=[])
+    for table in sorted(cache.active(warmer.idle)):
+        assert warmer.warm(table)
+    assert cache.loaded() == ["tournees_catl", "tournees"]
+
+
+def test_idle_tables_are_not_warmed():
+    cache = TenantCache(Source, {})
+    cache.view("tournees")
+    cache.view("tournees_catl")
+    cache._tenants["tournees"].last_used -= 3600
+    warmer = Warmer(cache, pinned=["tournees_pnr"], idle=900)
+    assert sorted(warmer.pinned.union(cache.active(warmer.idle))) == ["tournees_catl", "tournees_pnr"]
+
+    # Une table épinglée chargée par le préchauffage seul reste la première libérable
+    warmer.warm("tournees_pnr")
+    assert cache.loaded()[0] == "tournees_pnr"
+    assert cache.active(warmer.idle) == ["tournees_catl"]